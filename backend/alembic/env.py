@@ -0,0 +1,67 @@
+"""
+Entorno de las migraciones: usa la misma URL y el mismo engine asíncrono que la aplicación
+"""
+
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.engine import Connection
+
+from app import models
+from app.database import DATABASE_URL, build_engine, to_async_url
+from app.services.search_service import search_service
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.base.metadata
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """El índice de búsqueda lo gestionan sus propias migraciones, no el autogenerate"""
+    if type_ == "table":
+        return not search_service.is_index_table(name)
+    return True
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL de las migraciones sin conectarse (alembic upgrade head --sql)"""
+    context.configure(
+        url=to_async_url(DATABASE_URL),
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        # SQLite no admite la mayoría de ALTER TABLE: se recrea la tabla
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    engine = build_engine(DATABASE_URL)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
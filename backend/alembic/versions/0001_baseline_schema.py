@@ -0,0 +1,55 @@
+"""Esquema base: usuarios y documentos
+
+Las tablas de la aplicación antes de la serie de cambios. Las bases de datos
+que la aplicación creaba al arrancar (create_all) ya las tienen: solo se
+crean si faltan, así que esta migración adopta esas bases de datos sin
+necesidad de alembic stamp. Lo que se añadió después, también a tablas que
+ya existían, está en la revisión 0001a.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+    
+    if "documents" not in existing:
+        op.create_table(
+            "documents",
+            sa.Column("id_", sa.Integer(), nullable=False),
+            sa.Column("raw_text", sa.String(), nullable=True),
+            sa.Column("created_at", sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint("id_"),
+        )
+        op.create_index("ix_documents_id_", "documents", ["id_"])
+
+
+def downgrade() -> None:
+    op.drop_table("documents")
+    op.drop_table("users")
@@ -0,0 +1,235 @@
+"""Tablas y columnas añadidas al esquema base: caché, flashcards, trabajos, límites de tasa e índice de búsqueda
+
+Cada cambio se aplica solo si falta, así que sirve tanto para una base de
+datos nueva como para una creada con create_all en cualquier punto de la
+serie:
+
+- documents.content_hash y su índice único se añaden a la tabla existente.
+  Los documentos existentes reciben el SHA-256 de su texto; si dos tienen el
+  mismo texto, solo el primero, para no romper la unicidad.
+- Las tablas nuevas se crean completas si no existen.
+- El índice de búsqueda se crea y se rellena con los documentos y las
+  flashcards que todavía no estén indexados.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001a"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+documents = sa.table(
+    "documents",
+    sa.column("id_", sa.Integer),
+    sa.column("raw_text", sa.String),
+    sa.column("content_hash", sa.String),
+)
+
+# Índice de búsqueda tal y como se creó en esta revisión (la 0006 pasa el de documentos a fragmentos)
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        body, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+        question, answer, document_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+POSTGRES_INDEX = [
+    """
+    CREATE TABLE IF NOT EXISTS documents_search (
+        document_id INTEGER PRIMARY KEY REFERENCES documents(id_) ON DELETE CASCADE,
+        body TEXT NOT NULL,
+        tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('{config}', body)) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_documents_search_tsv ON documents_search USING GIN (tsv)",
+    """
+    CREATE TABLE IF NOT EXISTS flashcards_search (
+        flashcard_id INTEGER PRIMARY KEY REFERENCES flashcards(id) ON DELETE CASCADE,
+        document_id INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        tsv TSVECTOR GENERATED ALWAYS AS (
+            setweight(to_tsvector('{config}', question), 'A')
+            || setweight(to_tsvector('{config}', answer), 'B')
+        ) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_search_tsv ON flashcards_search USING GIN (tsv)",
+]
+
+# Documentos y flashcards que faltan en el índice, en una sola sentencia por tabla
+SQLITE_BACKFILL = [
+    "INSERT INTO documents_fts (rowid, body) "
+    "SELECT id_, raw_text FROM documents "
+    "WHERE raw_text IS NOT NULL AND id_ NOT IN (SELECT rowid FROM documents_fts)",
+    "INSERT INTO flashcards_fts (rowid, question, answer, document_id) "
+    "SELECT id, question, answer, document_id FROM flashcards "
+    "WHERE id NOT IN (SELECT rowid FROM flashcards_fts)",
+]
+
+POSTGRES_BACKFILL = [
+    "INSERT INTO documents_search (document_id, body) "
+    "SELECT id_, raw_text FROM documents WHERE raw_text IS NOT NULL "
+    "ON CONFLICT (document_id) DO NOTHING",
+    "INSERT INTO flashcards_search (flashcard_id, document_id, question, answer) "
+    "SELECT id, document_id, question, answer FROM flashcards "
+    "ON CONFLICT (flashcard_id) DO NOTHING",
+]
+
+
+def _backfill_content_hash(bind):
+    """Hash del texto de los documentos sin content_hash, por lotes de id_"""
+    used = set(bind.execute(
+        sa.select(documents.c.content_hash).where(documents.c.content_hash.is_not(None))
+    ).scalars())
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(documents.c.id_, documents.c.raw_text)
+            .where(documents.c.id_ > last_id, documents.c.content_hash.is_(None))
+            .order_by(documents.c.id_)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id_
+        
+        updates = []
+        for row in rows:
+            if row.raw_text is None:
+                continue
+            content_hash = hashlib.sha256(row.raw_text.encode("utf-8")).hexdigest()
+            if content_hash not in used:
+                used.add(content_hash)
+                updates.append({"document_id": row.id_, "hash": content_hash})
+        if updates:
+            bind.execute(
+                documents.update()
+                .where(documents.c.id_ == sa.bindparam("document_id"))
+                .values(content_hash=sa.bindparam("hash")),
+                updates,
+            )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+    
+    # Deduplicación por contenido: columna nueva en una tabla del esquema base
+    if "content_hash" not in {column["name"] for column in inspector.get_columns("documents")}:
+        op.add_column("documents", sa.Column("content_hash", sa.String(length=64), nullable=True))
+    _backfill_content_hash(bind)
+    if "ix_documents_content_hash" not in {index["name"] for index in inspector.get_indexes("documents")}:
+        op.create_index("ix_documents_content_hash", "documents", ["content_hash"], unique=True)
+    
+    if "flashcard_cache" not in existing:
+        op.create_table(
+            "flashcard_cache",
+            sa.Column("key", sa.String(length=64), nullable=False),
+            sa.Column("payload", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("key"),
+        )
+    
+    if "flashcards" not in existing:
+        op.create_table(
+            "flashcards",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("document_id", sa.Integer(), nullable=False),
+            sa.Column("position", sa.Integer(), nullable=False),
+            sa.Column("question", sa.Text(), nullable=False),
+            sa.Column("answer", sa.Text(), nullable=False),
+            sa.Column("model", sa.String(), nullable=True),
+            sa.Column("prompt_tokens", sa.Integer(), nullable=True),
+            sa.Column("completion_tokens", sa.Integer(), nullable=True),
+            sa.Column("total_tokens", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["document_id"], ["documents.id_"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_flashcards_id", "flashcards", ["id"])
+        op.create_index("ix_flashcards_document_id_position", "flashcards", ["document_id", "position"])
+    
+    if "generation_jobs" not in existing:
+        op.create_table(
+            "generation_jobs",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("document_id", sa.Integer(), nullable=False),
+            sa.Column("status", sa.String(length=16), nullable=False),
+            sa.Column("completed_steps", sa.Integer(), nullable=False),
+            sa.Column("total_steps", sa.Integer(), nullable=False),
+            sa.Column("flashcards_count", sa.Integer(), nullable=False),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["document_id"], ["documents.id_"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_generation_jobs_id", "generation_jobs", ["id"])
+        op.create_index("ix_generation_jobs_document_id", "generation_jobs", ["document_id"])
+        op.create_index("ix_generation_jobs_status", "generation_jobs", ["status"])
+    
+    if "llm_rate_limits" not in existing:
+        op.create_table(
+            "llm_rate_limits",
+            sa.Column("key", sa.String(length=128), nullable=False),
+            sa.Column("requests_available", sa.Float(), nullable=False),
+            sa.Column("tokens_available", sa.Float(), nullable=False),
+            sa.Column("updated_at", sa.Float(), nullable=False),
+            sa.Column("blocked_until", sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint("key"),
+        )
+    
+    # Tablas FTS5 en SQLite o tsvector con índice GIN en PostgreSQL (IF NOT EXISTS)
+    if bind.dialect.name == "sqlite":
+        statements = SQLITE_INDEX + SQLITE_BACKFILL
+    elif bind.dialect.name == "postgresql":
+        statements = [ddl.format(config=settings.SEARCH_TEXT_CONFIG) for ddl in POSTGRES_INDEX] + POSTGRES_BACKFILL
+    else:
+        statements = []
+    for statement in statements:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute("DROP TABLE IF EXISTS flashcards_fts")
+        op.execute("DROP TABLE IF EXISTS documents_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP TABLE IF EXISTS flashcards_search")
+        op.execute("DROP TABLE IF EXISTS documents_search")
+    
+    op.drop_table("llm_rate_limits")
+    op.drop_table("generation_jobs")
+    op.drop_table("flashcards")
+    op.drop_table("flashcard_cache")
+    
+    op.drop_index("ix_documents_content_hash", table_name="documents")
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("content_hash")
@@ -0,0 +1,111 @@
+"""Texto de los documentos comprimido con zlib, con longitud y vista previa guardadas
+
+Sustituye documents.raw_text por text_compressed (binario) y añade
+text_length y preview, que los listados leen sin descomprimir. Los documentos
+existentes se convierten por lotes.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-17 00:00:00
+
+"""
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+documents = sa.table(
+    "documents",
+    sa.column("id_", sa.Integer),
+    sa.column("raw_text", sa.String),
+    sa.column("text_compressed", sa.LargeBinary),
+    sa.column("text_length", sa.Integer),
+    sa.column("preview", sa.String),
+)
+
+
+def _batches(bind, *columns):
+    """Recorre los documentos por rangos de id_ para no cargarlos todos a la vez"""
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(documents.c.id_, *columns)
+            .where(documents.c.id_ > last_id)
+            .order_by(documents.c.id_)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id_
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("text_compressed", sa.LargeBinary(), nullable=True))
+        batch.add_column(sa.Column("text_length", sa.Integer(), nullable=False, server_default="0"))
+        batch.add_column(sa.Column("preview", sa.String(), nullable=False, server_default=""))
+    
+    bind = op.get_bind()
+    for rows in _batches(bind, documents.c.raw_text):
+        updates = [
+            {
+                "document_id": row.id_,
+                "compressed": zlib.compress(row.raw_text.encode("utf-8"), settings.DOCUMENT_COMPRESSION_LEVEL),
+                "length": len(row.raw_text),
+                "summary": row.raw_text[:settings.DOCUMENT_PREVIEW_LENGTH],
+            }
+            for row in rows
+            if row.raw_text is not None
+        ]
+        if updates:
+            bind.execute(
+                documents.update()
+                .where(documents.c.id_ == sa.bindparam("document_id"))
+                .values(
+                    text_compressed=sa.bindparam("compressed"),
+                    text_length=sa.bindparam("length"),
+                    preview=sa.bindparam("summary"),
+                ),
+                updates,
+            )
+    
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("raw_text")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("raw_text", sa.String(), nullable=True))
+    
+    bind = op.get_bind()
+    for rows in _batches(bind, documents.c.text_compressed):
+        updates = [
+            {"document_id": row.id_, "text": zlib.decompress(row.text_compressed).decode("utf-8")}
+            for row in rows
+            if row.text_compressed is not None
+        ]
+        if updates:
+            bind.execute(
+                documents.update()
+                .where(documents.c.id_ == sa.bindparam("document_id"))
+                .values(raw_text=sa.bindparam("text")),
+                updates,
+            )
+    
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("preview")
+        batch.drop_column("text_length")
+        batch.drop_column("text_compressed")
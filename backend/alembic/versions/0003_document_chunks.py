@@ -0,0 +1,61 @@
+"""Fragmentos de los documentos por páginas y fragmento de origen de cada flashcard
+
+Los documentos existentes no tienen páginas guardadas: sus fragmentos se crean
+la primera vez que se piden, con todo el texto como página 1.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "document_chunks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("ordinal", sa.Integer(), nullable=False),
+        sa.Column("page_start", sa.Integer(), nullable=False),
+        sa.Column("page_end", sa.Integer(), nullable=False),
+        sa.Column("char_start", sa.Integer(), nullable=False),
+        sa.Column("char_end", sa.Integer(), nullable=False),
+        sa.Column("token_count", sa.Integer(), nullable=False),
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("text", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["document_id"], ["documents.id_"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_document_chunks_id", "document_chunks", ["id"])
+    op.create_index("ix_document_chunks_document_id_ordinal", "document_chunks", ["document_id", "ordinal"], unique=True)
+    op.create_index("ix_document_chunks_document_id_page_start", "document_chunks", ["document_id", "page_start"])
+    
+    with op.batch_alter_table("flashcards") as batch:
+        batch.add_column(sa.Column("chunk_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key(
+            "fk_flashcards_chunk_id_document_chunks", "document_chunks", ["chunk_id"], ["id"], ondelete="SET NULL"
+        )
+        batch.create_index("ix_flashcards_chunk_id", ["chunk_id"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("flashcards") as batch:
+        batch.drop_index("ix_flashcards_chunk_id")
+        batch.drop_constraint("fk_flashcards_chunk_id_document_chunks", type_="foreignkey")
+        batch.drop_column("chunk_id")
+    
+    op.drop_index("ix_document_chunks_document_id_page_start", table_name="document_chunks")
+    op.drop_index("ix_document_chunks_document_id_ordinal", table_name="document_chunks")
+    op.drop_index("ix_document_chunks_id", table_name="document_chunks")
+    op.drop_table("document_chunks")
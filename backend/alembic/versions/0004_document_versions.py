@@ -0,0 +1,36 @@
+"""Versiones de los documentos
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+        batch.add_column(sa.Column("previous_version_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key(
+            "fk_documents_previous_version_id_documents", "documents", ["previous_version_id"], ["id_"], ondelete="SET NULL"
+        )
+        batch.create_index("ix_documents_previous_version_id", ["previous_version_id"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_index("ix_documents_previous_version_id")
+        batch.drop_constraint("fk_documents_previous_version_id_documents", type_="foreignkey")
+        batch.drop_column("previous_version_id")
+        batch.drop_column("version")
@@ -0,0 +1,50 @@
+"""Caducidad de las entradas de la tabla flashcard_cache
+
+Las entradas existentes caducan FLASHCARD_CACHE_DB_TTL_SECONDS después de
+aplicar la migración.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+flashcard_cache = sa.table(
+    "flashcard_cache",
+    sa.column("expires_at", sa.DateTime),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("flashcard_cache") as batch:
+        batch.add_column(sa.Column("expires_at", sa.DateTime(), nullable=True))
+    
+    op.execute(
+        flashcard_cache.update().values(
+            expires_at=datetime.utcnow() + timedelta(seconds=settings.FLASHCARD_CACHE_DB_TTL_SECONDS)
+        )
+    )
+    
+    with op.batch_alter_table("flashcard_cache") as batch:
+        batch.alter_column("expires_at", existing_type=sa.DateTime(), nullable=False)
+        batch.create_index("ix_flashcard_cache_expires_at", ["expires_at"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("flashcard_cache") as batch:
+        batch.drop_index("ix_flashcard_cache_expires_at")
+        batch.drop_column("expires_at")
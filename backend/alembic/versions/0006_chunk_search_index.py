@@ -0,0 +1,197 @@
+"""Índice de búsqueda de documentos por fragmentos y sin copia del texto
+
+Sustituye documents_fts (SQLite) y documents_search (PostgreSQL), que
+guardaban el texto completo sin comprimir de cada documento, por un índice de
+los fragmentos de document_chunks: una tabla FTS5 sin contenido (content='')
+o una tabla con solo el tsvector. Los documentos sin fragmentos se dividen
+aquí, con todo el texto como página 1, para que sigan apareciendo en las
+búsquedas.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+
+"""
+import hashlib
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+from app.services.chunk_service import chunk_service
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+documents = sa.table(
+    "documents",
+    sa.column("id_", sa.Integer),
+    sa.column("text_compressed", sa.LargeBinary),
+)
+
+document_chunks = sa.table(
+    "document_chunks",
+    sa.column("id", sa.Integer),
+    sa.column("document_id", sa.Integer),
+    sa.column("ordinal", sa.Integer),
+    sa.column("page_start", sa.Integer),
+    sa.column("page_end", sa.Integer),
+    sa.column("char_start", sa.Integer),
+    sa.column("char_end", sa.Integer),
+    sa.column("token_count", sa.Integer),
+    sa.column("content_hash", sa.String),
+    sa.column("text", sa.LargeBinary),
+)
+
+CHUNK_INDEX = {
+    "sqlite": [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+            body, content = '', tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE TABLE IF NOT EXISTS document_chunks_search (
+            chunk_id INTEGER PRIMARY KEY REFERENCES document_chunks(id) ON DELETE CASCADE,
+            document_id INTEGER NOT NULL,
+            tsv TSVECTOR NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_search_tsv ON document_chunks_search USING GIN (tsv)",
+    ],
+}
+
+CHUNK_INSERT = {
+    "sqlite": "INSERT INTO document_chunks_fts (rowid, body) VALUES (:id, :body)",
+    "postgresql": (
+        "INSERT INTO document_chunks_search (chunk_id, document_id, tsv) "
+        "VALUES (:id, :document_id, to_tsvector(:config, :body))"
+    ),
+}
+
+# Índice de documentos completos de la revisión 0001a, para el downgrade
+DOCUMENT_INDEX = {
+    "sqlite": [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+            body, tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE TABLE IF NOT EXISTS documents_search (
+            document_id INTEGER PRIMARY KEY REFERENCES documents(id_) ON DELETE CASCADE,
+            body TEXT NOT NULL,
+            tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('{config}', body)) STORED
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_documents_search_tsv ON documents_search USING GIN (tsv)",
+    ],
+}
+
+DOCUMENT_INSERT = {
+    "sqlite": "INSERT INTO documents_fts (rowid, body) VALUES (:id, :body)",
+    "postgresql": "INSERT INTO documents_search (document_id, body) VALUES (:id, :body)",
+}
+
+DOCUMENT_TABLE = {"sqlite": "documents_fts", "postgresql": "documents_search"}
+CHUNK_TABLE = {"sqlite": "document_chunks_fts", "postgresql": "document_chunks_search"}
+
+
+def _batches(bind, query, key):
+    """Recorre una consulta por rangos de la clave para no cargar todas las filas a la vez"""
+    last_id = 0
+    while True:
+        rows = bind.execute(query.where(key > last_id).order_by(key).limit(BATCH_SIZE)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _text(compressed) -> str:
+    return zlib.decompress(compressed).decode("utf-8") if compressed is not None else ""
+
+
+def _split_unchunked(bind):
+    """Crea los fragmentos de los documentos que todavía no los tienen"""
+    unchunked = (
+        sa.select(documents.c.id_, documents.c.text_compressed)
+        .where(~sa.exists().where(document_chunks.c.document_id == documents.c.id_))
+    )
+    for rows in _batches(bind, unchunked, documents.c.id_):
+        chunks = []
+        for row in rows:
+            body = _text(row.text_compressed)
+            if not body.strip():
+                continue
+            for chunk in chunk_service.split(body):
+                chunks.append({
+                    "document_id": row.id_,
+                    "ordinal": chunk["ordinal"],
+                    "page_start": chunk["page_start"],
+                    "page_end": chunk["page_end"],
+                    "char_start": chunk["char_start"],
+                    "char_end": chunk["char_end"],
+                    "token_count": chunk["token_count"],
+                    "content_hash": hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest(),
+                    "text": zlib.compress(chunk["text"].encode("utf-8"), settings.DOCUMENT_COMPRESSION_LEVEL),
+                })
+        if chunks:
+            bind.execute(document_chunks.insert(), chunks)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect not in CHUNK_INDEX:
+        return
+    
+    op.execute(f"DROP TABLE IF EXISTS {DOCUMENT_TABLE[dialect]}")
+    for statement in CHUNK_INDEX[dialect]:
+        op.execute(statement)
+    
+    _split_unchunked(bind)
+    chunks = sa.select(document_chunks.c.id, document_chunks.c.document_id, document_chunks.c.text)
+    for rows in _batches(bind, chunks, document_chunks.c.id):
+        bind.execute(
+            sa.text(CHUNK_INSERT[dialect]),
+            [
+                {
+                    "id": row.id,
+                    "document_id": row.document_id,
+                    "body": _text(row.text),
+                    "config": settings.SEARCH_TEXT_CONFIG,
+                }
+                for row in rows
+            ],
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect not in CHUNK_INDEX:
+        return
+    
+    op.execute(f"DROP TABLE IF EXISTS {CHUNK_TABLE[dialect]}")
+    for statement in DOCUMENT_INDEX[dialect]:
+        op.execute(statement.format(config=settings.SEARCH_TEXT_CONFIG))
+    
+    bodies = sa.select(documents.c.id_, documents.c.text_compressed)
+    for rows in _batches(bind, bodies, documents.c.id_):
+        bind.execute(
+            sa.text(DOCUMENT_INSERT[dialect]),
+            [{"id": row.id_, "body": _text(row.text_compressed)} for row in rows],
+        )
@@ -0,0 +1,94 @@
+"""Fragmentos sin copia del texto
+
+document_chunks.text repetía, comprimido, el tramo de documents.text_compressed
+que ya señalan char_start y char_end. Se elimina y el texto de cada fragmento
+se recorta del documento al leerlo; el downgrade lo vuelve a rellenar así.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+"""
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+documents = sa.table(
+    "documents",
+    sa.column("id_", sa.Integer),
+    sa.column("text_compressed", sa.LargeBinary),
+)
+
+document_chunks = sa.table(
+    "document_chunks",
+    sa.column("id", sa.Integer),
+    sa.column("document_id", sa.Integer),
+    sa.column("char_start", sa.Integer),
+    sa.column("char_end", sa.Integer),
+    sa.column("text", sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("document_chunks") as batch:
+        batch.drop_column("text")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("document_chunks") as batch:
+        batch.add_column(sa.Column("text", sa.LargeBinary(), nullable=True))
+    
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(documents.c.id_, documents.c.text_compressed)
+            .where(documents.c.id_ > last_id)
+            .order_by(documents.c.id_)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id_
+        
+        texts = {
+            row.id_: zlib.decompress(row.text_compressed).decode("utf-8") if row.text_compressed is not None else ""
+            for row in rows
+        }
+        chunks = bind.execute(
+            sa.select(document_chunks.c.id, document_chunks.c.document_id, document_chunks.c.char_start, document_chunks.c.char_end)
+            .where(document_chunks.c.document_id.in_(list(texts)))
+        ).all()
+        updates = [
+            {
+                "chunk_id": chunk.id,
+                "compressed": zlib.compress(
+                    texts[chunk.document_id][chunk.char_start:chunk.char_end].encode("utf-8"),
+                    settings.DOCUMENT_COMPRESSION_LEVEL,
+                ),
+            }
+            for chunk in chunks
+        ]
+        if updates:
+            bind.execute(
+                document_chunks.update()
+                .where(document_chunks.c.id == sa.bindparam("chunk_id"))
+                .values(text=sa.bindparam("compressed")),
+                updates,
+            )
+    
+    with op.batch_alter_table("document_chunks") as batch:
+        batch.alter_column("text", existing_type=sa.LargeBinary(), nullable=False)
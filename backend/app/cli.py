@@ -0,0 +1,99 @@
+"""
+Comandos de línea de comandos del backend
+
+Uso:
+    python -m app.cli import-dir ./apuntes --recursive
+
+La base de datos debe estar migrada antes (alembic upgrade head).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import List
+
+from .database import engine, session_local
+from .services.document_service import document_service
+from .services.ingest_service import ingest_service
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = {".pdf": "application/pdf", ".txt": "text/plain"}
+
+
+def collect_files(directory: Path, recursive: bool) -> List[Path]:
+    """Lista los archivos PDF y TXT de un directorio, ordenados por nombre"""
+    pattern = "**/*" if recursive else "*"
+    return sorted(
+        path for path in directory.glob(pattern)
+        if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES
+    )
+
+
+async def import_directory(directory: Path, recursive: bool, batch_size: int) -> dict:
+    """
+    Importa todos los documentos de un directorio por lotes
+    
+    Args:
+        directory: Directorio a importar
+        recursive: Incluir subdirectorios
+        batch_size: Archivos por transacción
+    
+    Returns:
+        Informe con un resultado por archivo
+    """
+    files = collect_files(directory, recursive)
+    results = []
+    try:
+        async with session_local() as db:
+            for start in range(0, len(files), batch_size):
+                batch = files[start:start + batch_size]
+                items = [
+                    {
+                        "path": str(path),
+                        "filename": path.name,
+                        "content_type": SUPPORTED_SUFFIXES[path.suffix.lower()],
+                        "sha256": ingest_service.hash_file(str(path)),
+                    }
+                    for path in batch
+                ]
+                for path, result in zip(batch, await ingest_service.ingest(db, items)):
+                    result["path"] = str(path)
+                    results.append(result)
+                logger.info(f"Importados {min(start + batch_size, len(files))}/{len(files)} archivos")
+    finally:
+        document_service.shutdown()
+        await engine.dispose()
+    
+    return {
+        "total": len(results),
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "deduplicated": sum(1 for r in results if r["status"] == "deduplicated"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Herramientas de Flashcards AI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    import_parser = subparsers.add_parser("import-dir", help="Importa los PDF/TXT de un directorio")
+    import_parser.add_argument("directory", type=Path)
+    import_parser.add_argument("--recursive", action="store_true")
+    import_parser.add_argument("--batch-size", type=int, default=50)
+    
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    
+    if args.command == "import-dir":
+        if not args.directory.is_dir():
+            parser.error(f"{args.directory} no es un directorio")
+        report = asyncio.run(import_directory(args.directory, args.recursive, args.batch_size))
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
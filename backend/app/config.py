@@ -1,6 +1,7 @@
 """
 Configuración centralizada para la aplicación
 """
+import json
 import os
 from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -20,14 +21,83 @@ class Settings(BaseSettings):
     DEFAULT_MODEL: str = "gpt-3.5-turbo"
     MAX_TOKENS: int = 1000
     TEMPERATURE: float = 0.7
+    OPENAI_BASE_URL: Optional[str] = None  # Servidor compatible con OpenAI (opcional)
+    
+    # Configuración del cliente HTTP del LLM
+    LLM_MAX_CONCURRENT_REQUESTS: int = 10  # Llamadas simultáneas al LLM por worker
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    LLM_KEEPALIVE_EXPIRY: float = 30.0  # Segundos
+    LLM_CONNECT_TIMEOUT: float = 5.0  # Segundos
+    LLM_REQUEST_TIMEOUT: float = 120.0  # Segundos
+    
+    # Proveedores LLM, hedging y failover
+    # JSON con una lista de backends compatibles con OpenAI en orden de prioridad, p. ej.
+    # [{"name": "openai"}, {"name": "local", "base_url": "http://localhost:8000/v1", "model": "llama-3-8b"}]
+    # Vacío: un único proveedor con OPENAI_API_KEY y OPENAI_BASE_URL
+    LLM_PROVIDERS: str = ""
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_QUANTILE: float = 0.95  # Cuantil de latencia del principal tras el que se lanza el hedge
+    LLM_HEDGE_MIN_DELAY: float = 1.0  # Segundos mínimos antes de lanzar un hedge
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Latencias necesarias antes de empezar a hacer hedging
+    LLM_HEDGE_WINDOW: int = 200  # Latencias recientes que se guardan por proveedor
+    LLM_HEDGE_MAX_RATIO: float = 0.1  # Fracción máxima de llamadas duplicadas
+    LLM_PROVIDER_FAILURE_THRESHOLD: int = 3  # Errores seguidos para sacar un proveedor de rotación
+    LLM_HEALTH_CHECK_INTERVAL: float = 30.0  # Segundos entre health checks
+    LLM_JSON_MODE: bool = True  # Pedir response_format json_object a los proveedores que lo soportan
+    
+    # Límites de tasa y reintentos de las llamadas al LLM
+    # Los límites se comparten entre workers a través de la tabla llm_rate_limits;
+    # cada proveedor puede fijar los suyos con "rpm" y "tpm" en LLM_PROVIDERS
+    LLM_RATE_LIMIT_RPM: int = 0  # Peticiones por minuto (0: sin límite)
+    LLM_RATE_LIMIT_TPM: int = 0  # Tokens por minuto, prompt más max_tokens (0: sin límite)
+    LLM_RATE_LIMIT_BURST_SECONDS: float = 10.0  # Ráfaga máxima: lo que el límite permite en estos segundos
+    LLM_RATE_LIMIT_MAX_WAIT: float = 60.0  # Segundos máximos en cola antes de rechazar la llamada
+    LLM_MAX_RETRIES: int = 3  # Reintentos de errores transitorios (429, 5xx, timeouts)
+    LLM_RETRY_BASE_DELAY: float = 0.5  # Segundos del primer backoff, se duplica en cada intento
+    LLM_RETRY_MAX_DELAY: float = 30.0  # Tope del backoff y de Retry-After
+    
+    # Generación por fragmentos para documentos grandes
+    LLM_CHUNK_MAX_TOKENS: int = 3000  # Tokens de texto por llamada al LLM
+    LLM_CHUNK_CONCURRENCY: int = 4  # Fragmentos en paralelo por documento
+    
+    # Configuración del listado de documentos
+    DOCUMENTS_PAGE_SIZE: int = 20  # Tamaño de página por defecto
+    DOCUMENTS_MAX_PAGE_SIZE: int = 100  # Tamaño de página máximo
+    DOCUMENT_PREVIEW_LENGTH: int = 200  # Caracteres de vista previa en el listado
+    DOCUMENT_COMPRESSION_LEVEL: int = 6  # Nivel de zlib del texto guardado (1 rápido, 9 más pequeño)
+    
+    # Configuración de búsqueda de texto completo
+    SEARCH_TEXT_CONFIG: str = "spanish"  # Configuración de text search de PostgreSQL
+    SEARCH_MAX_PAGE_SIZE: int = 50
+    
+    # Configuración de caché de flashcards
+    FLASHCARD_CACHE_MAX_ENTRIES: int = 256  # Entradas en el LRU en memoria
+    FLASHCARD_CACHE_TTL_SECONDS: int = 3600  # Vida de cada entrada en memoria
+    FLASHCARD_CACHE_DB_TTL_SECONDS: int = 30 * 24 * 3600  # Vida de cada entrada en la tabla flashcard_cache
+    FLASHCARD_CACHE_PRUNE_INTERVAL_SECONDS: int = 3600  # Segundos entre limpiezas de entradas caducadas de la tabla
+    
+    # Configuración de trabajos de generación en segundo plano
+    GENERATION_WORKERS: int = 2  # Trabajos de generación simultáneos por worker
+    GENERATION_JOB_STALE_SECONDS: int = 600  # Tiempo sin latido para reintentar un trabajo
+    GENERATION_JOB_HEARTBEAT_SECONDS: float = 30.0  # Intervalo del latido de un trabajo en curso (menor que el anterior)
     
     # Configuración de base de datos
     DATABASE_URL: Optional[str] = None
     TEST_DATABASE_URL: Optional[str] = None
+    DB_POOL_SIZE: int = 10  # Conexiones permanentes del pool por worker
+    DB_MAX_OVERFLOW: int = 20  # Conexiones extra en picos
+    DB_POOL_TIMEOUT: float = 30.0  # Segundos de espera por una conexión libre
+    DB_POOL_PRE_PING: bool = True  # Comprobar la conexión antes de usarla (PostgreSQL)
+    DB_POOL_RECYCLE: int = 1800  # Segundos antes de reabrir una conexión (PostgreSQL)
+    SQLITE_WAL: bool = True  # Modo WAL: lecturas concurrentes con una escritura
+    SQLITE_BUSY_TIMEOUT: float = 5.0  # Segundos de espera si otra conexión está escribiendo
     
     # Configuración de autenticación
     SECRET_KEY: str = "your_secret_key_here"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    PASSWORD_HASH_ROUNDS: int = 29000  # Iteraciones de pbkdf2_sha256 (los hashes con otro valor se actualizan al iniciar sesión)
+    PASSWORD_HASH_WORKERS: int = 4  # Hilos dedicados al hashing de contraseñas por worker
     
     # Configuración de CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000"
@@ -41,6 +111,21 @@ class Settings(BaseSettings):
     MAX_FILE_SIZE_MB: int = 10  # Tamaño máximo en MB
     ALLOWED_FILE_TYPES: str = ".txt,.pdf,.docx,.md"
     UPLOAD_DIRECTORY: str = "uploads"
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bloques de 1MB al copiar uploads a disco
+    
+    # Configuración de subida por lotes
+    BATCH_MAX_FILES: int = 200  # Archivos máximos por petición
+    BATCH_MAX_REQUEST_SIZE: int = 200 * 1024 * 1024  # Bytes máximos del cuerpo de una subida por lotes
+    BATCH_EXTRACTION_CONCURRENCY: int = 4  # Extracciones simultáneas por lote
+    
+    # Configuración de extracción de texto de PDF
+    PDF_MAX_PAGES: int = 1000  # Páginas máximas por documento
+    PDF_EXTRACTION_TIMEOUT_SECONDS: float = 60.0  # Tiempo máximo por documento
+    PDF_EXTRACTION_WORKERS: int = 2  # Procesos del pool de extracción
+    PDF_PAGES_PER_TASK: int = 25  # Páginas por tarea en PDFs grandes
+    
+    # Normalización del texto antes de guardarlo (cabeceras, pies, guiones, espacios)
+    TEXT_NORMALIZATION_ENABLED: bool = True
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -66,6 +151,15 @@ class Settings(BaseSettings):
             # En desarrollo, usar SQLite
             return "sqlite:///./flashcards_dev.db"
     
+    def get_llm_providers(self) -> list[dict]:
+        """Obtiene la configuración de los proveedores LLM"""
+        if self.LLM_PROVIDERS.strip():
+            providers = json.loads(self.LLM_PROVIDERS)
+            if not isinstance(providers, list) or not providers:
+                raise ValueError("LLM_PROVIDERS debe ser una lista JSON no vacía")
+            return providers
+        return [{"name": "openai", "api_key": self.OPENAI_API_KEY, "base_url": self.OPENAI_BASE_URL}]
+    
     def get_cors_origins(self) -> list[str]:
         """Obtiene la lista de orígenes permitidos para CORS"""
         origins = self.ALLOWED_ORIGINS.split(",")
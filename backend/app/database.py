@@ -1,22 +1,83 @@
-from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
 
+# Drivers asíncronos de cada motor: asyncpg para PostgreSQL y aiosqlite para SQLite
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Convierte una URL de base de datos a su driver asíncrono"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend in ASYNC_DRIVERS and parsed.drivername != ASYNC_DRIVERS[backend]:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    return parsed.render_as_string(hide_password=False)
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    """WAL permite lecturas concurrentes con una escritura en curso"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT * 1000)}")
+    cursor.close()
+
+
+def build_engine(url: str) -> AsyncEngine:
+    """
+    Crea un engine asíncrono con el pool configurado en Settings
+    
+    Args:
+        url: URL de la base de datos (con o sin driver asíncrono)
+    
+    Returns:
+        AsyncEngine listo para usar
+    """
+    async_url = to_async_url(url)
+    parsed = make_url(async_url)
+    if parsed.get_backend_name() == "sqlite":
+        # Para SQLite en memoria, una única conexión compartida
+        if parsed.database in (None, "", ":memory:"):
+            return create_async_engine(async_url)
+        
+        # Para SQLite en archivo: aiosqlite usa NullPool por defecto y abriría
+        # una conexión (y un hilo) por sesión; un pool las reutiliza
+        engine = create_async_engine(
+            async_url,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        if settings.SQLITE_WAL:
+            event.listen(engine.sync_engine, "connect", _enable_sqlite_wal)
+        return engine
+    
+    # Para PostgreSQL
+    return create_async_engine(
+        async_url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+
+
 # Obtener URL de base de datos según el entorno
 DATABASE_URL = settings.get_database_url()
 
-# Configurar argumentos del engine según el tipo de base de datos
-if DATABASE_URL.startswith("sqlite"):
-    # Para SQLite
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}
-    )
-else:
-    # Para PostgreSQL
-    engine = create_engine(DATABASE_URL)
+engine = build_engine(DATABASE_URL)
 
-session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: con sesiones asíncronas no se puede recargar un
+# atributo de forma implícita, así que los objetos conservan sus valores tras el commit
+session_local = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 base = declarative_base()
@@ -2,9 +2,16 @@ drop table if exists documents;
 
 create table documents(
 	id_ SERIAL,
-	raw_text varchar(400) default null,
+	-- Texto extraído comprimido con zlib; la aplicación lo descomprime al leerlo
+	text_compressed bytea default null,
+	text_length integer not null default 0,
+	preview varchar not null default '',
 	created_at varchar(10) default null,
+	content_hash varchar(64) default null unique,
+	-- Versión del documento y documento del que es nueva versión
+	version integer not null default 1,
+	previous_version_id integer default null references documents(id_) on delete set null,
 	primary key (id_)
 );
 
-select * from documents;
\ No newline at end of file
+select id_, text_length, preview, created_at from documents;
@@ -1,47 +1,61 @@
 """
 Aplicación principal FastAPI para Flashcards AI
 """
+import json
+import math
 import os
 import shutil
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, List, Optional
 
-from . import models
+from . import metrics, models
 from .database import engine, session_local
 from .documents_class import DocRequest
-from .services.document_service import document_service
+from .services.auth_service import auth_service
+from .services.chunk_service import EmptyPageRangeError, chunk_service
+from .services.document_service import FileTooLargeError, document_service
 from .config import settings
 from .schemas import UserRegister, UserResponse, UserLogin
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
+from .upload_limits import UploadSizeLimitMiddleware
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from .services.llm_service import llm_service
-from sqlalchemy.orm import Session
+from .services.flashcard_cache import flashcard_cache
+from .services.flashcard_service import flashcard_service
+from .services.ingest_service import ingest_service
+from .services.job_service import job_service
+from .services.rate_limiter import RateLimitExceeded
+from .services.search_service import search_service
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 import logging
-from passlib.context import CryptContext
 
-# Creamos directorio para archivos
+# Directorio para archivos (se crea al arrancar)
 UPLOAD_DIRECTORY = settings.UPLOAD_DIRECTORY
-Path(UPLOAD_DIRECTORY).mkdir(exist_ok=True)
 
 # Configurar el logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configurar contexto de encriptación de contraseñas
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
 # Abrir y cerrar conexión
-def get_db():
-    db = session_local()
-    try:
+async def get_db():
+    async with session_local() as db:
+        # Obtener la conexión aquí permite medir la espera del pool
+        start = time.perf_counter()
+        await db.connection()
+        metrics.DB_CHECKOUT_WAIT.observe(time.perf_counter() - start)
         yield db
-    finally:
-        db.close()
 
 # Creamos dependecia de la sesión de bd
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
 
 # Crear instancia de FastAPI
 app = FastAPI(
@@ -52,8 +66,12 @@ app = FastAPI(
     redoc_url="/api/redoc",
 )
 
-# Conectamos a modelo
-models.base.metadata.create_all(bind=engine)
+# Rechazar subidas demasiado grandes antes de recibir el cuerpo
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Métricas de Prometheus
+app.add_middleware(metrics.PrometheusMiddleware)
+metrics.register_database_pool(engine)
 
 # Configurar CORS
 app.add_middleware(
@@ -64,6 +82,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    """
+    Arranca los health checks del LLM y los workers de generación, y retoma los trabajos pendientes.
+    El esquema de la base de datos lo crean las migraciones (alembic upgrade head), no el arranque.
+    """
+    Path(UPLOAD_DIRECTORY).mkdir(parents=True, exist_ok=True)
+    llm_service.start()
+    await job_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Detiene los workers y libera los pools del cliente LLM y de extracción"""
+    await job_service.stop()
+    await llm_service.aclose()
+    document_service.shutdown()
+    auth_service.shutdown()
+    await engine.dispose()
+
 @app.get("/")
 async def root():
     """Endpoint raíz"""
@@ -82,11 +119,17 @@ async def health_check():
         "version": settings.APP_VERSION
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Endpoint de métricas en formato de texto de Prometheus"""
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
 @app.post("/api/auth/register", status_code=status.HTTP_201_CREATED, response_model=UserResponse)
 async def register_user(user: UserRegister, db: db_dependency):
     """Endpoint para registrar un nuevo usuario"""
     # Verificar si el usuario ya existe
-    existing_user = db.query(models.User).filter(models.User.username == user.username).first()
+    existing_user = await db.scalar(select(models.User).where(models.User.username == user.username))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -94,7 +137,7 @@ async def register_user(user: UserRegister, db: db_dependency):
         )
     
     # Hash de la contraseña
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await auth_service.hash_password(user.password)
     
     # Crear nuevo usuario
     new_user = models.User(
@@ -103,8 +146,8 @@ async def register_user(user: UserRegister, db: db_dependency):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return UserResponse(
         id=new_user.id,
@@ -116,7 +159,7 @@ async def register_user(user: UserRegister, db: db_dependency):
 async def login_user(user: UserLogin, db: db_dependency):
     """Endpoint para iniciar sesión"""
     # Buscar el usuario por username
-    db_user = db.query(models.User).filter(models.User.username == user.username.lower()).first()
+    db_user = await db.scalar(select(models.User).where(models.User.username == user.username.lower()))
     
     if not db_user:
         raise HTTPException(
@@ -125,12 +168,18 @@ async def login_user(user: UserLogin, db: db_dependency):
         )
     
     # Verificar la contraseña
-    if not pwd_context.verify(user.password, db_user.hashed_password):
+    valid, new_hash = await auth_service.verify_password(user.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos"
         )
     
+    # Actualizar el hash si se guardó con otro coste
+    if new_hash:
+        db_user.hashed_password = new_hash
+        await db.commit()
+    
     return UserResponse(
         id=db_user.id,
         username=db_user.username,
@@ -138,37 +187,177 @@ async def login_user(user: UserLogin, db: db_dependency):
     )
 
 @app.get("/api/documents", status_code=status.HTTP_200_OK)
-async def read_docs(db: db_dependency):
-    """Endpoint para obtener todos los documentos"""
-    return db.query(models.Docs).all()
+async def read_docs(
+    db: db_dependency,
+    cursor: Optional[int] = Query(None, description="ID del último documento de la página anterior"),
+    limit: int = Query(settings.DOCUMENTS_PAGE_SIZE, ge=1, le=settings.DOCUMENTS_MAX_PAGE_SIZE),
+):
+    """
+    Endpoint para listar documentos, del más reciente al más antiguo.
+    
+    Usa paginación por cursor sobre id_ (cada página es un rango del índice de
+    la clave primaria) y solo devuelve campos ligeros, guardados aparte del
+    texto comprimido; el texto completo se obtiene con GET /api/documents/{document_id}.
+    """
+    query = select(
+        models.Docs.id_,
+        models.Docs.created_at,
+        models.Docs.text_length,
+        models.Docs.preview,
+    )
+    if cursor is not None:
+        query = query.where(models.Docs.id_ < cursor)
+    
+    # Se pide una fila de más para saber si hay página siguiente
+    rows = (await db.execute(query.order_by(models.Docs.id_.desc()).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    return {
+        "items": [
+            {
+                "id_": row.id_,
+                "created_at": row.created_at,
+                "text_length": row.text_length or 0,
+                "preview": row.preview or "",
+            }
+            for row in rows
+        ],
+        "next_cursor": rows[-1].id_ if has_more else None,
+        "limit": limit
+    }
+
+@app.get("/api/documents/{document_id}", status_code=status.HTTP_200_OK)
+async def read_doc(document_id: int, db: db_dependency):
+    """Endpoint para obtener un documento con su texto completo"""
+    document = await db.get(models.Docs, document_id, options=[undefer(models.Docs.raw_text)])
+    
+    if not document:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Documento con ID {document_id} no encontrado"
+        )
+    
+    return {
+        "id_": document.id_,
+        "created_at": document.created_at,
+        "content_hash": document.content_hash,
+        "text_length": document.text_length,
+        "version": document.version,
+        "previous_version_id": document.previous_version_id,
+        "raw_text": document.raw_text
+    }
+
+def check_page_range(page_start: Optional[int], page_end: Optional[int]):
+    """Rechaza rangos de páginas invertidos"""
+    if page_start is not None and page_end is not None and page_end < page_start:
+        raise HTTPException(
+            status_code=400,
+            detail="page_end debe ser mayor o igual que page_start"
+        )
+
+def page_range_detail(page_start: Optional[int], page_end: Optional[int]) -> str:
+    """Rango de páginas legible para los mensajes de error"""
+    return f"{page_start or 1}-{page_end or 'final'}"
+
+@app.get("/api/documents/{document_id}/chunks", status_code=status.HTTP_200_OK)
+async def read_doc_chunks(
+    document_id: int,
+    db: db_dependency,
+    page_start: Optional[int] = Query(None, ge=1, description="Primera página (incluida)"),
+    page_end: Optional[int] = Query(None, ge=1, description="Última página (incluida)"),
+    include_text: bool = Query(False, description="Incluir el texto de cada fragmento"),
+):
+    """
+    Endpoint para obtener los fragmentos de un documento, o solo los que tocan
+    un rango de páginas. Sin include_text no se lee el texto del documento.
+    """
+    check_page_range(page_start, page_end)
+    await get_document_or_404(db, document_id)
+    chunks = await chunk_service.get_chunks(db, document_id, page_start, page_end, load_text=include_text)
+    
+    if not chunks:
+        raise HTTPException(
+            status_code=404,
+            detail=f"El documento {document_id} no tiene texto en las páginas {page_range_detail(page_start, page_end)}"
+        )
+    
+    return {
+        "document_id": document_id,
+        "chunks": [
+            {
+                "ordinal": chunk.ordinal,
+                "page_start": chunk.page_start,
+                "page_end": chunk.page_end,
+                "char_start": chunk.char_start,
+                "char_end": chunk.char_end,
+                "token_count": chunk.token_count,
+                "content_hash": chunk.content_hash,
+                **({"text": chunk.text} if include_text else {}),
+            }
+            for chunk in chunks
+        ]
+    }
 
 @app.post("/api/documents_only_text", status_code=status.HTTP_201_CREATED)
 async def create_doc(db: db_dependency, doc_request: DocRequest):
     """Endpoint de creación de nuevo documento"""
     doc_model = models.Docs(**doc_request.model_dump())
     db.add(doc_model)
-    db.commit()
+    await db.flush()
+    chunks = await run_in_threadpool(chunk_service.split, doc_model.raw_text)
+    await chunk_service.add(db, doc_model.id_, chunks)
+    await db.commit()
     # Refesca base de datos y recupera último registro
-    db.refresh(doc_model)
-    return doc_model
+    await db.refresh(doc_model, attribute_names=["created_at"])
+    return {
+        "id_": doc_model.id_,
+        "raw_text": doc_model.raw_text,
+        "created_at": doc_model.created_at
+    }
+
+def stored_filename(filename: Optional[str]) -> str:
+    """Nombre único del archivo guardado: fecha, sufijo aleatorio y nombre original"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}_{os.path.basename(filename or 'unknown')}"
+
+def build_dedup_response(document: models.Docs, file: UploadFile) -> dict:
+    """Respuesta de subida cuando el contenido ya existía como documento"""
+    return {
+        "success": True,
+        "document_id": document.id_,
+        "filename": file.filename,
+        "file_type": document_service.get_file_type(file.filename or "", file.content_type or ""),
+        "text_length": document.text_length,
+        "deduplicated": True,
+        "message": "El documento ya existía; se reutiliza sin volver a procesarlo"
+    }
 
 @app.post("/api/documents", status_code=status.HTTP_201_CREATED)
-async def upload_document(db: db_dependency, file: UploadFile = File(...)):
+async def upload_document(
+    db: db_dependency,
+    response: Response,
+    file: UploadFile = File(...),
+    previous_version_id: Optional[int] = Query(None, description="ID del documento del que esta subida es una nueva versión"),
+):
     """
-    Endpoint para subir documentos (PDF, TXT) y guardar en base de datos
+    Endpoint para subir documentos (PDF, TXT) y guardar en base de datos.
+    
+    Con previous_version_id el documento se guarda como nueva versión de otro:
+    al generar sus flashcards por primera vez solo se envían al LLM los
+    fragmentos que cambiaron y se copian las tarjetas del resto.
     """
+    spooled = None
     try:
-        # Leer contenido del archivo
-        file_content = await file.read()
+        previous = None
+        if previous_version_id is not None:
+            previous = await db.get(models.Docs, previous_version_id)
+            if not previous:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Documento con ID {previous_version_id} no encontrado"
+                )
         
-        # Validar que el archivo no esté vacío
-        if not file_content:
-            raise HTTPException(
-                status_code=400, 
-                detail="El archivo está vacío"
-            )
-        
-        # Validar tipos de archivo permitidos
+        # Validar tipos de archivo permitidos antes de leer nada
         allowed_types = ["application/pdf", "text/plain"]
         file_extension = file.filename.lower().split(".")[-1] if file.filename else ""
         allowed_extensions = ["pdf", "txt"]
@@ -179,9 +368,32 @@ async def upload_document(db: db_dependency, file: UploadFile = File(...)):
                 detail=f"Tipo de archivo no soportado. Formatos permitidos: PDF, TXT"
             )
         
-        # Procesar el documento y extraer texto
-        processed_doc = document_service.process_document(
-            file_content=file_content,
+        # Copiar el archivo a disco por bloques, rechazándolo si supera el límite
+        try:
+            spooled = await document_service.spool_upload(file, UPLOAD_DIRECTORY)
+        except FileTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e)
+            )
+        
+        # Validar que el archivo no esté vacío
+        if spooled['size'] == 0:
+            raise HTTPException(
+                status_code=400, 
+                detail="El archivo está vacío"
+            )
+        
+        # Si el mismo contenido ya se subió, devolver ese documento sin reprocesarlo
+        content_hash = spooled['sha256']
+        existing_doc = await db.scalar(select(models.Docs).where(models.Docs.content_hash == content_hash))
+        if existing_doc:
+            response.status_code = status.HTTP_200_OK
+            return build_dedup_response(existing_doc, file)
+        
+        # Procesar el documento y extraer texto desde el archivo en disco
+        processed_doc = await document_service.process_document_async(
+            file_path=spooled['path'],
             filename=file.filename or "unknown",
             content_type=file.content_type or ""
         )
@@ -193,22 +405,32 @@ async def upload_document(db: db_dependency, file: UploadFile = File(...)):
                 detail="No se pudo extraer texto del documento"
             )
         
-        # Guardar archivo físico (opcional, para respaldo)
-        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        file_path = os.path.join(UPLOAD_DIRECTORY, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
+        # Conservar el archivo físico (opcional, para respaldo)
+        file_path = os.path.join(UPLOAD_DIRECTORY, stored_filename(file.filename))
+        os.replace(spooled['path'], file_path)
+        spooled = None
         
         # Crear registro en base de datos
         db_doc = models.Docs(
             raw_text=processed_doc['text'],
-            created_at=str(datetime.now().date())
+            created_at=str(datetime.now().date()),
+            content_hash=content_hash,
+            version=previous.version + 1 if previous else 1,
+            previous_version_id=previous.id_ if previous else None
         )
         
         db.add(db_doc)
-        db.commit()
-        db.refresh(db_doc)
+        try:
+            await db.flush()
+            await chunk_service.add(db, db_doc.id_, processed_doc['chunks'])
+            await db.commit()
+        except IntegrityError:
+            # Otra subida del mismo contenido terminó antes que esta
+            await db.rollback()
+            os.remove(file_path)
+            existing_doc = await db.scalar(select(models.Docs).where(models.Docs.content_hash == content_hash))
+            response.status_code = status.HTTP_200_OK
+            return build_dedup_response(existing_doc, file)
         
         return {
             "success": True,
@@ -216,6 +438,10 @@ async def upload_document(db: db_dependency, file: UploadFile = File(...)):
             "filename": file.filename,
             "file_type": processed_doc['file_type'],
             "text_length": processed_doc['text_length'],
+            "normalization": processed_doc['normalization'],
+            "version": db_doc.version,
+            "previous_version_id": db_doc.previous_version_id,
+            "deduplicated": False,
             "message": "Documento subido y procesado exitosamente"
         }
         
@@ -232,10 +458,88 @@ async def upload_document(db: db_dependency, file: UploadFile = File(...)):
             detail=f"Error procesando el documento: {str(e)}"
         )
     finally:
+        # Borrar el archivo temporal si no llegó a conservarse
+        if spooled and os.path.exists(spooled['path']):
+            os.remove(spooled['path'])
+        
         # Cerrar el archivo
         if hasattr(file, 'file'):
             file.file.close()
 
+@app.post("/api/documents/batch", status_code=status.HTTP_200_OK)
+async def upload_documents_batch(db: db_dependency, files: List[UploadFile] = File(...)):
+    """
+    Endpoint para subir varios documentos (PDF, TXT) en una sola petición.
+    La extracción es concurrente y los documentos se guardan en una única
+    transacción; devuelve un resultado por archivo.
+    """
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Demasiados archivos: máximo {settings.BATCH_MAX_FILES} por lote"
+        )
+    
+    allowed_types = ["application/pdf", "text/plain"]
+    allowed_extensions = ["pdf", "txt"]
+    results: List[Optional[dict]] = [None] * len(files)
+    items = []
+    item_positions = []
+    
+    try:
+        for position, file in enumerate(files):
+            file_extension = file.filename.lower().split(".")[-1] if file.filename else ""
+            if file.content_type not in allowed_types and file_extension not in allowed_extensions:
+                results[position] = {
+                    "filename": file.filename, "status": "error", "document_id": None,
+                    "error": "Tipo de archivo no soportado. Formatos permitidos: PDF, TXT"
+                }
+                continue
+            
+            try:
+                spooled = await document_service.spool_upload(file, UPLOAD_DIRECTORY)
+            except FileTooLargeError as e:
+                results[position] = {
+                    "filename": file.filename, "status": "error", "document_id": None, "error": str(e)
+                }
+                continue
+            
+            if spooled['size'] == 0:
+                os.remove(spooled['path'])
+                results[position] = {
+                    "filename": file.filename, "status": "error", "document_id": None,
+                    "error": "El archivo está vacío"
+                }
+                continue
+            
+            items.append({
+                "path": spooled['path'],
+                "filename": file.filename or "unknown",
+                "content_type": file.content_type or "",
+                "sha256": spooled['sha256']
+            })
+            item_positions.append(position)
+        
+        for position, item, result in zip(item_positions, items, await ingest_service.ingest(db, items)):
+            results[position] = result
+            # Conservar el archivo físico solo de los documentos nuevos
+            if result["status"] == "created":
+                # Dos archivos del lote con el mismo nombre no se pisan
+                os.replace(item['path'], os.path.join(UPLOAD_DIRECTORY, stored_filename(item['filename'])))
+    finally:
+        for item in items:
+            if os.path.exists(item['path']):
+                os.remove(item['path'])
+        for file in files:
+            file.file.close()
+    
+    return {
+        "total": len(results),
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "deduplicated": sum(1 for r in results if r["status"] == "deduplicated"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results
+    }
+
 @app.post("/api/test-llm")
 async def test_llm_integration():
     """Endpoint de prueba para la integración con LLM"""
@@ -282,37 +586,114 @@ async def test_llm_integration():
             "test_text_length": len(sample_text)
         }
 
+async def get_document_or_404(db: AsyncSession, document_id: int) -> models.Docs:
+    """
+    Busca un documento con texto o lanza la HTTPException correspondiente
+    
+    El texto no se descomprime: se comprueba por su longitud guardada que no
+    esté vacío y la generación lo lee de los fragmentos.
+    """
+    document = await db.get(models.Docs, document_id)
+    
+    if not document:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Documento con ID {document_id} no encontrado"
+        )
+    
+    # Validar que el documento tenga texto
+    if not document.text_length:
+        raise HTTPException(
+            status_code=400,
+            detail="El documento no contiene texto para procesar"
+        )
+    
+    return document
+
+def build_flashcards_response(
+    document: models.Docs,
+    cards: list,
+    cached: bool = False,
+    page_start: Optional[int] = None,
+    page_end: Optional[int] = None,
+    incremental: Optional[dict] = None,
+) -> dict:
+    """Construye la respuesta de flashcards a partir de las filas guardadas"""
+    first = cards[0] if cards else None
+    partial = page_start is not None or page_end is not None
+    return {
+        "success": True,
+        "document_id": document.id_,
+        "page_range": {"start": page_start, "end": page_end} if partial else None,
+        "flashcards": [
+            {"id": card.id, "question": card.question, "answer": card.answer}
+            for card in cards
+        ],
+        "total_flashcards": len(cards),
+        "document_info": {
+            "text_length": document.text_length,
+            "created_at": document.created_at
+        },
+        "generation_info": {
+            "cached": cached,
+            "model": first.model if first else None,
+            "tokens_used": first.total_tokens if first else 0,
+            "prompt_tokens": first.prompt_tokens if first else 0,
+            "completion_tokens": first.completion_tokens if first else 0,
+            "generated_at": first.created_at.isoformat() if first and first.created_at else None,
+            "incremental": incremental
+        }
+    }
+
 @app.get("/api/flashcards/{document_id}")
-async def generate_flashcards(document_id: int, db: db_dependency):
+async def get_flashcards(
+    document_id: int,
+    db: db_dependency,
+    page_start: Optional[int] = Query(None, ge=1, description="Primera página (incluida)"),
+    page_end: Optional[int] = Query(None, ge=1, description="Última página (incluida)"),
+):
+    """
+    Endpoint para obtener las flashcards guardadas de un documento (sin llamar al LLM),
+    opcionalmente solo las de un rango de páginas
+    """
+    check_page_range(page_start, page_end)
+    document = await get_document_or_404(db, document_id)
+    cards = await flashcard_service.get_flashcards(db, document_id, page_start, page_end)
+    
+    if not cards:
+        raise HTTPException(
+            status_code=404,
+            detail=f"El documento {document_id} no tiene flashcards generadas"
+            + (f" en las páginas {page_range_detail(page_start, page_end)}" if page_start or page_end else "")
+        )
+    
+    return build_flashcards_response(document, cards, page_start=page_start, page_end=page_end)
+
+@app.post("/api/flashcards/{document_id}", status_code=status.HTTP_201_CREATED)
+async def generate_flashcards(
+    document_id: int,
+    db: db_dependency,
+    page_start: Optional[int] = Query(None, ge=1, description="Primera página (incluida)"),
+    page_end: Optional[int] = Query(None, ge=1, description="Última página (incluida)"),
+    force: bool = Query(False, description="Ignorar la caché y volver a generar con el LLM"),
+):
     """
-    Endpoint para generar flashcards desde un documento existente
+    Endpoint para generar (o regenerar) flashcards desde un documento existente.
+    Con un rango de páginas solo se procesan y reemplazan las de esas páginas.
+    Si el resultado está en caché devuelve las tarjetas guardadas; con force=true
+    se vuelven a generar.
     """
+    check_page_range(page_start, page_end)
     try:
-        # Buscar el documento en la base de datos
-        document = db.query(models.Docs).filter(models.Docs.id_ == document_id).first()
+        document = await get_document_or_404(db, document_id)
         
-        if not document:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Documento con ID {document_id} no encontrado"
-            )
-        
-        # Validar que el documento tenga texto
-        if not document.raw_text or not document.raw_text.strip():
-            raise HTTPException(
-                status_code=400,
-                detail="El documento no contiene texto para procesar"
-            )
-        
-        # Generar flashcards usando el servicio LLM
-        result = await llm_service.extract_flashcards(
-            text=document.raw_text,
-            num_pairs=8  # Generar más flashcards para una mejor experiencia
+        generation = await flashcard_service.generate_flashcards(
+            db, document, page_start=page_start, page_end=page_end, force=force
         )
+        result = generation["result"]
         
         # Verificar si se generaron flashcards correctamente
         if not result.get("parsed_flashcards"):
-            # Si no se pudo parsear JSON, intentar extraer manualmente
             raw_content = result.get("content", "")
             logger.warning(f"Failed to parse flashcards JSON for document {document_id}")
             
@@ -325,29 +706,23 @@ async def generate_flashcards(document_id: int, db: db_dependency):
                 "model": result.get("model", "unknown")
             }
         
-        flashcards_data = result["parsed_flashcards"]
-        flashcards = flashcards_data.get("flashcards", [])
-        
-        return {
-            "success": True,
-            "document_id": document_id,
-            "flashcards": flashcards,
-            "total_flashcards": len(flashcards),
-            "document_info": {
-                "text_length": len(document.raw_text),
-                "created_at": document.created_at
-            },
-            "generation_info": {
-                "model": result.get("model"),
-                "tokens_used": result.get("usage", {}).get("total_tokens", 0),
-                "prompt_tokens": result.get("usage", {}).get("prompt_tokens", 0),
-                "completion_tokens": result.get("usage", {}).get("completion_tokens", 0)
-            }
-        }
+        return build_flashcards_response(
+            document, generation["cards"], generation["cached"], page_start, page_end,
+            result.get("incremental")
+        )
         
     except HTTPException:
         # Re-lanzar HTTPExceptions
         raise
+    except EmptyPageRangeError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RateLimitExceeded as e:
+        logger.warning(f"Rate limit generating flashcards for document {document_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El proveedor del LLM está al límite de peticiones; inténtalo de nuevo más tarde",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         logger.error(f"Error generating flashcards for document {document_id}: {str(e)}")
         raise HTTPException(
@@ -355,6 +730,168 @@ async def generate_flashcards(document_id: int, db: db_dependency):
             detail=f"Error interno generando flashcards: {str(e)}"
         )
 
+def build_job_response(job: models.GenerationJob) -> dict:
+    """Construye la respuesta de estado de un trabajo de generación"""
+    progress = job.completed_steps / job.total_steps if job.total_steps else 0.0
+    return {
+        "job_id": job.id,
+        "document_id": job.document_id,
+        "status": job.status,
+        "progress": 1.0 if job.status == "completed" else round(progress, 4),
+        "completed_steps": job.completed_steps,
+        "total_steps": job.total_steps,
+        "flashcards_count": job.flashcards_count,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+@app.post("/api/flashcards/{document_id}/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_generation_job(document_id: int, db: db_dependency):
+    """
+    Endpoint para encolar la generación de flashcards en segundo plano.
+    Si el documento ya tiene un trabajo activo, devuelve ese mismo trabajo.
+    """
+    await get_document_or_404(db, document_id)
+    job = await job_service.enqueue(db, document_id)
+    return build_job_response(job)
+
+@app.get("/api/jobs/{job_id}")
+async def get_generation_job(job_id: int, db: db_dependency):
+    """Endpoint para consultar el estado y el resultado de un trabajo de generación"""
+    job = await job_service.get_job(db, job_id)
+    
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Trabajo con ID {job_id} no encontrado"
+        )
+    
+    response = build_job_response(job)
+    if job.status == "completed":
+        document = await db.get(models.Docs, job.document_id)
+        cards = await flashcard_service.get_flashcards(db, job.document_id)
+        response["result"] = build_flashcards_response(document, cards)
+    return response
+
+@app.get("/api/search")
+async def search(
+    db: db_dependency,
+    q: str = Query(..., min_length=1, max_length=200, description="Texto a buscar"),
+    scope: str = Query("all", pattern="^(all|documents|flashcards)$"),
+    limit: int = Query(20, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Endpoint de búsqueda de texto completo sobre documentos y flashcards.
+    Devuelve resultados ordenados por relevancia con los términos resaltados.
+    """
+    try:
+        results = await search_service.search(db, q, scope=scope, limit=limit, offset=offset)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+    
+    return {"query": q, "limit": limit, "offset": offset, **results}
+
+def format_sse(event: str, data: dict) -> str:
+    """Serializa un evento en formato server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/flashcards/{document_id}/stream")
+async def stream_flashcards(
+    document_id: int,
+    db: db_dependency,
+    page_start: Optional[int] = Query(None, ge=1, description="Primera página (incluida)"),
+    page_end: Optional[int] = Query(None, ge=1, description="Última página (incluida)"),
+    force: bool = Query(False, description="Ignorar la caché y volver a generar con el LLM"),
+):
+    """
+    Endpoint que genera flashcards y envía cada una como server-sent event
+    en cuanto está completa, en lugar de esperar la respuesta entera del LLM
+    
+    Aunque es un GET (EventSource solo hace GET), tiene los mismos efectos que
+    POST /api/flashcards/{document_id}: si no hay resultado en caché, o con
+    force, llama al LLM, sustituye las flashcards guardadas del documento (o
+    del rango de páginas) y guarda el resultado en la caché. Un acierto de
+    caché solo lee.
+    """
+    check_page_range(page_start, page_end)
+    await get_document_or_404(db, document_id)
+    
+    # Un rango sin texto se rechaza antes de abrir el stream
+    if (page_start or page_end) and not await chunk_service.get_chunks(
+        db, document_id, page_start, page_end, load_text=False
+    ):
+        raise HTTPException(
+            status_code=404,
+            detail=f"El documento {document_id} no tiene texto en las páginas {page_range_detail(page_start, page_end)}"
+        )
+    # La sesión de la petición se cierra al terminar el handler, antes de que
+    # se envíe el cuerpo: el stream abre la suya y esta devuelve ya su conexión
+    await db.close()
+    
+    async def event_stream():
+        try:
+            async with session_local() as stream_db:
+                document = await stream_db.get(models.Docs, document_id)
+                if not document:
+                    yield format_sse("error", {"error": f"Documento con ID {document_id} no encontrado"})
+                    return
+                
+                async for event in flashcard_service.stream_flashcards(
+                    stream_db, document, page_start=page_start, page_end=page_end, force=force
+                ):
+                    if event["type"] == "flashcard":
+                        yield format_sse("flashcard", event["flashcard"])
+                        continue
+                    
+                    result = event["result"]
+                    if not event["cards"]:
+                        logger.warning(f"Failed to parse flashcards JSON for document {document_id}")
+                        yield format_sse("error", {
+                            "error": "No se pudieron generar flashcards válidas",
+                            "raw_response": result.get("content", ""),
+                        })
+                        return
+                    
+                    yield format_sse("done", build_flashcards_response(
+                        document, event["cards"], event["cached"], page_start, page_end,
+                        result.get("incremental")
+                    ))
+        except RateLimitExceeded as e:
+            yield format_sse("error", {
+                "error": "El proveedor del LLM está al límite de peticiones; inténtalo de nuevo más tarde",
+                "retry_after": math.ceil(e.retry_after),
+            })
+        except Exception as e:
+            logger.error(f"Error streaming flashcards for document {document_id}: {str(e)}")
+            yield format_sse("error", {"error": f"Error interno generando flashcards: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Endpoint con los contadores de la caché de flashcards"""
+    return flashcard_cache.stats()
+
+@app.get("/api/generations/in-flight")
+async def generations_in_flight():
+    """
+    Endpoint con las generaciones de flashcards en curso en este worker y
+    cuántas peticiones esperan cada una
+    """
+    in_flight = flashcard_service.generations.in_flight()
+    return {
+        "in_flight": len(in_flight),
+        "waiters": sum(entry["waiters"] for entry in in_flight.values()),
+        "generations": in_flight
+    }
+
 # TODO: Agregar routers para:
 # - Autenticación
 # - Subida y procesamiento de documentos
@@ -0,0 +1,246 @@
+"""
+Métricas de Prometheus de la API
+
+Todas las métricas se registran en memoria del proceso con prometheus_client y
+se exponen en GET /metrics. Registrar una observación cuesta unos pocos
+microsegundos (un lock sin contención por serie), así que pueden quedarse
+activas en producción. Con varios workers de uvicorn cada proceso expone sus
+propias series; Prometheus las agrega por instancia.
+"""
+
+import time
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Buckets en segundos: peticiones HTTP rápidas y llamadas largas al LLM
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+DB_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por ruta",
+    ["method", "route", "status"],
+    buckets=HTTP_BUCKETS,
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Peticiones HTTP en curso por ruta",
+    ["method", "route"],
+)
+
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "Duración de las llamadas al LLM (sin la espera del semáforo)",
+    ["provider", "model", "mode", "status"],
+    buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens",
+    "Tokens consumidos por modelo (en streaming son una estimación del tokenizer)",
+    ["model", "type"],
+)
+LLM_HEDGED_REQUESTS = Counter(
+    "llm_hedged_requests",
+    "Llamadas al LLM duplicadas por hedging, según quién respondió primero",
+    ["winner"],
+)
+LLM_FAILOVERS = Counter(
+    "llm_failovers",
+    "Llamadas reenviadas a otro proveedor tras un error",
+    ["provider"],
+)
+LLM_PROVIDER_HEALTHY = Gauge(
+    "llm_provider_healthy",
+    "1 si el proveedor LLM está en rotación, 0 si no",
+    ["provider"],
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "llm_rate_limit_wait_seconds",
+    "Espera en la cola de límites de tasa antes de enviar una llamada al LLM",
+    ["provider"],
+    buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60),
+)
+LLM_RETRIES = Counter(
+    "llm_retries",
+    "Reintentos de llamadas al LLM por tipo de error",
+    ["provider", "reason"],
+)
+LLM_RATE_LIMITED = Counter(
+    "llm_rate_limited",
+    "Llamadas al LLM rechazadas por superar la espera máxima de la cola o por 429 persistentes",
+    ["provider"],
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "single_flight_requests",
+    "Peticiones que lanzaron una operación (leader) o esperaron una ya en curso (shared)",
+    ["operation", "role"],
+)
+SINGLE_FLIGHT_IN_FLIGHT = Gauge(
+    "single_flight_in_flight",
+    "Operaciones compartidas en curso",
+    ["operation"],
+)
+FLASHCARD_PARSE_RESULTS = Counter(
+    "flashcard_parse_results",
+    "Respuestas de flashcards del LLM por resultado del parseo (ok, recovered, failed)",
+    ["status"],
+)
+FLASHCARD_RECOVERED_CARDS = Counter(
+    "flashcard_recovered_cards",
+    "Flashcards recuperadas de respuestas con JSON inválido o truncado",
+)
+
+EXTRACTION_DURATION = Histogram(
+    "document_extraction_duration_seconds",
+    "Duración de la extracción de texto por documento",
+    ["file_type", "status"],
+    buckets=HTTP_BUCKETS,
+)
+EXTRACTION_SECONDS_PER_PAGE = Histogram(
+    "document_extraction_seconds_per_page",
+    "Duración de la extracción dividida entre las páginas del documento",
+    ["file_type"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+EXTRACTION_INPUT_BYTES = Histogram(
+    "document_extraction_input_bytes",
+    "Tamaño de los archivos procesados",
+    ["file_type"],
+    buckets=(1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7),
+)
+EXTRACTION_PAGES = Histogram(
+    "document_extraction_pages",
+    "Páginas por documento procesado",
+    ["file_type"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+EXTRACTION_TEXT_CHARS = Histogram(
+    "document_extraction_text_characters",
+    "Caracteres de texto extraídos por documento",
+    ["file_type"],
+    buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 1e7),
+)
+NORMALIZATION_TOKEN_SAVINGS = Histogram(
+    "document_normalization_token_savings_ratio",
+    "Fracción de tokens eliminada al normalizar el texto extraído",
+    ["file_type"],
+    buckets=(0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5),
+)
+
+DB_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Espera para obtener una conexión del pool de base de datos",
+    buckets=DB_WAIT_BUCKETS,
+)
+
+
+class DatabasePoolCollector:
+    """Expone el estado del pool de conexiones en el momento del scrape"""
+    
+    def __init__(self, engine):
+        self.engine = engine
+    
+    def collect(self):
+        pool = self.engine.pool
+        for name, method, documentation in (
+            ("db_pool_size", "size", "Conexiones configuradas en el pool"),
+            ("db_pool_checked_out", "checkedout", "Conexiones en uso"),
+            ("db_pool_overflow", "overflow", "Conexiones abiertas por encima del tamaño del pool"),
+        ):
+            # SingletonThreadPool/NullPool no implementan todos los contadores
+            if hasattr(pool, method):
+                yield GaugeMetricFamily(name, documentation, value=getattr(pool, method)())
+
+
+def register_database_pool(engine):
+    """Registra el collector del pool de conexiones del engine"""
+    REGISTRY.register(DatabasePoolCollector(engine))
+
+
+def record_llm_call(
+    model: str,
+    mode: str,
+    status: str,
+    duration: float,
+    usage: Optional[Dict[str, int]] = None,
+    provider: str = "default",
+):
+    """Registra una llamada al LLM y, si se conoce, su uso de tokens"""
+    LLM_REQUEST_DURATION.labels(provider, model, mode, status).observe(duration)
+    if usage:
+        LLM_TOKENS.labels(model, "prompt").inc(usage.get("prompt_tokens", 0))
+        LLM_TOKENS.labels(model, "completion").inc(usage.get("completion_tokens", 0))
+
+
+def record_llm_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    """Registra tokens de una llamada cuya duración ya se midió"""
+    LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+
+def record_extraction(file_type: str, status: str, duration: float, size_bytes: int, pages: int = 0, text_length: int = 0):
+    """Registra la extracción de texto de un documento"""
+    EXTRACTION_DURATION.labels(file_type, status).observe(duration)
+    EXTRACTION_INPUT_BYTES.labels(file_type).observe(size_bytes)
+    if status == "success":
+        EXTRACTION_PAGES.labels(file_type).observe(pages)
+        EXTRACTION_TEXT_CHARS.labels(file_type).observe(text_length)
+        if pages:
+            EXTRACTION_SECONDS_PER_PAGE.labels(file_type).observe(duration / pages)
+
+
+def render_metrics() -> tuple:
+    """Devuelve el cuerpo y el Content-Type de la respuesta de /metrics"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """
+    Middleware ASGI que mide latencia y peticiones en curso por ruta.
+    
+    Usa la plantilla de la ruta ("/api/flashcards/{document_id}") como etiqueta
+    para no crear una serie por cada id. Las peticiones que no coinciden con
+    ninguna ruta se agrupan en "unmatched". En respuestas en streaming la
+    latencia cubre hasta el último fragmento enviado.
+    """
+    
+    def __init__(self, app: ASGIApp, excluded_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.excluded_paths = excluded_paths
+    
+    @staticmethod
+    def _route_template(scope: Scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                return route.path
+        return "unmatched"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        
+        method = scope["method"]
+        route = self._route_template(scope)
+        status_code = 500
+        
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - start)
+            in_progress.dec()
@@ -1,8 +1,30 @@
+import zlib
+
+from .config import settings
 from .database import base
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Index, LargeBinary
+from sqlalchemy.orm import deferred, validates
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
 
 
+class CompressedText(TypeDecorator):
+    """Texto guardado comprimido con zlib en una columna binaria; se lee ya descomprimido"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode("utf-8"), settings.DOCUMENT_COMPRESSION_LEVEL)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.decompress(value).decode("utf-8")
+
+
 class User(base):
     __tablename__ = "users"
 
@@ -16,5 +38,110 @@ class Docs(base):
     __tablename__ = "documents"
 
     id_ = Column(Integer, primary_key=True, index=True)
-    raw_text = Column(String)
+    # Comprimido y diferido: solo se lee (y descomprime) cuando un handler
+    # necesita el texto completo
+    raw_text = deferred(Column("text_compressed", CompressedText))
+    # Longitud y vista previa guardadas para que los listados no descompriman
+    text_length = Column(Integer, nullable=False, default=0)
+    preview = Column(String, nullable=False, default="")
     created_at = Column(String)
+    # SHA-256 del archivo subido, para no procesar dos veces el mismo contenido
+    content_hash = Column(String(64), unique=True, index=True)
+    # Versiones: un archivo corregido se sube como documento nuevo que apunta al anterior
+    version = Column(Integer, nullable=False, default=1)
+    previous_version_id = Column(Integer, ForeignKey("documents.id_", ondelete="SET NULL"), index=True)
+
+    @validates("raw_text")
+    def _update_text_summary(self, key, text):
+        """Mantiene text_length y preview al asignar el texto"""
+        self.text_length = len(text or "")
+        self.preview = (text or "")[:settings.DOCUMENT_PREVIEW_LENGTH]
+        return text
+
+
+class DocumentChunk(base):
+    __tablename__ = "document_chunks"
+    __table_args__ = (
+        # Fragmentos de un documento en orden con un solo rango del índice
+        Index("ix_document_chunks_document_id_ordinal", "document_id", "ordinal", unique=True),
+        # Fragmentos que tocan un rango de páginas
+        Index("ix_document_chunks_document_id_page_start", "document_id", "page_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id_", ondelete="CASCADE"), nullable=False)
+    ordinal = Column(Integer, nullable=False)
+    # Páginas que cubre el fragmento, desde 1 e inclusivas (un TXT es la página 1)
+    page_start = Column(Integer, nullable=False)
+    page_end = Column(Integer, nullable=False)
+    # Posición del fragmento en Docs.raw_text: raw_text[char_start:char_end]
+    char_start = Column(Integer, nullable=False)
+    char_end = Column(Integer, nullable=False)
+    token_count = Column(Integer, nullable=False, default=0)
+    # SHA-256 del texto del fragmento
+    content_hash = Column(String(64), nullable=False)
+    # Texto del fragmento: no se guarda, ChunkService lo recorta de raw_text al leerlo
+    text = None
+
+
+class FlashcardCacheEntry(base):
+    __tablename__ = "flashcard_cache"
+
+    key = Column(String(64), primary_key=True)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Las entradas caducadas se ignoran al leer y se borran periódicamente
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class Flashcard(base):
+    __tablename__ = "flashcards"
+    __table_args__ = (
+        # Lectura de las tarjetas de un documento en orden con un solo rango del índice
+        Index("ix_flashcards_document_id_position", "document_id", "position"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id_", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    # Fragmento del que salió la tarjeta (NULL en las generadas antes de guardar fragmentos)
+    chunk_id = Column(Integer, ForeignKey("document_chunks.id", ondelete="SET NULL"), index=True)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    # Metadatos de la generación que produjo la tarjeta
+    model = Column(String)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class GenerationJob(base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id_", ondelete="CASCADE"), nullable=False, index=True)
+    # pending, running, completed o failed
+    status = Column(String(16), nullable=False, default="pending", index=True)
+    completed_steps = Column(Integer, nullable=False, default=0)
+    total_steps = Column(Integer, nullable=False, default=0)
+    flashcards_count = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    # Latido del worker: permite detectar trabajos huérfanos tras un reinicio
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+
+class LLMRateLimit(base):
+    __tablename__ = "llm_rate_limits"
+
+    # Un token bucket por proveedor LLM, compartido por todos los workers
+    key = Column(String(128), primary_key=True)
+    requests_available = Column(Float, nullable=False, default=0.0)
+    tokens_available = Column(Float, nullable=False, default=0.0)
+    # Marcas de tiempo en segundos desde epoch
+    updated_at = Column(Float, nullable=False)
+    # Tras un 429 nadie envía peticiones a este proveedor hasta esta hora
+    blocked_until = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,95 @@
+"""
+Servicio de hashing de contraseñas fuera del event loop
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class AuthService:
+    """
+    Hashea y verifica contraseñas en un pool de hilos acotado.
+    
+    pbkdf2_sha256 tarda milisegundos de CPU por llamada; ejecutarlo dentro de un
+    handler async bloquea el event loop para todas las peticiones del worker.
+    passlib usa hashlib.pbkdf2_hmac, que libera el GIL, así que los hilos del
+    pool trabajan en paralelo de verdad. El tamaño del pool limita cuánta CPU
+    puede consumir una ráfaga de logins.
+    """
+    
+    def __init__(self, rounds: int, max_workers: int):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self._pwd_context: Optional["CryptContext"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @property
+    def pwd_context(self) -> "CryptContext":
+        """Contexto de passlib, creado en el primer uso para no importarlo al arrancar"""
+        if self._pwd_context is None:
+            from passlib.context import CryptContext
+            
+            # min_rounds = max_rounds = rounds hace que needs_update marque cualquier
+            # hash con otro coste, y así se re-hashea al iniciar sesión
+            self._pwd_context = CryptContext(
+                schemes=["pbkdf2_sha256"],
+                deprecated="auto",
+                pbkdf2_sha256__default_rounds=self.rounds,
+                pbkdf2_sha256__min_rounds=self.rounds,
+                pbkdf2_sha256__max_rounds=self.rounds,
+            )
+        return self._pwd_context
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Pool de hilos para el hashing, creado en el primer uso"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="password-hash",
+            )
+        return self._executor
+    
+    def shutdown(self):
+        """Libera los hilos del pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    async def hash_password(self, password: str) -> str:
+        """Genera el hash de una contraseña con el coste configurado"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.pwd_context.hash, password)
+    
+    async def verify_password(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifica una contraseña contra su hash
+        
+        Args:
+            password: Contraseña en texto plano
+            hashed_password: Hash guardado
+            
+        Returns:
+            Tupla (válida, nuevo_hash). nuevo_hash no es None cuando la contraseña
+            es correcta pero el hash guardado usa otro coste y debe reemplazarse
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self.pwd_context.verify_and_update, password, hashed_password
+        )
+
+
+# Instancia global del servicio
+auth_service = AuthService(
+    rounds=settings.PASSWORD_HASH_ROUNDS,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+)
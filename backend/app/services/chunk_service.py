@@ -0,0 +1,172 @@
+"""
+Fragmentos de los documentos guardados con sus páginas
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..config import settings
+from .search_service import search_service
+from .text_chunker import chunk_document
+
+logger = logging.getLogger(__name__)
+
+
+class EmptyPageRangeError(Exception):
+    """Ningún fragmento del documento toca el rango de páginas pedido"""
+
+
+class ChunkService:
+    """
+    Guarda cada documento dividido en fragmentos de como máximo
+    LLM_CHUNK_MAX_TOKENS tokens, con las páginas que cubre cada uno.
+    
+    Los fragmentos se calculan al subir el documento, cuando todavía se conocen
+    los límites de página, y son las mismas unidades que se envían al LLM: una
+    flashcard guarda el fragmento del que salió y un rango de páginas se lee
+    (o se regenera) con una consulta por rango del índice. Solo se guardan sus
+    offsets en raw_text, no una segunda copia del texto.
+    """
+    
+    @staticmethod
+    def split(text: str, pages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Divide el texto de un documento en fragmentos
+        
+        Args:
+            text: Texto completo del documento, tal y como se guarda
+            pages: Texto de cada página; sin páginas todo el texto es la página 1
+        
+        Returns:
+            Fragmentos con páginas, offsets, tokens y texto
+        """
+        return chunk_document(text, pages or [text], settings.LLM_CHUNK_MAX_TOKENS)
+    
+    @staticmethod
+    def build(document_id: int, chunks: List[Dict[str, Any]]) -> List[models.DocumentChunk]:
+        """Crea las filas de los fragmentos de un documento ya insertado, con su texto asignado"""
+        return [
+            models.DocumentChunk(
+                document_id=document_id,
+                ordinal=chunk["ordinal"],
+                page_start=chunk["page_start"],
+                page_end=chunk["page_end"],
+                char_start=chunk["char_start"],
+                char_end=chunk["char_end"],
+                token_count=chunk["token_count"],
+                content_hash=hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest(),
+                text=chunk["text"],
+            )
+            for chunk in chunks
+        ]
+    
+    async def add(self, db: AsyncSession, document_id: int, chunks: List[Dict[str, Any]]) -> List[models.DocumentChunk]:
+        """
+        Guarda los fragmentos de un documento ya insertado y los añade al índice de búsqueda (sin hacer commit)
+        
+        Args:
+            db: Sesión de base de datos
+            document_id: ID del documento
+            chunks: Fragmentos devueltos por split
+        
+        Returns:
+            Filas creadas, con id asignado
+        """
+        rows = self.build(document_id, chunks)
+        db.add_all(rows)
+        await db.flush()
+        await search_service.index_chunks(db, rows)
+        return rows
+    
+    @staticmethod
+    def in_pages(page_start: Optional[int], page_end: Optional[int]) -> list:
+        """Condiciones de los fragmentos que tocan un rango de páginas (vacías sin rango)"""
+        conditions = []
+        if page_end is not None:
+            conditions.append(models.DocumentChunk.page_start <= page_end)
+        if page_start is not None:
+            conditions.append(models.DocumentChunk.page_end >= page_start)
+        return conditions
+    
+    async def get_chunks(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        page_start: Optional[int] = None,
+        page_end: Optional[int] = None,
+        load_text: bool = True,
+    ) -> List[models.DocumentChunk]:
+        """
+        Obtiene los fragmentos de un documento, opcionalmente solo los de un rango de páginas
+        
+        Los documentos guardados antes de que existieran los fragmentos se
+        dividen en este momento, con todo el texto como página 1.
+        
+        Args:
+            db: Sesión de base de datos
+            document_id: ID del documento
+            page_start: Primera página del rango (incluida)
+            page_end: Última página del rango (incluida)
+            load_text: Asignar a cada fragmento su texto, recortado de raw_text
+                (descomprime el documento entero)
+        
+        Returns:
+            Fragmentos que tocan el rango, en orden
+        """
+        query = select(models.DocumentChunk).where(
+            models.DocumentChunk.document_id == document_id,
+            *self.in_pages(page_start, page_end),
+        ).order_by(models.DocumentChunk.ordinal)
+        
+        chunks = list(await db.scalars(query))
+        if not chunks and await self._create_missing(db, document_id):
+            chunks = list(await db.scalars(query))
+        if chunks and load_text:
+            text = await db.scalar(select(models.Docs.raw_text).where(models.Docs.id_ == document_id))
+            for chunk in chunks:
+                chunk.text = text[chunk.char_start:chunk.char_end]
+        return chunks
+    
+    async def _create_missing(self, db: AsyncSession, document_id: int) -> bool:
+        """
+        Divide un documento sin fragmentos guardados
+        
+        Returns:
+            True si se crearon fragmentos (o los creó otra petición a la vez)
+        """
+        exists = await db.scalar(
+            select(models.DocumentChunk.id).where(models.DocumentChunk.document_id == document_id).limit(1)
+        )
+        if exists:
+            return False
+        
+        text = await db.scalar(
+            select(models.Docs.raw_text).where(models.Docs.id_ == document_id)
+        )
+        if not text or not text.strip():
+            return False
+        
+        logger.info(f"Creando los fragmentos del documento {document_id}")
+        try:
+            await self.add(db, document_id, await run_in_threadpool(self.split, text))
+            await db.commit()
+        except IntegrityError:
+            # Otra petición dividió el mismo documento a la vez
+            await db.rollback()
+        return True
+    
+    @staticmethod
+    def join(chunks: List[models.DocumentChunk]) -> str:
+        """Texto de varios fragmentos, separados como párrafos"""
+        return "\n\n".join(chunk.text for chunk in chunks)
+
+
+# Instancia global del servicio
+chunk_service = ChunkService()
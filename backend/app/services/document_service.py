@@ -2,43 +2,172 @@
 Servicio para procesar diferentes tipos de documentos
 """
 
+import asyncio
+import hashlib
 import logging
-from io import BytesIO
-from typing import Dict, Any
-import PyPDF2
+import mmap
+import multiprocessing
+import os
+import signal
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from .. import metrics
+from ..config import settings
+from .chunk_service import chunk_service
+from .text_normalizer import join_pages, normalize_pages, token_savings
+
+if TYPE_CHECKING:
+    import PyPDF2
 
 logger = logging.getLogger(__name__)
 
 
+class FileTooLargeError(Exception):
+    """El archivo subido supera el tamaño máximo permitido"""
+
+
+class DocumentProcessingError(Exception):
+    """No se pudo extraer el texto de un documento"""
+
+
+def _register_worker(worker_pids):
+    """Inicializador de los procesos del pool: anuncia su PID para poder terminarlos"""
+    worker_pids.put(os.getpid())
+
+
+@contextmanager
+def _open_pdf(file_path: str) -> Iterator["PyPDF2.PdfReader"]:
+    """Abre un PDF desde disco mapeado en memoria, sin copiarlo a un buffer de bytes"""
+    # PyPDF2 solo se carga en los procesos que extraen PDFs, no al arrancar la API
+    import PyPDF2
+    
+    with open(file_path, "rb") as pdf_file:
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PyPDF2.PdfReader(mapped)
+
+
+def _count_pdf_pages(file_path: str) -> int:
+    """Cuenta las páginas de un PDF (se ejecuta en el pool de procesos)"""
+    with _open_pdf(file_path) as pdf_reader:
+        return len(pdf_reader.pages)
+
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extrae el texto de las páginas [start, end) de un PDF (se ejecuta en el pool de procesos)"""
+    with _open_pdf(file_path) as pdf_reader:
+        return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, end)]
+
+
 class DocumentService:
     """Servicio para procesar y extraer texto de documentos"""
     
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._worker_pids = None
+    
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """Lazy initialization del pool de procesos de extracción"""
+        if self._executor is None:
+            context = multiprocessing.get_context("spawn")
+            # Una sola cola para todos los pools: un proceso que aún arranca
+            # cuando se reinicia el pool la necesita viva para registrarse
+            if self._worker_pids is None:
+                self._worker_pids = context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_EXTRACTION_WORKERS,
+                mp_context=context,
+                initializer=_register_worker,
+                initargs=(self._worker_pids,),
+            )
+        return self._executor
+    
+    def shutdown(self):
+        """Detiene el pool de procesos de extracción"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _reset_executor(self):
+        """
+        Termina los procesos del pool y crea uno nuevo en el próximo uso.
+        
+        Una tarea de PyPDF2 en curso no se puede cancelar, así que tras un
+        timeout la única forma de liberar el proceso es terminarlo. Las demás
+        extracciones en curso en ese pool fallan y se reportan como error.
+        Los PIDs los anuncia cada proceso al arrancar (_register_worker); solo
+        se terminan los que siguen siendo procesos hijos vivos.
+        """
+        if self._executor is None:
+            return
+        children = {process.pid for process in multiprocessing.active_children()}
+        while not self._worker_pids.empty():
+            pid = self._worker_pids.get()
+            if pid in children:
+                os.kill(pid, signal.SIGTERM)
+        self.shutdown()
+    
     @staticmethod
-    def extract_text_from_pdf(file_content: bytes) -> str:
+    def _check_page_limit(page_count: int):
+        """Rechaza PDFs con más páginas de las permitidas"""
+        if page_count > settings.PDF_MAX_PAGES:
+            raise DocumentProcessingError(
+                f"Error procesando PDF: el documento tiene {page_count} páginas "
+                f"(máximo {settings.PDF_MAX_PAGES})"
+            )
+    
+    async def extract_pages_from_pdf_async(self, file_path: str) -> List[str]:
         """
-        Extrae texto de un archivo PDF
+        Extrae el texto de cada página de un PDF en el pool de procesos
+        
+        Los PDFs grandes se dividen en rangos de PDF_PAGES_PER_TASK páginas que
+        se extraen en paralelo. Cada proceso abre el archivo desde disco, así que
+        no se copian los bytes entre procesos. Todo el documento está acotado por
+        PDF_EXTRACTION_TIMEOUT_SECONDS.
         
         Args:
-            file_content: Contenido del archivo PDF en bytes
+            file_path: Ruta del archivo PDF en disco
             
         Returns:
-            Texto extraído del PDF
+            Texto de cada página, en orden
         """
-        try:
-            pdf_file = BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-            
-            logger.info(f"Successfully extracted text from PDF ({len(text)} characters)")
-            return text.strip()
+        loop = asyncio.get_running_loop()
+        
+        async def extract() -> List[str]:
+            page_count = await loop.run_in_executor(self.executor, _count_pdf_pages, file_path)
+            self._check_page_limit(page_count)
             
+            step = max(1, settings.PDF_PAGES_PER_TASK)
+            ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, _extract_pdf_page_range, file_path, start, end)
+                for start, end in ranges
+            ))
+            return [page for part in parts for page in part]
+        
+        try:
+            pages = await asyncio.wait_for(extract(), timeout=settings.PDF_EXTRACTION_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error("Timeout extracting text from PDF, restarting extraction pool")
+            self._reset_executor()
+            raise DocumentProcessingError(
+                f"Error procesando PDF: la extracción superó "
+                f"{settings.PDF_EXTRACTION_TIMEOUT_SECONDS} segundos"
+            )
+        except DocumentProcessingError:
+            raise
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
-            raise Exception(f"Error procesando PDF: {str(e)}")
+            raise DocumentProcessingError(f"Error procesando PDF: {str(e)}")
+        
+        logger.info(f"Successfully extracted text from PDF ({len(pages)} pages)")
+        return pages
     
     @staticmethod
     def extract_text_from_txt(file_content: bytes, encoding: str = 'utf-8') -> str:
@@ -64,7 +193,7 @@ class DocumentService:
                 return text.strip()
             except Exception as e:
                 logger.error(f"Error extracting text from TXT: {str(e)}")
-                raise Exception(f"Error procesando archivo TXT: {str(e)}")
+                raise DocumentProcessingError(f"Error procesando archivo TXT: {str(e)}")
     
     @staticmethod
     def get_file_type(filename: str, content_type: str) -> str:
@@ -87,35 +216,137 @@ class DocumentService:
         else:
             return 'unknown'
     
-    @classmethod
-    def process_document(cls, file_content: bytes, filename: str, content_type: str) -> Dict[str, Any]:
+    async def process_document_async(self, file_path: str, filename: str, content_type: str) -> Dict[str, Any]:
         """
-        Procesa un documento y extrae su texto
+        Procesa un documento guardado en disco sin bloquear el event loop
+        
+        Los PDFs se extraen en el pool de procesos; el resto de formatos son
+        baratos y se leen en el threadpool.
         
         Args:
-            file_content: Contenido del archivo en bytes
+            file_path: Ruta del archivo en disco
             filename: Nombre del archivo
             content_type: Content-Type del archivo
             
         Returns:
-            Dict con el texto extraído y metadatos
+            Dict con el texto extraído, el texto por página, los fragmentos y metadatos
         """
-        file_type = cls.get_file_type(filename, content_type)
+        file_type = self.get_file_type(filename, content_type)
+        size_bytes = os.path.getsize(file_path)
+        start = time.perf_counter()
         
-        if file_type == 'pdf':
-            text = cls.extract_text_from_pdf(file_content)
-        elif file_type == 'txt':
-            text = cls.extract_text_from_txt(file_content)
-        else:
-            raise Exception(f"Tipo de archivo no soportado: {filename}")
+        try:
+            if file_type == 'pdf':
+                pages = await self.extract_pages_from_pdf_async(file_path)
+                text = "\n".join(pages).strip()
+            elif file_type == 'txt':
+                file_content = await run_in_threadpool(_read_file, file_path)
+                text = self.extract_text_from_txt(file_content)
+                pages = [text]
+            else:
+                raise DocumentProcessingError(f"Tipo de archivo no soportado: {filename}")
+        except Exception:
+            metrics.record_extraction(file_type, "error", time.perf_counter() - start, size_bytes)
+            raise
+        
+        metrics.record_extraction(
+            file_type, "success", time.perf_counter() - start, size_bytes,
+            pages=len(pages), text_length=len(text),
+        )
+        
+        normalization = None
+        if settings.TEXT_NORMALIZATION_ENABLED:
+            pages, text, normalization = await run_in_threadpool(_normalize_document, pages, text)
+            metrics.NORMALIZATION_TOKEN_SAVINGS.labels(file_type).observe(normalization["savings_ratio"])
+            logger.info(
+                f"Texto normalizado: {normalization['tokens_before']} -> {normalization['tokens_after']} tokens "
+                f"({normalization['savings_ratio']:.1%} menos)"
+            )
+        
+        # Los límites de página solo se conocen ahora: se guardan con cada fragmento
+        chunks = await run_in_threadpool(chunk_service.split, text, pages)
         
         return {
             'text': text,
+            'pages': pages,
+            'chunks': chunks,
             'file_type': file_type,
             'filename': filename,
-            'text_length': len(text)
+            'text_length': len(text),
+            'normalization': normalization
         }
+    
+    @staticmethod
+    async def spool_upload(
+        upload: UploadFile,
+        directory: str,
+        max_size: int = settings.MAX_FILE_SIZE,
+        chunk_size: int = settings.UPLOAD_CHUNK_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        Copia un archivo subido a disco por bloques, calculando su hash
+        
+        Nunca hay más de un bloque en memoria y la escritura se hace en el
+        threadpool. Starlette ya recibió el cuerpo entero en el UploadFile (el
+        rechazo antes de recibirlo lo hace UploadSizeLimitMiddleware); aquí se
+        comprueba el tamaño de cada archivo: si supera max_size se borra lo
+        escrito y se lanza FileTooLargeError sin copiar el resto.
+        
+        Args:
+            upload: Archivo recibido por FastAPI
+            directory: Directorio donde guardar el archivo temporal
+            max_size: Tamaño máximo permitido en bytes
+            chunk_size: Tamaño de cada bloque de lectura
+            
+        Returns:
+            Dict con la ruta del archivo, su tamaño y su hash SHA-256
+        """
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f".upload_{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        size = 0
+        
+        buffer = await run_in_threadpool(open, file_path, "wb")
+        try:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(
+                        f"El archivo supera el tamaño máximo de {max_size / (1024 * 1024):g} MB"
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(buffer.write, chunk)
+        except BaseException:
+            await run_in_threadpool(buffer.close)
+            await run_in_threadpool(_remove_file, file_path)
+            raise
+        await run_in_threadpool(buffer.close)
+        
+        return {
+            'path': file_path,
+            'size': size,
+            'sha256': digest.hexdigest()
+        }
+
+
+def _normalize_document(pages: List[str], text: str) -> tuple:
+    """Normaliza las páginas y mide el ahorro de tokens respecto al texto extraído"""
+    normalized_pages = normalize_pages(pages)
+    normalized_text = join_pages(normalized_pages)
+    return normalized_pages, normalized_text, token_savings(text, normalized_text)
+
+
+def _read_file(file_path: str) -> bytes:
+    """Lee un archivo completo (se ejecuta en el threadpool)"""
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def _remove_file(file_path: str):
+    """Borra un archivo si existe"""
+    if os.path.exists(file_path):
+        os.remove(file_path)
 
 
 # Instancia global del servicio
-document_service = DocumentService() 
\ No newline at end of file
+document_service = DocumentService()
\ No newline at end of file
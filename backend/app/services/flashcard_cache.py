@@ -0,0 +1,202 @@
+"""
+Caché direccionada por contenido para flashcards generadas
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FlashcardCache:
+    """
+    Caché de dos niveles para resultados de generación de flashcards.
+    
+    El primer nivel es un LRU en memoria con límite de tamaño y TTL; el segundo
+    es la tabla flashcard_cache, que sobrevive a reinicios y se comparte entre
+    workers. La clave es un hash de todo lo que determina la respuesta del LLM.
+    
+    Cada fila de la tabla guarda cuándo caduca: las caducadas se tratan como
+    fallos y se borran, como mucho una vez por prune_interval_seconds, al
+    guardar una entrada nueva.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = settings.FLASHCARD_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.FLASHCARD_CACHE_TTL_SECONDS,
+        db_ttl_seconds: int = settings.FLASHCARD_CACHE_DB_TTL_SECONDS,
+        prune_interval_seconds: int = settings.FLASHCARD_CACHE_PRUNE_INTERVAL_SECONDS,
+    ):
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._db_ttl_seconds = db_ttl_seconds
+        self._prune_interval_seconds = prune_interval_seconds
+        self._last_prune = time.monotonic()
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "db_pruned": 0,
+        }
+    
+    @staticmethod
+    def make_key(
+        text: str,
+        num_pairs: int,
+        model: str,
+        temperature: float,
+        prompt_template: str,
+    ) -> str:
+        """
+        Calcula la clave de caché de una generación
+        
+        Args:
+            text: Texto del documento
+            num_pairs: Número de pares Q&A solicitados
+            model: Modelo del LLM
+            temperature: Temperatura de la generación
+            prompt_template: Template del prompt usado
+            
+        Returns:
+            Hash SHA-256 en hexadecimal
+        """
+        digest = hashlib.sha256()
+        for part in (prompt_template, model, repr(float(temperature)), str(num_pairs), text):
+            encoded = part.encode("utf-8")
+            # Prefijo de longitud para que las partes no se confundan entre sí
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+    
+    async def get(self, key: str, db: Optional[AsyncSession] = None) -> Optional[Dict[str, Any]]:
+        """
+        Busca un resultado en memoria y, si no está, en la base de datos
+        
+        Args:
+            key: Clave calculada con make_key
+            db: Sesión de base de datos para el nivel persistente
+            
+        Returns:
+            Resultado cacheado o None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self._ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expirations"] += 1
+        
+        if db is not None:
+            row = await db.get(models.FlashcardCacheEntry, key)
+            if row is not None and row.expires_at <= datetime.utcnow():
+                with self._lock:
+                    self._stats["expirations"] += 1
+                row = None
+            if row is not None:
+                value = json.loads(row.payload)
+                self._remember(key, value)
+                with self._lock:
+                    self._stats["db_hits"] += 1
+                return value
+        
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+    
+    async def set(self, key: str, value: Dict[str, Any], db: Optional[AsyncSession] = None):
+        """
+        Guarda un resultado en memoria y en la base de datos
+        
+        Args:
+            key: Clave calculada con make_key
+            value: Resultado de la generación (serializable a JSON)
+            db: Sesión de base de datos para el nivel persistente
+        """
+        self._remember(key, value)
+        
+        if db is not None:
+            now = datetime.utcnow()
+            try:
+                await db.merge(models.FlashcardCacheEntry(
+                    key=key,
+                    payload=json.dumps(value, ensure_ascii=False),
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self._db_ttl_seconds),
+                ))
+                await db.commit()
+            except IntegrityError:
+                # Otro worker guardó la misma clave a la vez
+                await db.rollback()
+            
+            if time.monotonic() - self._last_prune >= self._prune_interval_seconds:
+                await self.prune(db)
+    
+    async def prune(self, db: AsyncSession) -> int:
+        """
+        Borra de la tabla flashcard_cache las entradas caducadas
+        
+        Args:
+            db: Sesión de base de datos
+            
+        Returns:
+            Número de filas borradas
+        """
+        self._last_prune = time.monotonic()
+        result = await db.execute(
+            delete(models.FlashcardCacheEntry).where(models.FlashcardCacheEntry.expires_at <= datetime.utcnow())
+        )
+        await db.commit()
+        with self._lock:
+            self._stats["db_pruned"] += result.rowcount
+        if result.rowcount:
+            logger.info(f"Borradas {result.rowcount} entradas caducadas de la caché de flashcards")
+        return result.rowcount
+    
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """Inserta en el LRU en memoria desalojando la entrada más antigua"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve los contadores de aciertos y fallos de la caché"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+        
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["max_entries"] = self._max_entries
+        stats["ttl_seconds"] = self._ttl_seconds
+        stats["db_ttl_seconds"] = self._db_ttl_seconds
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Instancia global de la caché
+flashcard_cache = FlashcardCache()
@@ -0,0 +1,677 @@
+"""
+Servicio para generar, guardar y leer flashcards de documentos
+"""
+
+import asyncio
+import functools
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..config import settings
+from ..database import session_local
+from ..prompts.flashcard_prompts import EXTRACT_QA_PAIRS_PROMPT
+from .chunk_service import EmptyPageRangeError, chunk_service
+from .flashcard_cache import flashcard_cache
+from .llm_service import llm_service
+from .search_service import search_service
+from .single_flight import SingleFlight
+from .text_chunker import distribute_pairs
+
+logger = logging.getLogger(__name__)
+
+
+class FlashcardService:
+    """Servicio que separa la generación (LLM) de la lectura (base de datos)"""
+    
+    # Generar más flashcards para una mejor experiencia
+    DEFAULT_NUM_PAIRS = 8
+    
+    def __init__(self):
+        # Generaciones en curso: las peticiones simultáneas del mismo documento
+        # esperan la misma llamada al LLM en lugar de lanzar una cada una
+        self.generations = SingleFlight("flashcard_generation")
+    
+    @staticmethod
+    async def get_flashcards(
+        db: AsyncSession,
+        document_id: int,
+        page_start: Optional[int] = None,
+        page_end: Optional[int] = None,
+    ) -> List[models.Flashcard]:
+        """
+        Obtiene las flashcards guardadas de un documento
+        
+        Args:
+            db: Sesión de base de datos
+            document_id: ID del documento
+            page_start: Primera página (incluida); con un rango solo se devuelven
+                las tarjetas de los fragmentos que lo tocan
+            page_end: Última página (incluida)
+            
+        Returns:
+            Flashcards ordenadas por posición
+        """
+        query = select(models.Flashcard).where(models.Flashcard.document_id == document_id)
+        pages = chunk_service.in_pages(page_start, page_end)
+        if pages:
+            query = query.join(models.DocumentChunk, models.Flashcard.chunk_id == models.DocumentChunk.id).where(*pages)
+        result = await db.scalars(query.order_by(models.Flashcard.position))
+        return list(result)
+    
+    @staticmethod
+    async def save_flashcards(
+        db: AsyncSession,
+        document_id: int,
+        flashcards: List[Dict[str, Any]],
+        result: Dict[str, Any],
+        chunk_ids: List[int],
+        partial: bool = False,
+    ) -> List[models.Flashcard]:
+        """
+        Reemplaza las flashcards de un documento (o de algunos de sus fragmentos) por las generadas
+        
+        Args:
+            db: Sesión de base de datos
+            document_id: ID del documento
+            flashcards: Lista de dicts con question, answer y el índice del
+                fragmento de origen en "chunk"
+            result: Resultado del LLM con modelo y uso de tokens
+            chunk_ids: IDs de los fragmentos enviados al LLM, en orden
+            partial: Solo se generó un rango de páginas: se reemplazan las
+                tarjetas de esos fragmentos y se conservan las demás
+            
+        Returns:
+            Flashcards guardadas
+        """
+        usage = result.get("usage", {})
+        previous = models.Flashcard.document_id == document_id
+        if partial:
+            previous = previous & models.Flashcard.chunk_id.in_(chunk_ids)
+        await search_service.remove_flashcards(
+            db, list(await db.scalars(select(models.Flashcard.id).where(previous)))
+        )
+        await db.execute(delete(models.Flashcard).where(previous).execution_options(synchronize_session=False))
+        
+        cards = [
+            models.Flashcard(
+                document_id=document_id,
+                position=position,
+                chunk_id=FlashcardService._chunk_id(card, chunk_ids),
+                question=card.get("question", ""),
+                answer=card.get("answer", ""),
+                model=result.get("model"),
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                total_tokens=usage.get("total_tokens", 0),
+            )
+            for position, card in enumerate(flashcards)
+        ]
+        db.add_all(cards)
+        await db.flush()
+        if partial:
+            await FlashcardService._renumber(db, document_id)
+        await search_service.index_flashcards(db, cards)
+        await db.commit()
+        return cards
+    
+    @staticmethod
+    def _chunk_id(card: Dict[str, Any], chunk_ids: List[int]) -> Optional[int]:
+        """ID del fragmento del que salió una tarjeta (None en resultados cacheados sin fragmento)"""
+        index = card.get("chunk")
+        if isinstance(index, int) and 0 <= index < len(chunk_ids):
+            return chunk_ids[index]
+        return None
+    
+    @staticmethod
+    async def _renumber(db: AsyncSession, document_id: int):
+        """Tras regenerar un rango, ordena las tarjetas del documento por fragmento"""
+        rows = await db.scalars(
+            select(models.Flashcard)
+            .outerjoin(models.DocumentChunk, models.Flashcard.chunk_id == models.DocumentChunk.id)
+            .where(models.Flashcard.document_id == document_id)
+            .order_by(func.coalesce(models.DocumentChunk.ordinal, -1), models.Flashcard.position, models.Flashcard.id)
+        )
+        for position, card in enumerate(rows):
+            card.position = position
+        await db.flush()
+    
+    @staticmethod
+    def _cache_key(text: str, num_pairs: int) -> str:
+        """Clave de caché de la generación por defecto de un texto"""
+        return flashcard_cache.make_key(
+            text=text,
+            num_pairs=num_pairs,
+            model=settings.DEFAULT_MODEL,
+            temperature=llm_service.FLASHCARD_TEMPERATURE,
+            prompt_template=EXTRACT_QA_PAIRS_PROMPT,
+        )
+    
+    @staticmethod
+    def _flight_key(document_id: int, cache_key: str) -> str:
+        """Clave de las generaciones en curso: mismo documento y misma generación"""
+        return f"{document_id}:{cache_key}"
+    
+    async def generate_flashcards(
+        self,
+        db: AsyncSession,
+        document: models.Docs,
+        num_pairs: int = DEFAULT_NUM_PAIRS,
+        progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        page_start: Optional[int] = None,
+        page_end: Optional[int] = None,
+        force: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Genera flashcards de un documento y las guarda en la base de datos
+        
+        Cada fragmento guardado del documento es una llamada al LLM. Con un
+        rango de páginas solo se procesan los fragmentos que lo tocan y solo se
+        reemplazan sus tarjetas.
+        
+        La primera generación de una nueva versión de un documento es
+        incremental: las tarjetas de los fragmentos que no cambiaron respecto
+        a la versión anterior se copian y solo los fragmentos nuevos van al LLM.
+        
+        Un acierto de caché devuelve las tarjetas ya guardadas sin reescribirlas;
+        con force se ignora la caché y se vuelve a llamar al LLM.
+        
+        Args:
+            db: Sesión de base de datos
+            document: Documento a procesar
+            num_pairs: Número de pares Q&A a generar
+            progress_callback: Corrutina opcional llamada con (completadas, total)
+            page_start: Primera página a procesar (incluida)
+            page_end: Última página a procesar (incluida)
+            force: Regenerar aunque el resultado esté en caché
+            
+        Returns:
+            Dict con el resultado del LLM, las tarjetas guardadas, si vino de
+            caché y si se compartió con otra petición simultánea
+        
+        Raises:
+            EmptyPageRangeError: Ningún fragmento toca el rango de páginas
+        """
+        document_id = document.id_
+        partial = page_start is not None or page_end is not None
+        chunks = await self._get_chunks(db, document_id, page_start, page_end)
+        chunk_texts = [chunk.text for chunk in chunks]
+        chunk_ids = [chunk.id for chunk in chunks]
+        
+        # Buscar primero en la caché por contenido de los fragmentos
+        cache_key = self._cache_key(chunk_service.join(chunks), num_pairs)
+        result = None if force else await flashcard_cache.get(cache_key, db)
+        cached = result is not None
+        
+        if not cached:
+            plan = None
+            if not partial and document.previous_version_id:
+                plan = await self._incremental_plan(db, document, chunks, num_pairs)
+            
+            # Terminar la transacción devuelve la conexión al pool mientras se
+            # espera al LLM; con muchas peticiones esperando la misma generación
+            # el pool se agotaría antes que el LLM
+            await db.commit()
+            
+            if plan:
+                generate = functools.partial(
+                    self._generate_incremental_and_save,
+                    document_id, chunk_texts, chunk_ids, plan, cache_key, progress_callback,
+                )
+            else:
+                generate = functools.partial(
+                    self._generate_and_save,
+                    document_id, chunk_texts, chunk_ids, partial, cache_key, num_pairs, progress_callback,
+                )
+            
+            # Quien llega mientras otra petición genera el mismo documento
+            # recibe su resultado; las tarjetas ya las guardó la operación compartida
+            result, shared = await self.generations.do(self._flight_key(document_id, cache_key), generate)
+            cards = []
+            if result.get("parsed_flashcards"):
+                cards = await self.get_flashcards(db, document_id, page_start, page_end)
+            return {"result": result, "cards": cards, "cached": False, "shared": shared}
+        
+        cards = await self._cached_cards(db, document_id, result, chunk_ids, page_start, page_end)
+        return {"result": result, "cards": cards, "cached": True, "shared": False}
+    
+    async def _cached_cards(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        result: Dict[str, Any],
+        chunk_ids: List[int],
+        page_start: Optional[int],
+        page_end: Optional[int],
+    ) -> List[models.Flashcard]:
+        """
+        Tarjetas de un acierto de caché
+        
+        Si el documento (o el rango) ya tiene tarjetas se devuelven tal cual;
+        solo se guardan las del resultado cacheado cuando todavía no hay ninguna.
+        """
+        cards = await self.get_flashcards(db, document_id, page_start, page_end)
+        if cards or not result.get("parsed_flashcards"):
+            return cards
+        return await self.save_flashcards(
+            db,
+            document_id,
+            result["parsed_flashcards"].get("flashcards", []),
+            result,
+            chunk_ids,
+            page_start is not None or page_end is not None,
+        )
+    
+    @staticmethod
+    def plan_incremental(
+        chunk_hashes: List[str],
+        chunk_tokens: List[int],
+        previous_hashes: Set[str],
+        previous_cards: List[Tuple[Dict[str, Any], str]],
+        num_pairs: int,
+    ) -> Dict[str, Any]:
+        """
+        Decide qué tarjetas se copian de la versión anterior y qué fragmentos van al LLM
+        
+        Se copian las tarjetas cuyo fragmento de origen sigue existiendo (mismo
+        hash). Los fragmentos nuevos reciben tantas tarjetas como se perdieron
+        con los fragmentos que cambiaron, y como mínimo la parte de num_pairs
+        que les toca por su tamaño, repartidas con distribute_pairs.
+        
+        Args:
+            chunk_hashes: Hash de cada fragmento de la nueva versión, en orden
+            chunk_tokens: Tokens de cada fragmento de la nueva versión
+            previous_hashes: Hashes de todos los fragmentos de la versión anterior
+            previous_cards: (question y answer, hash de su fragmento) de cada
+                tarjeta de la versión anterior, en orden
+            num_pairs: Tarjetas que tendría una generación completa
+        
+        Returns:
+            Dict con carried (tarjetas copiadas, con el índice de su nuevo
+            fragmento en "chunk") y changed (índice y tarjetas a pedir de
+            cada fragmento que va al LLM)
+        """
+        index_by_hash: Dict[str, int] = {}
+        for index, chunk_hash in enumerate(chunk_hashes):
+            index_by_hash.setdefault(chunk_hash, index)
+        
+        carried = [
+            {**card, "chunk": index_by_hash[chunk_hash]}
+            for card, chunk_hash in previous_cards
+            if chunk_hash in index_by_hash
+        ]
+        changed = [index for index, chunk_hash in enumerate(chunk_hashes) if chunk_hash not in previous_hashes]
+        
+        pairs = 0
+        if changed:
+            lost = len(previous_cards) - len(carried)
+            changed_tokens = sum(chunk_tokens[index] for index in changed)
+            share = round(num_pairs * changed_tokens / (sum(chunk_tokens) or 1))
+            pairs = max(lost, share)
+        allocation = distribute_pairs([chunk_tokens[index] for index in changed], pairs)
+        
+        return {
+            "carried": carried,
+            "changed": [(index, count) for index, count in zip(changed, allocation) if count > 0],
+            "changed_chunks": len(changed),
+        }
+    
+    async def _incremental_plan(
+        self,
+        db: AsyncSession,
+        document: models.Docs,
+        chunks: List[models.DocumentChunk],
+        num_pairs: int,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Plan de generación incremental de una versión, o None si toca una generación completa
+        
+        Solo es incremental la primera generación de la versión (después,
+        regenerar es rehacerla entera) y solo si la versión anterior tiene
+        tarjetas con fragmento de origen.
+        """
+        already_generated = await db.scalar(
+            select(models.Flashcard.id).where(models.Flashcard.document_id == document.id_).limit(1)
+        )
+        if already_generated:
+            return None
+        
+        previous_id = document.previous_version_id
+        previous_cards = (await db.execute(
+            select(models.Flashcard.question, models.Flashcard.answer, models.DocumentChunk.content_hash)
+            .join(models.DocumentChunk, models.Flashcard.chunk_id == models.DocumentChunk.id)
+            .where(models.Flashcard.document_id == previous_id)
+            .order_by(models.Flashcard.position)
+        )).all()
+        if not previous_cards:
+            return None
+        
+        previous_hashes = set(await db.scalars(
+            select(models.DocumentChunk.content_hash).where(models.DocumentChunk.document_id == previous_id)
+        ))
+        plan = self.plan_incremental(
+            [chunk.content_hash for chunk in chunks],
+            [chunk.token_count for chunk in chunks],
+            previous_hashes,
+            [({"question": row.question, "answer": row.answer}, row.content_hash) for row in previous_cards],
+            num_pairs,
+        )
+        plan["previous_version_id"] = previous_id
+        logger.info(
+            f"Generación incremental del documento {document.id_}: {len(plan['carried'])} tarjetas copiadas "
+            f"de la versión {previous_id}, {plan['changed_chunks']} de {len(chunks)} fragmentos cambiados"
+        )
+        return plan
+    
+    async def _generate_incremental_and_save(
+        self,
+        document_id: int,
+        chunk_texts: List[str],
+        chunk_ids: List[int],
+        plan: Dict[str, Any],
+        cache_key: str,
+        progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Genera solo los fragmentos cambiados, les añade las tarjetas copiadas y guarda el resultado
+        
+        El resultado tiene el mismo formato que una generación completa y se
+        cachea con la misma clave, con el uso de tokens de las llamadas hechas.
+        """
+        changed = [index for index, _ in plan["changed"]]
+        llm_result = None
+        if changed:
+            # Una llamada por fragmento cambiado, con las tarjetas que le asignó el plan
+            llm_result = await llm_service.extract_flashcards(
+                text="\n\n".join(chunk_texts[index] for index in changed),
+                num_pairs=sum(count for _, count in plan["changed"]),
+                prompt_template=EXTRACT_QA_PAIRS_PROMPT,
+                model=settings.DEFAULT_MODEL,
+                temperature=llm_service.FLASHCARD_TEMPERATURE,
+                progress_callback=progress_callback,
+                chunks=[chunk_texts[index] for index in changed],
+                allocation=[count for _, count in plan["changed"]],
+            )
+        elif progress_callback:
+            await progress_callback(1, 1)
+        
+        generated = [
+            {**card, "chunk": changed[card.get("chunk", 0)]}
+            for card in ((llm_result or {}).get("parsed_flashcards") or {}).get("flashcards", [])
+        ]
+        return await self._save_incremental(
+            document_id, chunk_ids, plan, cache_key, generated, llm_result, len(chunk_texts)
+        )
+    
+    async def _save_incremental(
+        self,
+        document_id: int,
+        chunk_ids: List[int],
+        plan: Dict[str, Any],
+        cache_key: str,
+        generated: List[Dict[str, Any]],
+        llm_result: Optional[Dict[str, Any]],
+        total_chunks: int,
+    ) -> Dict[str, Any]:
+        """
+        Junta las tarjetas copiadas y las generadas, cachea el resultado y lo guarda
+        
+        Args:
+            document_id: ID del documento
+            chunk_ids: IDs de los fragmentos del documento, en orden
+            plan: Plan devuelto por _incremental_plan
+            cache_key: Clave de caché de la generación
+            generated: Tarjetas generadas, con el índice de su fragmento en "chunk"
+            llm_result: Resultado del LLM, o None si no cambió ningún fragmento
+            total_chunks: Fragmentos del documento
+        
+        Returns:
+            Resultado con el mismo formato que una generación completa
+        """
+        cards = sorted(plan["carried"] + generated, key=lambda card: card["chunk"])
+        parsed = {"flashcards": cards} if cards else None
+        result = {
+            "content": json.dumps(parsed, ensure_ascii=False) if parsed else "",
+            "model": llm_result["model"] if llm_result else settings.DEFAULT_MODEL,
+            "usage": llm_result["usage"] if llm_result else {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            "finish_reason": "stop",
+            "parsed_flashcards": parsed,
+            "incremental": {
+                "previous_version_id": plan["previous_version_id"],
+                "carried_over": len(plan["carried"]),
+                "generated": len(generated),
+                "changed_chunks": plan["changed_chunks"],
+                "total_chunks": total_chunks,
+            },
+        }
+        if llm_result and llm_result.get("usage_estimated"):
+            result["usage_estimated"] = True
+        
+        if parsed:
+            async with session_local() as db:
+                await flashcard_cache.set(cache_key, result, db)
+                await self.save_flashcards(db, document_id, cards, result, chunk_ids)
+        return result
+    
+    @staticmethod
+    async def _get_chunks(
+        db: AsyncSession,
+        document_id: int,
+        page_start: Optional[int],
+        page_end: Optional[int],
+    ) -> List[models.DocumentChunk]:
+        """Fragmentos a enviar al LLM, o EmptyPageRangeError si no hay ninguno"""
+        chunks = await chunk_service.get_chunks(db, document_id, page_start, page_end)
+        if not chunks:
+            raise EmptyPageRangeError(
+                f"El documento {document_id} no tiene texto en las páginas {page_start or 1}-{page_end or 'final'}"
+            )
+        return chunks
+    
+    async def _generate_and_save(
+        self,
+        document_id: int,
+        chunk_texts: List[str],
+        chunk_ids: List[int],
+        partial: bool,
+        cache_key: str,
+        num_pairs: int,
+        progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Llama al LLM, cachea el resultado y guarda las tarjetas
+        
+        Usa su propia sesión de base de datos porque puede seguir ejecutándose
+        después de que la petición que la lanzó se haya cancelado.
+        """
+        result = await llm_service.extract_flashcards(
+            text="\n\n".join(chunk_texts),
+            num_pairs=num_pairs,
+            prompt_template=EXTRACT_QA_PAIRS_PROMPT,
+            model=settings.DEFAULT_MODEL,
+            temperature=llm_service.FLASHCARD_TEMPERATURE,
+            progress_callback=progress_callback,
+            chunks=chunk_texts,
+        )
+        
+        # Solo se cachean las generaciones que se pudieron parsear
+        if result.get("parsed_flashcards"):
+            async with session_local() as db:
+                await flashcard_cache.set(cache_key, result, db)
+                await self.save_flashcards(
+                    db, document_id, result["parsed_flashcards"].get("flashcards", []), result, chunk_ids, partial
+                )
+        return result
+    
+    async def stream_flashcards(
+        self,
+        db: AsyncSession,
+        document: models.Docs,
+        num_pairs: int = DEFAULT_NUM_PAIRS,
+        page_start: Optional[int] = None,
+        page_end: Optional[int] = None,
+        force: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Genera flashcards entregando cada tarjeta en cuanto está completa
+        
+        Al terminar guarda las tarjetas y el resultado en caché igual que
+        generate_flashcards; un acierto de caché envía las tarjetas ya guardadas.
+        La primera generación de una nueva versión también es incremental: se
+        envían primero las tarjetas copiadas de la versión anterior y después
+        las de los fragmentos que cambiaron.
+        
+        Args:
+            db: Sesión de base de datos
+            document: Documento a procesar
+            num_pairs: Número de pares Q&A a generar
+            page_start: Primera página a procesar (incluida)
+            page_end: Última página a procesar (incluida)
+            force: Regenerar aunque el resultado esté en caché
+            
+        Yields:
+            Eventos {"type": "flashcard", ...} y un evento final {"type": "done", ...}
+        """
+        document_id = document.id_
+        partial = page_start is not None or page_end is not None
+        chunks = await self._get_chunks(db, document_id, page_start, page_end)
+        chunk_texts = [chunk.text for chunk in chunks]
+        chunk_ids = [chunk.id for chunk in chunks]
+        
+        cache_key = self._cache_key(chunk_service.join(chunks), num_pairs)
+        result = None if force else await flashcard_cache.get(cache_key, db)
+        cached = result is not None
+        flight_key = self._flight_key(document_id, cache_key)
+        
+        if cached:
+            cards = await self._cached_cards(db, document_id, result, chunk_ids, page_start, page_end)
+            for card in cards:
+                yield {"type": "flashcard", "flashcard": {"question": card.question, "answer": card.answer}}
+            yield {"type": "done", "result": result, "cards": cards, "cached": True}
+            return
+        
+        plan = None
+        if not partial and document.previous_version_id:
+            plan = await self._incremental_plan(db, document, chunks, num_pairs)
+        
+        # Misma clave que generate_flashcards: un POST o un stream que llegan
+        # mientras este genera esperan su resultado en lugar de llamar al LLM
+        await db.commit()
+        events: asyncio.Queue = asyncio.Queue()
+        if plan:
+            generate = functools.partial(
+                self._stream_incremental_and_save,
+                document_id, chunk_texts, chunk_ids, plan, cache_key, events,
+            )
+        else:
+            generate = functools.partial(
+                self._stream_and_save,
+                document_id, chunk_texts, chunk_ids, partial, cache_key, num_pairs, events,
+            )
+        flight = asyncio.ensure_future(self.generations.do(flight_key, generate))
+        flight.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            result, shared = await flight
+        finally:
+            # Si el cliente se desconecta la generación compartida sigue en curso
+            flight.cancel()
+        
+        cards = []
+        if result.get("parsed_flashcards"):
+            cards = await self.get_flashcards(db, document_id, page_start, page_end)
+        if shared:
+            # La generación era de otra petición: sus tarjetas se envían al terminar
+            for card in (result.get("parsed_flashcards") or {}).get("flashcards", []):
+                yield {"type": "flashcard", "flashcard": card}
+        yield {"type": "done", "result": result, "cards": cards, "cached": False}
+    
+    async def _stream_and_save(
+        self,
+        document_id: int,
+        chunk_texts: List[str],
+        chunk_ids: List[int],
+        partial: bool,
+        cache_key: str,
+        num_pairs: int,
+        events: asyncio.Queue,
+    ) -> Dict[str, Any]:
+        """
+        Genera en streaming, pone cada tarjeta en events y guarda el resultado
+        
+        Igual que _generate_and_save, usa su propia sesión de base de datos y
+        termina aunque el cliente del stream se desconecte.
+        """
+        result = None
+        async for event in llm_service.stream_flashcards(
+            text="\n\n".join(chunk_texts),
+            num_pairs=num_pairs,
+            prompt_template=EXTRACT_QA_PAIRS_PROMPT,
+            model=settings.DEFAULT_MODEL,
+            temperature=llm_service.FLASHCARD_TEMPERATURE,
+            chunks=chunk_texts,
+        ):
+            if event["type"] == "done":
+                result = event["result"]
+            else:
+                events.put_nowait(event)
+        
+        if result.get("parsed_flashcards"):
+            async with session_local() as db:
+                await flashcard_cache.set(cache_key, result, db)
+                await self.save_flashcards(
+                    db, document_id, result["parsed_flashcards"].get("flashcards", []), result, chunk_ids, partial
+                )
+        return result
+    
+    async def _stream_incremental_and_save(
+        self,
+        document_id: int,
+        chunk_texts: List[str],
+        chunk_ids: List[int],
+        plan: Dict[str, Any],
+        cache_key: str,
+        events: asyncio.Queue,
+    ) -> Dict[str, Any]:
+        """
+        Versión en streaming de _generate_incremental_and_save
+        
+        Pone en events las tarjetas copiadas y después, a medida que llegan,
+        las de los fragmentos cambiados; guarda el resultado igual que la
+        generación incremental sin streaming.
+        """
+        for card in plan["carried"]:
+            events.put_nowait({"type": "flashcard", "flashcard": card})
+        
+        changed = [index for index, _ in plan["changed"]]
+        generated: List[Dict[str, Any]] = []
+        llm_result = None
+        if changed:
+            async for event in llm_service.stream_flashcards(
+                text="\n\n".join(chunk_texts[index] for index in changed),
+                num_pairs=sum(count for _, count in plan["changed"]),
+                prompt_template=EXTRACT_QA_PAIRS_PROMPT,
+                model=settings.DEFAULT_MODEL,
+                temperature=llm_service.FLASHCARD_TEMPERATURE,
+                chunks=[chunk_texts[index] for index in changed],
+                allocation=[count for _, count in plan["changed"]],
+            ):
+                if event["type"] == "done":
+                    llm_result = event["result"]
+                    continue
+                card = {**event["flashcard"], "chunk": changed[event["flashcard"].get("chunk", 0)]}
+                generated.append(card)
+                events.put_nowait({"type": "flashcard", "flashcard": card})
+        
+        return await self._save_incremental(
+            document_id, chunk_ids, plan, cache_key, generated, llm_result, len(chunk_texts)
+        )
+
+
+# Instancia global del servicio
+flashcard_service = FlashcardService()
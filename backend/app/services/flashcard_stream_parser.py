@@ -0,0 +1,184 @@
+"""
+Parser incremental y tolerante de flashcards en JSON
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FlashcardStreamParser:
+    """
+    Extrae objetos {"question", "answer"} de un JSON que llega por partes.
+    
+    Recorre cada carácter una sola vez llevando la pila de contenedores abiertos
+    y si está dentro de un string. Cuando se cierra un objeto que vive dentro de
+    un array, ese objeto está completo y se puede emitir sin esperar al resto de
+    la respuesta. Los caracteres fuera del JSON (por ejemplo ```json) se ignoran.
+    """
+    
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._position = 0
+        # Pila de (tipo de contenedor, posición de apertura)
+        self._stack: List[tuple] = []
+        self._in_string = False
+        self._escaped = False
+        self.emitted = 0
+    
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Procesa un nuevo fragmento de texto
+        
+        Args:
+            text: Fragmento recibido del LLM
+            
+        Returns:
+            Flashcards que quedaron completas con este fragmento
+        """
+        completed: List[Dict[str, Any]] = []
+        
+        for char in text:
+            self._buffer.append(char)
+            position = self._position
+            self._position += 1
+            
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            
+            if char == '"':
+                # Solo cuentan los strings dentro del JSON
+                if self._stack:
+                    self._in_string = True
+            elif char in "{[":
+                self._stack.append((char, position))
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                opener, start = self._stack.pop()
+                if char == "}" and opener == "{" and self._stack and self._stack[-1][0] == "[":
+                    card = self._parse_card("".join(self._buffer[start:position + 1]))
+                    if card is not None:
+                        completed.append(card)
+                if not self._stack:
+                    # Fin del JSON de nivel superior: ya no hace falta el buffer
+                    self._buffer = []
+                    self._position = 0
+        
+        self.emitted += len(completed)
+        return completed
+    
+    @staticmethod
+    def _parse_card(raw: str):
+        """Valida que el objeto completo sea una flashcard"""
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            try:
+                value = json.loads(strip_trailing_commas(raw))
+            except json.JSONDecodeError:
+                logger.warning(f"Objeto JSON inválido en el stream: {raw[:100]}")
+                return None
+        return validate_card(value)
+
+
+def validate_card(value: Any) -> Optional[Dict[str, str]]:
+    """Devuelve la flashcard normalizada, o None si le falta la pregunta o la respuesta"""
+    if not isinstance(value, dict):
+        return None
+    question = value.get("question") or value.get("pregunta")
+    answer = value.get("answer") or value.get("respuesta")
+    if not isinstance(question, (str, int, float)) or not isinstance(answer, (str, int, float)):
+        return None
+    question, answer = str(question).strip(), str(answer).strip()
+    if not question or not answer:
+        return None
+    return {"question": question, "answer": answer}
+
+
+def strip_trailing_commas(raw: str) -> str:
+    """Quita las comas antes de } o ] fuera de los strings, en una sola pasada"""
+    output: List[str] = []
+    in_string = False
+    escaped = False
+    pending_comma = None
+    for char in raw:
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if pending_comma is not None:
+            if char in " \t\r\n":
+                pending_comma.append(char)
+                continue
+            if char not in "}]":
+                output.extend(pending_comma)
+            else:
+                output.extend(pending_comma[1:])
+            pending_comma = None
+        if char == ",":
+            pending_comma = [char]
+            continue
+        if char == '"':
+            in_string = True
+        output.append(char)
+    if pending_comma is not None:
+        output.extend(pending_comma)
+    return "".join(output)
+
+
+def _strip_fences(content: str) -> str:
+    """Quita un bloque ```json ... ``` que envuelva toda la respuesta"""
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def parse_flashcards(content: str) -> Dict[str, Any]:
+    """
+    Extrae todas las flashcards completas de la respuesta del LLM
+    
+    Primero intenta un json.loads estricto (tras quitar bloques de código). Si
+    falla, recorre la respuesta con FlashcardStreamParser en tiempo lineal y
+    recupera cada objeto completo, tolerando comas finales, texto alrededor
+    del JSON y arrays truncados por max_tokens.
+    
+    Args:
+        content: Contenido crudo de la respuesta
+        
+    Returns:
+        Dict con "flashcards" (lista, posiblemente vacía), "status" ("ok",
+        "recovered" o "failed") y "error" con el motivo si no fue estricto
+    """
+    if not content or not content.strip():
+        return {"flashcards": [], "status": "failed", "error": "Respuesta vacía"}
+    
+    try:
+        value = json.loads(_strip_fences(content))
+        items = value.get("flashcards") if isinstance(value, dict) else value
+        if isinstance(items, list):
+            cards = [card for card in map(validate_card, items) if card is not None]
+            if cards:
+                return {"flashcards": cards, "status": "ok", "error": None}
+        error = "El JSON no contiene flashcards válidas"
+    except json.JSONDecodeError as e:
+        error = str(e)
+    
+    cards = FlashcardStreamParser().feed(content)
+    return {"flashcards": cards, "status": "recovered" if cards else "failed", "error": error}
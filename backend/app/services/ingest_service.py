@@ -0,0 +1,158 @@
+"""
+Ingesta por lotes de documentos ya guardados en disco
+"""
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..config import settings
+from .chunk_service import chunk_service
+from .document_service import document_service
+
+logger = logging.getLogger(__name__)
+
+
+class IngestService:
+    """
+    Procesa varios archivos a la vez y los guarda en una sola transacción.
+    
+    La extracción de todos los archivos corre en paralelo (acotada por
+    BATCH_EXTRACTION_CONCURRENCY) y los documentos resultantes se insertan con
+    un único commit. Un archivo que falla solo marca su propio resultado como
+    error; el resto del lote se guarda igualmente.
+    """
+    
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """Calcula el SHA-256 de un archivo leyéndolo por bloques"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    async def ingest(self, db: AsyncSession, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Extrae y guarda un lote de archivos
+        
+        Args:
+            db: Sesión de base de datos
+            items: Dicts con path, filename, content_type y sha256 de cada archivo
+        
+        Returns:
+            Un resultado por archivo, en el mismo orden, con status
+            "created", "deduplicated" o "error"
+        """
+        results: List[Dict[str, Any]] = [
+            {"filename": item["filename"], "status": None, "document_id": None, "error": None}
+            for item in items
+        ]
+        
+        # Duplicados contra la base de datos (una sola consulta) y dentro del lote
+        hashes = {item["sha256"] for item in items}
+        existing = dict((await db.execute(
+            select(models.Docs.content_hash, models.Docs.id_)
+            .where(models.Docs.content_hash.in_(hashes))
+        )).all()) if hashes else {}
+        
+        to_extract: List[int] = []
+        first_in_batch: Dict[str, int] = {}
+        for index, item in enumerate(items):
+            if item["sha256"] in existing:
+                results[index].update(status="deduplicated", document_id=existing[item["sha256"]])
+            elif item["sha256"] in first_in_batch:
+                results[index]["duplicate_of"] = first_in_batch[item["sha256"]]
+            else:
+                first_in_batch[item["sha256"]] = index
+                to_extract.append(index)
+        
+        semaphore = asyncio.Semaphore(settings.BATCH_EXTRACTION_CONCURRENCY)
+        
+        async def extract(index: int) -> Dict[str, Any]:
+            item = items[index]
+            async with semaphore:
+                return await document_service.process_document_async(
+                    file_path=item["path"],
+                    filename=item["filename"],
+                    content_type=item.get("content_type") or "",
+                )
+        
+        extracted = await asyncio.gather(*(extract(i) for i in to_extract), return_exceptions=True)
+        
+        pending: List[tuple] = []
+        for index, processed in zip(to_extract, extracted):
+            if isinstance(processed, BaseException):
+                logger.error(f"Error procesando {items[index]['filename']}: {processed}")
+                results[index].update(status="error", error=str(processed))
+            elif not processed["text"].strip():
+                results[index].update(status="error", error="No se pudo extraer texto del documento")
+            else:
+                results[index].update(
+                    file_type=processed["file_type"],
+                    text_length=processed["text_length"],
+                    normalization=processed["normalization"],
+                )
+                pending.append((index, models.Docs(
+                    raw_text=processed["text"],
+                    created_at=str(datetime.now().date()),
+                    content_hash=items[index]["sha256"],
+                ), processed["chunks"]))
+        
+        await self._insert(db, pending, results)
+        
+        # Los duplicados dentro del lote apuntan al documento del primero
+        for result in results:
+            if "duplicate_of" in result:
+                original = results[result.pop("duplicate_of")]
+                result.update(
+                    status="deduplicated" if original["document_id"] else "error",
+                    document_id=original["document_id"],
+                    error=None if original["document_id"] else original.get("error"),
+                )
+        return results
+    
+    async def _insert(self, db: AsyncSession, pending: List[tuple], results: List[Dict[str, Any]]):
+        """Inserta los documentos en un único commit, o uno a uno si el lote choca"""
+        if not pending:
+            return
+        
+        try:
+            db.add_all([doc for _, doc, _ in pending])
+            await db.flush()
+            for _, doc, chunks in pending:
+                await chunk_service.add(db, doc.id_, chunks)
+            await db.commit()
+            for index, doc, _ in pending:
+                results[index].update(status="created", document_id=doc.id_)
+            return
+        except IntegrityError:
+            # Otra subida guardó el mismo contenido mientras se extraía este lote
+            await db.rollback()
+            logger.warning("Conflicto de hash en inserción por lotes, se guarda documento a documento")
+        
+        for index, doc, chunks in pending:
+            fresh = models.Docs(raw_text=doc.raw_text, created_at=doc.created_at, content_hash=doc.content_hash)
+            try:
+                db.add(fresh)
+                await db.flush()
+                await chunk_service.add(db, fresh.id_, chunks)
+                await db.commit()
+                results[index].update(status="created", document_id=fresh.id_)
+            except IntegrityError:
+                await db.rollback()
+                existing = await db.scalar(
+                    select(models.Docs.id_).where(models.Docs.content_hash == doc.content_hash)
+                )
+                results[index].update(status="deduplicated", document_id=existing)
+
+
+# Instancia global del servicio
+ingest_service = IngestService()
@@ -0,0 +1,245 @@
+"""
+Trabajos de generación de flashcards en segundo plano
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..config import settings
+from ..database import session_local
+from .flashcard_service import flashcard_service
+from .rate_limiter import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+class JobService:
+    """
+    Cola de trabajos de generación guardada en base de datos.
+    
+    Las peticiones HTTP solo crean la fila del trabajo y la encolan; un pool
+    acotado de tareas asyncio ejecuta la generación. Como el estado vive en la
+    tabla generation_jobs, los trabajos pendientes (o abandonados por un worker
+    caído) se retoman al arrancar.
+    """
+    
+    def __init__(self, workers: int = settings.GENERATION_WORKERS):
+        self._num_workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+    
+    async def start(self):
+        """Arranca el pool de workers y reencola los trabajos pendientes"""
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self._num_workers)
+        ]
+        
+        async with session_local() as db:
+            for job_id in await self._recoverable_jobs(db):
+                self._queue.put_nowait(job_id)
+    
+    async def stop(self):
+        """Detiene los workers; los trabajos en curso se retoman en el próximo arranque"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    async def enqueue(self, db: AsyncSession, document_id: int) -> models.GenerationJob:
+        """
+        Crea un trabajo de generación para un documento
+        
+        Si el documento ya tiene un trabajo activo se devuelve ese mismo, de modo
+        que un reintento del cliente no lanza una segunda llamada al LLM.
+        
+        Args:
+            db: Sesión de base de datos
+            document_id: ID del documento
+            
+        Returns:
+            Trabajo nuevo o el que ya estaba activo
+        """
+        active = await db.scalar(
+            select(models.GenerationJob)
+            .where(
+                models.GenerationJob.document_id == document_id,
+                models.GenerationJob.status.in_(ACTIVE_STATUSES),
+            )
+            .order_by(models.GenerationJob.id.desc())
+            .limit(1)
+        )
+        if active:
+            return active
+        
+        job = models.GenerationJob(document_id=document_id, status="pending")
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        return job
+    
+    @staticmethod
+    async def get_job(db: AsyncSession, job_id: int) -> Optional[models.GenerationJob]:
+        """Obtiene un trabajo por su ID"""
+        return await db.get(models.GenerationJob, job_id)
+    
+    @staticmethod
+    async def _recoverable_jobs(db: AsyncSession) -> List[int]:
+        """IDs de trabajos pendientes o en curso sin latido reciente"""
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.GENERATION_JOB_STALE_SECONDS)
+        rows = await db.scalars(
+            select(models.GenerationJob.id)
+            .where(
+                (models.GenerationJob.status == "pending")
+                | (
+                    (models.GenerationJob.status == "running")
+                    & (models.GenerationJob.updated_at < stale_before)
+                )
+            )
+            .order_by(models.GenerationJob.id)
+        )
+        return list(rows)
+    
+    @staticmethod
+    async def _claim(db: AsyncSession, job_id: int) -> bool:
+        """
+        Marca el trabajo como running solo si nadie más lo tomó
+        
+        El UPDATE condicional es atómico, así que con varios workers de uvicorn
+        recuperando la misma cola cada trabajo se ejecuta una sola vez.
+        """
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=settings.GENERATION_JOB_STALE_SECONDS)
+        result = await db.execute(
+            update(models.GenerationJob)
+            .where(
+                models.GenerationJob.id == job_id,
+                (models.GenerationJob.status == "pending")
+                | (
+                    (models.GenerationJob.status == "running")
+                    & (models.GenerationJob.updated_at < stale_before)
+                ),
+            )
+            .values(status="running", started_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+    
+    async def _worker(self, index: int):
+        """Bucle de un worker: toma trabajos de la cola y los ejecuta"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker {index}: error inesperado en el trabajo {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def _run(self, job_id: int):
+        """Ejecuta un trabajo de generación y guarda su resultado"""
+        async with session_local() as db:
+            if not await self._claim(db, job_id):
+                return
+            
+            job = await db.get(models.GenerationJob, job_id)
+            # El texto se lee de los fragmentos guardados, no hace falta descomprimir el documento
+            document = await db.get(models.Docs, job.document_id)
+            if not document or not document.text_length:
+                await self._finish(db, job, "failed", error="El documento no contiene texto para procesar")
+                return
+            
+            # Los fragmentos avisan en paralelo y la sesión no admite operaciones simultáneas
+            progress_lock = asyncio.Lock()
+            
+            async def report_progress(completed: int, total: int):
+                async with progress_lock:
+                    job.completed_steps = completed
+                    job.total_steps = total
+                    job.updated_at = datetime.utcnow()
+                    await db.commit()
+            
+            logger.info(f"Ejecutando trabajo de generación {job_id} (documento {job.document_id})")
+            # El progreso solo avisa al terminar cada fragmento: una sola llamada
+            # larga dejaría el trabajo sin latido y otro worker lo reclamaría
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                generation = await flashcard_service.generate_flashcards(
+                    db, document, progress_callback=report_progress
+                )
+            except RateLimitExceeded as e:
+                # El trabajo vuelve a la cola en lugar de fallar
+                await db.rollback()
+                logger.warning(f"Trabajo {job_id} pospuesto {e.retry_after:.1f}s por límite de tasa del LLM")
+                job.status = "pending"
+                job.updated_at = datetime.utcnow()
+                await db.commit()
+                # El reencolado diferido solo vive en memoria: si el worker se
+                # reinicia antes, start() recupera el trabajo porque sigue pending
+                asyncio.get_running_loop().call_later(e.retry_after, self._queue.put_nowait, job_id)
+                return
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Error en el trabajo de generación {job_id}: {e}")
+                await self._finish(db, job, "failed", error=f"Error interno generando flashcards: {str(e)}")
+                return
+            finally:
+                heartbeat.cancel()
+            
+            if not generation["cards"]:
+                await self._finish(db, job, "failed", error="No se pudieron generar flashcards válidas")
+                return
+            
+            job.flashcards_count = len(generation["cards"])
+            await self._finish(db, job, "completed")
+    
+    @staticmethod
+    async def _heartbeat(job_id: int, interval: float = settings.GENERATION_JOB_HEARTBEAT_SECONDS):
+        """
+        Actualiza updated_at de un trabajo en curso cada interval segundos
+        
+        Usa su propia sesión porque la del trabajo está ocupada con la generación.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_local() as db:
+                    await db.execute(
+                        update(models.GenerationJob)
+                        .where(models.GenerationJob.id == job_id, models.GenerationJob.status == "running")
+                        .values(updated_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudo actualizar el latido del trabajo {job_id}: {e}")
+    
+    @staticmethod
+    async def _finish(db: AsyncSession, job: models.GenerationJob, status: str, error: Optional[str] = None):
+        """Cierra un trabajo con su estado final"""
+        now = datetime.utcnow()
+        job.status = status
+        job.error = error
+        job.updated_at = now
+        job.finished_at = now
+        await db.commit()
+
+
+# Instancia global del servicio
+job_service = JobService()
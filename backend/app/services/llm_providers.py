@@ -0,0 +1,529 @@
+"""
+Proveedores LLM compatibles con OpenAI, con hedging y failover
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .. import metrics
+from ..config import settings
+from .rate_limiter import RateLimiter, RateLimitExceeded, rate_limiter
+from .tokenizer import count_tokens
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+# Tokens que añade el formato de chat por cada mensaje
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class LLMProvider:
+    """
+    Un backend compatible con la API de chat completions de OpenAI.
+    
+    Sirve tanto para OpenAI como para servidores locales (llama.cpp, vLLM,
+    Ollama...). Cada proveedor tiene su propio pool de conexiones, su límite de
+    llamadas simultáneas, sus límites de tasa (RPM/TPM), una ventana con sus
+    latencias recientes y su estado de salud.
+    
+    Los reintentos los hace el propio proveedor y no el SDK de OpenAI (que se
+    crea con max_retries=0): cada intento pasa por el limitador de tasa, los
+    429 pausan el proveedor para todos los workers y el backoff exponencial
+    con jitter respeta Retry-After.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: Optional[str] = None,
+        max_concurrent_requests: int = settings.LLM_MAX_CONCURRENT_REQUESTS,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        json_mode: bool = True,
+        rpm: int = settings.LLM_RATE_LIMIT_RPM,
+        tpm: int = settings.LLM_RATE_LIMIT_TPM,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.rpm = rpm
+        self.tpm = tpm
+        self._limiter = limiter or rate_limiter
+        # Si el backend rechaza response_format se desactiva al primer error
+        self.json_mode = json_mode
+        self.model = model
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client = None
+        self._http_client = None
+        # Limita las llamadas simultáneas a este proveedor dentro del worker
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._latencies: deque = deque(maxlen=settings.LLM_HEDGE_WINDOW)
+        self.healthy = True
+        self.consecutive_failures = 0
+    
+    @property
+    def client(self) -> "openai.AsyncOpenAI":
+        """Lazy initialization del cliente OpenAI asíncrono con pool de conexiones"""
+        if self._client is None:
+            # El SDK y httpx tardan en importarse y el arranque no los necesita
+            import httpx
+            import openai
+            
+            if not self._api_key or self._api_key == "your_openai_api_key_here":
+                raise ValueError(
+                    f"API key no configurada para el proveedor {self.name}. "
+                    "Por favor configura OPENAI_API_KEY o LLM_PROVIDERS en tu archivo .env"
+                )
+            # Un único cliente HTTP compartido reutiliza las conexiones keep-alive
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    settings.LLM_REQUEST_TIMEOUT,
+                    connect=settings.LLM_CONNECT_TIMEOUT,
+                ),
+            )
+            self._client = openai.AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=self._http_client,
+                max_retries=0,
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Cierra el cliente HTTP y libera las conexiones del pool"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._client = None
+        self._http_client = None
+    
+    def resolve_model(self, model: str) -> str:
+        """Los proveedores con modelo propio (servidores locales) lo imponen"""
+        return self.model or model
+    
+    def _request_options(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Quita las opciones que este proveedor no soporta"""
+        if not self.json_mode or kwargs.get("response_format") is None:
+            kwargs.pop("response_format", None)
+        return kwargs
+    
+    def _disable_json_mode(self, error: Exception) -> bool:
+        """Desactiva response_format si el error indica que el backend no lo soporta"""
+        import openai
+        
+        if self.json_mode and isinstance(error, openai.BadRequestError) and "response_format" in str(error):
+            logger.warning(f"El proveedor LLM {self.name} no soporta response_format; se desactiva")
+            self.json_mode = False
+            return True
+        return False
+    
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        """Cuantil de las latencias recientes, o None si aún no hay suficientes muestras"""
+        if len(self._latencies) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+    
+    def record_success(self, latency: Optional[float] = None):
+        if latency is not None:
+            self._latencies.append(latency)
+        self.consecutive_failures = 0
+        self._set_healthy(True)
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.LLM_PROVIDER_FAILURE_THRESHOLD:
+            self._set_healthy(False)
+    
+    def _set_healthy(self, healthy: bool):
+        if healthy != self.healthy:
+            logger.warning(f"Proveedor LLM {self.name} {'recuperado' if healthy else 'marcado como no disponible'}")
+        self.healthy = healthy
+        metrics.LLM_PROVIDER_HEALTHY.labels(self.name).set(1 if healthy else 0)
+    
+    def estimate_tokens(self, model: str, kwargs: Dict[str, Any]) -> int:
+        """Tokens que la petición descuenta del límite TPM: prompt más max_tokens"""
+        prompt = sum(
+            count_tokens(message.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS
+            for message in kwargs.get("messages", [])
+        )
+        return prompt + (kwargs.get("max_tokens") or settings.MAX_TOKENS)
+    
+    async def _send(self, model: str, started: Optional[asyncio.Event] = None, **kwargs) -> Any:
+        """
+        Envía la petición respetando los límites de tasa y reintentando los
+        errores transitorios
+        
+        Args:
+            model: Modelo ya resuelto para este proveedor
+            started: Evento que se activa cuando la primera petición sale
+            **kwargs: Argumentos de chat.completions.create
+        """
+        import openai
+        
+        cost = self.estimate_tokens(model, kwargs)
+        attempt = 0
+        while True:
+            await self._limiter.acquire(self.name, self.rpm, self.tpm, cost)
+            if started is not None:
+                started.set()
+            try:
+                return await self.client.chat.completions.create(model=model, **self._request_options(kwargs))
+            except openai.BadRequestError as e:
+                if not self._disable_json_mode(e):
+                    raise
+                continue
+            except Exception as e:
+                reason = _retry_reason(e)
+                if reason is None:
+                    raise
+                delay = _retry_delay(e, attempt)
+                if reason == "rate_limit" and (self.rpm or self.tpm):
+                    # Pausa también a los demás workers, que comparten el bucket
+                    await self._limiter.block(self.name, delay)
+                if attempt >= self.max_retries:
+                    if reason == "rate_limit":
+                        metrics.LLM_RATE_LIMITED.labels(self.name).inc()
+                        raise RateLimitExceeded(
+                            f"El proveedor LLM {self.name} sigue devolviendo 429: {e}", retry_after=delay
+                        ) from e
+                    raise
+                attempt += 1
+                metrics.LLM_RETRIES.labels(self.name, reason).inc()
+                logger.warning(
+                    f"Error transitorio del proveedor LLM {self.name} ({reason}), "
+                    f"reintento {attempt}/{self.max_retries} en {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+    
+    async def create(self, started: Optional[asyncio.Event] = None, **kwargs) -> Any:
+        """
+        Llama a chat.completions.create registrando latencia y salud
+        
+        Args:
+            started: Evento que se activa cuando la llamada sale, tras la espera
+                del semáforo y de los límites de tasa
+            **kwargs: Argumentos de chat.completions.create
+        """
+        model = self.resolve_model(kwargs.pop("model"))
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._send(model, started=started, **kwargs)
+            except asyncio.CancelledError:
+                # Perder un hedge no es un fallo del proveedor
+                raise
+            except RateLimitExceeded:
+                # Estar al límite de tasa no significa que el proveedor esté caído
+                metrics.record_llm_call(model, "completion", "rate_limited", time.perf_counter() - start, provider=self.name)
+                raise
+            except Exception:
+                metrics.record_llm_call(model, "completion", "error", time.perf_counter() - start, provider=self.name)
+                self.record_failure()
+                raise
+        duration = time.perf_counter() - start
+        self.record_success(duration)
+        metrics.record_llm_call(model, "completion", "success", duration, _usage(response), provider=self.name)
+        return response
+    
+    async def stream(self, **kwargs) -> AsyncIterator[str]:
+        """
+        Abre una chat completion en streaming y entrega el texto a medida que llega
+        
+        Solo se reintenta la apertura del stream; un error a mitad de respuesta
+        se propaga porque el texto ya entregado no se puede repetir.
+        """
+        model = self.resolve_model(kwargs.pop("model"))
+        async with self._semaphore:
+            start = time.perf_counter()
+            status = "error"
+            try:
+                stream = await self._send(model, stream=True, **kwargs)
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                    status = "success"
+                finally:
+                    # Cierra la conexión si el consumidor abandona el stream
+                    await stream.response.aclose()
+            except (asyncio.CancelledError, GeneratorExit):
+                status = "cancelled"
+                raise
+            except RateLimitExceeded:
+                status = "rate_limited"
+                raise
+            except Exception:
+                self.record_failure()
+                raise
+            finally:
+                metrics.record_llm_call(model, "stream", status, time.perf_counter() - start, provider=self.name)
+        self.record_success()
+    
+    async def check_health(self) -> bool:
+        """Comprueba que el proveedor responde listando sus modelos"""
+        try:
+            await asyncio.wait_for(self.client.models.list(), timeout=settings.LLM_CONNECT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Health check fallido para el proveedor LLM {self.name}: {e}")
+            self._set_healthy(False)
+            return False
+        self.consecutive_failures = 0
+        self._set_healthy(True)
+        return True
+
+
+def _retry_reason(error: Exception) -> Optional[str]:
+    """Motivo del reintento si el error es transitorio, o None si no se debe reintentar"""
+    import openai
+    
+    if isinstance(error, openai.RateLimitError):
+        # Sin saldo no se arregla esperando
+        return None if error.code == "insufficient_quota" else "rate_limit"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    if isinstance(error, openai.APIStatusError) and (error.status_code >= 500 or error.status_code in (408, 409)):
+        return "server_error"
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Segundos indicados por las cabeceras retry-after-ms o Retry-After de la respuesta"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Espera antes del siguiente intento
+    
+    Si el proveedor envía Retry-After se respeta (con un 10% de jitter para no
+    volver todos a la vez); si no, backoff exponencial con jitter completo.
+    """
+    retry_after = _retry_after(error)
+    if retry_after is not None and retry_after >= 0:
+        return min(retry_after, settings.LLM_RETRY_MAX_DELAY) * random.uniform(1.0, 1.1)
+    ceiling = min(settings.LLM_RETRY_BASE_DELAY * 2 ** attempt, settings.LLM_RETRY_MAX_DELAY)
+    return random.uniform(0, ceiling)
+
+
+def _usage(response: Any) -> Optional[Dict[str, int]]:
+    if getattr(response, "usage", None) is None:
+        return None
+    return {
+        "prompt_tokens": response.usage.prompt_tokens,
+        "completion_tokens": response.usage.completion_tokens,
+    }
+
+
+class ProviderPool:
+    """
+    Reparte las llamadas entre los proveedores configurados.
+    
+    Los proveedores se prueban en el orden configurado, saltando los marcados
+    como no disponibles. Una llamada se "cubre" (hedging) cuando el proveedor
+    principal no ha respondido al llegar al cuantil LLM_HEDGE_QUANTILE de sus
+    latencias recientes: se lanza la misma petición al siguiente proveedor
+    disponible (o al mismo si es el único) y se cancela la que pierda. Con el
+    cuantil 0.95 solo se duplica en torno a un 5% de las llamadas, y
+    LLM_HEDGE_MAX_RATIO pone un tope duro al coste extra.
+    
+    Un proveedor deja de usarse tras LLM_PROVIDER_FAILURE_THRESHOLD errores
+    seguidos y vuelve cuando pasa un health check periódico.
+    """
+    
+    def __init__(self, providers: List[LLMProvider]):
+        if not providers:
+            raise ValueError("Se necesita al menos un proveedor LLM")
+        self.providers = providers
+        self._requests = 0
+        self._hedges = 0
+        self._health_task: Optional[asyncio.Task] = None
+    
+    def candidates(self) -> List[LLMProvider]:
+        """Proveedores disponibles en orden de prioridad; todos si ninguno lo está"""
+        healthy = [provider for provider in self.providers if provider.healthy]
+        return healthy or list(self.providers)
+    
+    def _hedge_delay(self, provider: LLMProvider) -> Optional[float]:
+        if not settings.LLM_HEDGE_ENABLED:
+            return None
+        if self._hedges >= settings.LLM_HEDGE_MAX_RATIO * self._requests:
+            return None
+        quantile = provider.latency_quantile(settings.LLM_HEDGE_QUANTILE)
+        if quantile is None:
+            return None
+        return max(quantile, settings.LLM_HEDGE_MIN_DELAY)
+    
+    async def create(self, **kwargs) -> Tuple[LLMProvider, Any]:
+        """
+        Ejecuta una chat completion con hedging y failover
+        
+        Returns:
+            Tupla (proveedor que respondió, respuesta)
+        """
+        candidates = self.candidates()
+        self._requests += 1
+        
+        tasks: Dict[asyncio.Task, LLMProvider] = {}
+        
+        def launch(provider: LLMProvider, started: Optional[asyncio.Event] = None) -> asyncio.Task:
+            task = asyncio.create_task(provider.create(started=started, **kwargs))
+            tasks[task] = provider
+            return task
+        
+        next_index = 1
+        started = asyncio.Event()
+        primary_task = launch(candidates[0], started)
+        hedge_delay = self._hedge_delay(candidates[0])
+        hedged = False
+        last_error: Optional[BaseException] = None
+        waiter: Optional[asyncio.Task] = None
+        
+        try:
+            if hedge_delay is not None:
+                # El plazo del hedge se cuenta desde que la llamada sale, no
+                # desde que entra en la cola del semáforo del proveedor
+                waiter = asyncio.create_task(started.wait())
+                await asyncio.wait({primary_task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            
+            while tasks:
+                timeout = hedge_delay if not hedged else None
+                done, _ = await asyncio.wait(tasks.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    # El principal supera su cuantil de latencia: se cubre la petición
+                    hedged = True
+                    self._hedges += 1
+                    target = candidates[next_index] if next_index < len(candidates) else candidates[0]
+                    next_index += 1
+                    logger.info(f"Hedging de la llamada al LLM hacia {target.name}")
+                    launch(target)
+                    continue
+                
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            outcome = "primary" if task is primary_task else "hedge"
+                            metrics.LLM_HEDGED_REQUESTS.labels(outcome).inc()
+                        return provider, task.result()
+                    last_error = task.exception()
+                    logger.warning(f"Error del proveedor LLM {provider.name}: {last_error}")
+                
+                # Failover: si no queda ninguna llamada en curso se pasa al siguiente
+                if not tasks and next_index < len(candidates):
+                    metrics.LLM_FAILOVERS.labels(candidates[next_index].name).inc()
+                    launch(candidates[next_index])
+                    next_index += 1
+                    hedged = True  # Sin más hedging tras un failover
+        finally:
+            if waiter is not None:
+                waiter.cancel()
+            for task in tasks:
+                task.cancel()
+        
+        raise last_error
+    
+    async def stream(self, **kwargs) -> AsyncIterator[str]:
+        """
+        Respuesta en streaming, pasando al siguiente proveedor si falla antes
+        del primer fragmento
+        
+        El hedging no aplica a streams: una vez llega el primer fragmento la
+        respuesta ya se está entregando al cliente y no se puede cambiar de
+        proveedor.
+        """
+        last_error: Optional[Exception] = None
+        for index, provider in enumerate(self.candidates()):
+            if index > 0:
+                metrics.LLM_FAILOVERS.labels(provider.name).inc()
+            deltas = provider.stream(**kwargs)
+            try:
+                first = await deltas.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                logger.warning(f"Error del proveedor LLM {provider.name}: {e}")
+                last_error = e
+                continue
+            
+            try:
+                yield first
+                async for delta in deltas:
+                    yield delta
+            finally:
+                await deltas.aclose()
+            return
+        raise last_error
+    
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(settings.LLM_HEALTH_CHECK_INTERVAL)
+            await asyncio.gather(*(provider.check_health() for provider in self.providers))
+    
+    def start(self):
+        """Arranca los health checks periódicos (solo tienen sentido con failover)"""
+        if len(self.providers) > 1 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+    
+    async def aclose(self):
+        """Detiene los health checks y cierra los clientes HTTP"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for provider in self.providers:
+            await provider.aclose()
+
+
+def build_providers() -> List[LLMProvider]:
+    """Crea los proveedores de LLM_PROVIDERS, o uno solo a partir de OPENAI_*"""
+    return [
+        LLMProvider(
+            name=config.get("name", f"provider{index}"),
+            # La clave de OpenAI solo se envía a OpenAI; los servidores locales suelen ignorarla
+            api_key=config.get("api_key") or (settings.OPENAI_API_KEY if not config.get("base_url") else "sk-no-key"),
+            base_url=config.get("base_url"),
+            model=config.get("model"),
+            max_concurrent_requests=config.get("max_concurrent_requests", settings.LLM_MAX_CONCURRENT_REQUESTS),
+            # Con varios proveedores conviene bajar los reintentos para que el failover sea rápido
+            max_retries=config.get("max_retries", settings.LLM_MAX_RETRIES),
+            json_mode=config.get("json_mode", True),
+            rpm=config.get("rpm", settings.LLM_RATE_LIMIT_RPM),
+            tpm=config.get("tpm", settings.LLM_RATE_LIMIT_TPM),
+        )
+        for index, config in enumerate(settings.get_llm_providers())
+    ]
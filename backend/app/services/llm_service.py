@@ -2,71 +2,61 @@
 Servicio genérico para interacciones con LLM (OpenAI)
 """
 
+import asyncio
 import json
 import logging
 import re
-from typing import Any, Dict, List, Optional
+import unicodedata
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
-import openai
+from .. import metrics
 from ..config import settings
+from .flashcard_stream_parser import FlashcardStreamParser, parse_flashcards
+from .llm_providers import LLMProvider, ProviderPool, build_providers
+from .rate_limiter import RateLimitExceeded
+from .text_chunker import chunk_text, distribute_pairs
+from .tokenizer import count_tokens
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FLASHCARD_SYSTEM_MESSAGE = "Eres un asistente experto en educación que crea flashcards efectivas. Responde ÚNICAMENTE con JSON válido, sin markdown ni texto adicional."
+
 
 class LLMService:
     """Wrapper genérico para llamadas a LLM"""
     
-    def __init__(self, api_key: Optional[str] = None):
-        self._client = None
-        self._api_key = api_key or settings.OPENAI_API_KEY
-    
-    @property
-    def client(self):
-        """Lazy initialization del cliente OpenAI"""
-        if self._client is None:
-            if not self._api_key or self._api_key == "your_openai_api_key_here":
-                raise ValueError(
-                    "OpenAI API key no configurada. "
-                    "Por favor configura OPENAI_API_KEY en tu archivo .env"
-                )
-            self._client = openai.OpenAI(api_key=self._api_key)
-        return self._client
-    
-    def _extract_json_from_response(self, content: str) -> str:
-        """
-        Extrae JSON puro de una respuesta que puede estar envuelta en markdown.
-        
-        Args:
-            content: Contenido crudo de la respuesta
-            
-        Returns:
-            JSON string limpio
-        """
-        if not content:
-            return ""
-        
-        # Buscar JSON envuelto en bloques de código markdown
-        json_pattern = r'```(?:json)?\s*(\{.*?\})\s*```'
-        match = re.search(json_pattern, content, re.DOTALL)
-        
-        if match:
-            logger.info("JSON encontrado en bloque de código markdown")
-            return match.group(1).strip()
-        
-        # Si no hay markdown, buscar JSON directo
-        json_pattern_direct = r'(\{.*\})'
-        match_direct = re.search(json_pattern_direct, content, re.DOTALL)
-        
-        if match_direct:
-            logger.info("JSON encontrado directamente")
-            return match_direct.group(1).strip()
-        
-        # Si no se encuentra JSON, devolver el contenido original
-        logger.warning("No se pudo extraer JSON de la respuesta")
-        return content.strip()
-        
+    # Menos creatividad para más consistencia en las flashcards
+    FLASHCARD_TEMPERATURE = 0.3
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrent_requests: int = settings.LLM_MAX_CONCURRENT_REQUESTS,
+        providers: Optional[List[LLMProvider]] = None,
+    ):
+        if providers is None:
+            if api_key or base_url:
+                providers = [LLMProvider(
+                    name="default",
+                    api_key=api_key or settings.OPENAI_API_KEY,
+                    base_url=base_url,
+                    max_concurrent_requests=max_concurrent_requests,
+                )]
+            else:
+                providers = build_providers()
+        self.pool = ProviderPool(providers)
+    
+    def start(self):
+        """Arranca los health checks de los proveedores"""
+        self.pool.start()
+    
+    async def aclose(self):
+        """Cierra los clientes HTTP y libera las conexiones de los pools"""
+        await self.pool.aclose()
+    
     async def generate_completion(
         self,
         prompt: str,
@@ -74,6 +64,7 @@ class LLMService:
         max_tokens: int = settings.MAX_TOKENS,
         temperature: float = settings.TEMPERATURE,
         system_message: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         """
         Genera una respuesta del LLM basada en el prompt proporcionado.
@@ -84,9 +75,15 @@ class LLMService:
             max_tokens: Máximo número de tokens en la respuesta
             temperature: Creatividad de la respuesta (0.0 - 1.0)
             system_message: Mensaje del sistema opcional
+            response_format: Modo de salida estructurada (p. ej. {"type": "json_object"}),
+                que se omite en los proveedores que no lo soportan
             
         Returns:
             Dict con la respuesta cruda y metadatos
+            
+        Raises:
+            RateLimitExceeded: Si los límites de tasa de todos los proveedores
+                impiden hacer la llamada a tiempo
         """
         try:
             messages = []
@@ -99,11 +96,12 @@ class LLMService:
             logger.info(f"Enviando request a OpenAI - Model: {model}")
             logger.info(f"Prompt length: {len(prompt)} characters")
             
-            response = self.client.chat.completions.create(
+            provider, response = await self.pool.create(
                 model=model,
                 messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature,
+                response_format=response_format,
             )
             
             result = {
@@ -117,11 +115,59 @@ class LLMService:
                 "finish_reason": response.choices[0].finish_reason,
             }
             
-            logger.info(f"OpenAI response received - Tokens used: {result['usage']['total_tokens']}")
+            logger.info(f"Respuesta de {provider.name} recibida - Tokens used: {result['usage']['total_tokens']}")
             logger.info(f"Raw response: {result['content'][:200]}...")  # Log primeros 200 chars
             
             return result
             
+        except RateLimitExceeded:
+            # Se propaga tal cual para que la API pueda responder con Retry-After
+            raise
+        except Exception as e:
+            logger.error(f"Error en llamada a OpenAI: {str(e)}")
+            raise Exception(f"Error generando respuesta del LLM: {str(e)}")
+    
+    async def stream_completion(
+        self,
+        prompt: str,
+        model: str = settings.DEFAULT_MODEL,
+        max_tokens: int = settings.MAX_TOKENS,
+        temperature: float = settings.TEMPERATURE,
+        system_message: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Genera una respuesta del LLM entregando el texto a medida que llega.
+        
+        Args:
+            prompt: El prompt principal para el LLM
+            model: Modelo a usar
+            max_tokens: Máximo número de tokens en la respuesta
+            temperature: Creatividad de la respuesta (0.0 - 1.0)
+            system_message: Mensaje del sistema opcional
+            response_format: Modo de salida estructurada, si el proveedor lo soporta
+            
+        Yields:
+            Fragmentos de texto de la respuesta
+        """
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        messages.append({"role": "user", "content": prompt})
+        
+        logger.info(f"Enviando request en streaming a OpenAI - Model: {model}")
+        
+        try:
+            async for delta in self.pool.stream(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                response_format=response_format,
+            ):
+                yield delta
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error en llamada a OpenAI: {str(e)}")
             raise Exception(f"Error generando respuesta del LLM: {str(e)}")
@@ -131,14 +177,32 @@ class LLMService:
         text: str,
         num_pairs: int = 5,
         prompt_template: str = None,
+        model: str = settings.DEFAULT_MODEL,
+        temperature: float = FLASHCARD_TEMPERATURE,
+        progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        chunks: Optional[List[str]] = None,
+        allocation: Optional[List[int]] = None,
     ) -> Dict[str, Any]:
         """
         Extrae pares de Q&A del texto para crear flashcards.
         
+        Los textos que superan LLM_CHUNK_MAX_TOKENS se dividen en fragmentos que
+        se procesan en paralelo (map) y cuyas flashcards se combinan sin
+        preguntas duplicadas (reduce). Cada flashcard indica en "chunk" el
+        fragmento del que salió.
+        
         Args:
             text: Texto del cual extraer las flashcards
             num_pairs: Número de pares Q&A a extraer
             prompt_template: Template del prompt personalizado
+            model: Modelo a usar
+            temperature: Creatividad de la respuesta
+            progress_callback: Corrutina opcional llamada con (completadas, total)
+                cada vez que termina una llamada al LLM
+            chunks: Fragmentos ya calculados del texto (los guardados del
+                documento); si no se pasan, se divide aquí
+            allocation: Flashcards de cada fragmento de chunks; si no se pasa,
+                num_pairs se reparte según los tokens de cada uno
             
         Returns:
             Dict con las flashcards extraídas y metadatos
@@ -146,48 +210,343 @@ class LLMService:
         if not prompt_template:
             from ..prompts.flashcard_prompts import EXTRACT_QA_PAIRS_PROMPT
             prompt_template = EXTRACT_QA_PAIRS_PROMPT
-            
+        
+        chunks = chunks or self._split_text(text, model)
+        
+        if len(chunks) <= 1:
+            result = await self._extract_flashcards_single(
+                chunks[0] if chunks else text, allocation[0] if allocation else num_pairs,
+                prompt_template, model, temperature
+            )
+            self._tag_chunk(result, 0)
+            if progress_callback:
+                await progress_callback(1, 1)
+            return result
+        
+        return await self._extract_flashcards_chunked(
+            chunks, num_pairs, prompt_template, model, temperature, progress_callback, allocation
+        )
+    
+    @staticmethod
+    def _split_text(text: str, model: str) -> List[str]:
+        """Divide el texto en fragmentos solo si supera el límite de tokens por llamada"""
+        if count_tokens(text, model) > settings.LLM_CHUNK_MAX_TOKENS:
+            return chunk_text(text, settings.LLM_CHUNK_MAX_TOKENS, model)
+        return [text]
+    
+    async def _extract_flashcards_single(
+        self,
+        text: str,
+        num_pairs: int,
+        prompt_template: str,
+        model: str,
+        temperature: float,
+    ) -> Dict[str, Any]:
+        """Genera y parsea flashcards de un único texto con una sola llamada al LLM"""
         formatted_prompt = prompt_template.format(
             num_pairs=num_pairs,
             text=text
         )
         
-        system_message = "Eres un asistente experto en educación que crea flashcards efectivas. Responde ÚNICAMENTE con JSON válido, sin markdown ni texto adicional."
-        
         result = await self.generate_completion(
             prompt=formatted_prompt,
-            system_message=system_message,
-            temperature=0.3,  # Menos creatividad para más consistencia
+            system_message=FLASHCARD_SYSTEM_MESSAGE,
+            model=model,
+            temperature=temperature,
+            response_format=self._json_response_format(),
         )
         
-        try:
-            # Extraer JSON limpio de la respuesta
-            clean_json = self._extract_json_from_response(result["content"])
-            logger.info(f"JSON extraído: {clean_json[:200]}...")
-            
-            # Intentar parsear la respuesta JSON
-            parsed_content = json.loads(clean_json)
-            result["parsed_flashcards"] = parsed_content
-            
-            flashcards_count = len(parsed_content.get('flashcards', []))
-            logger.info(f"Successfully extracted {flashcards_count} flashcards")
-            
-            if flashcards_count == 0:
-                logger.warning("No flashcards found in parsed response")
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {e}")
-            logger.error(f"Raw content: {result['content']}")
-            result["parsing_error"] = str(e)
-            result["parsed_flashcards"] = None
+        parsed = self._parse_flashcards(result["content"], result.get("finish_reason"))
+        result["parse_status"] = parsed["status"]
+        result["parsed_flashcards"] = {"flashcards": parsed["flashcards"]} if parsed["flashcards"] else None
+        if parsed["status"] != "ok":
+            result["parsing_error"] = parsed["error"]
+        return result
+    
+    @staticmethod
+    def _json_response_format() -> Optional[Dict[str, Any]]:
+        """Pide salida JSON a los proveedores que la soportan"""
+        return {"type": "json_object"} if settings.LLM_JSON_MODE else None
+    
+    @staticmethod
+    def _parse_flashcards(content: str, finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        """Parsea una respuesta de flashcards y registra el resultado en las métricas"""
+        parsed = parse_flashcards(content)
+        metrics.FLASHCARD_PARSE_RESULTS.labels(parsed["status"]).inc()
+        if parsed["status"] == "ok":
+            logger.info(f"Successfully extracted {len(parsed['flashcards'])} flashcards")
+        elif parsed["status"] == "recovered":
+            metrics.FLASHCARD_RECOVERED_CARDS.inc(len(parsed["flashcards"]))
+            logger.warning(
+                f"JSON inválido ({parsed['error']}, finish_reason={finish_reason}); "
+                f"se recuperaron {len(parsed['flashcards'])} flashcards completas"
+            )
+        else:
+            logger.error(f"No se pudieron extraer flashcards: {parsed['error']}")
+            logger.error(f"Raw content: {content[:500]}")
+        return parsed
+    
+    async def _extract_flashcards_chunked(
+        self,
+        chunks: List[str],
+        num_pairs: int,
+        prompt_template: str,
+        model: str,
+        temperature: float,
+        progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        allocation: Optional[List[int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Genera flashcards de varios fragmentos en paralelo y las combina.
+        
+        Args:
+            chunks: Fragmentos del documento en orden
+            num_pairs: Flashcards totales a extraer
+            prompt_template: Template del prompt
+            model: Modelo a usar
+            temperature: Creatividad de la respuesta
+            progress_callback: Corrutina opcional llamada con (completados, total)
+            allocation: Flashcards de cada fragmento ya repartidas; por defecto,
+                según los tokens de cada uno
             
-        except Exception as e:
-            logger.error(f"Unexpected error parsing flashcards: {e}")
-            result["parsing_error"] = str(e)
-            result["parsed_flashcards"] = None
+        Returns:
+            Dict con el mismo formato que una generación simple, con el uso de
+            tokens sumado de todos los fragmentos
+        """
+        allocation = allocation or distribute_pairs([count_tokens(chunk, model) for chunk in chunks], num_pairs)
+        selected = [
+            (index, chunk, pairs) for index, (chunk, pairs) in enumerate(zip(chunks, allocation)) if pairs > 0
+        ]
+        logger.info(f"Generando flashcards en {len(selected)} de {len(chunks)} fragmentos")
+        
+        # Concurrencia acotada por documento, además del límite global del servicio
+        chunk_semaphore = asyncio.Semaphore(settings.LLM_CHUNK_CONCURRENCY)
+        
+        completed = 0
+        
+        async def run_chunk(index: int, chunk: str, pairs: int) -> Dict[str, Any]:
+            nonlocal completed
+            try:
+                async with chunk_semaphore:
+                    result = await self._extract_flashcards_single(
+                        chunk, pairs, prompt_template, model, temperature
+                    )
+                return self._tag_chunk(result, index)
+            finally:
+                completed += 1
+                if progress_callback:
+                    await progress_callback(completed, len(selected))
+        
+        results = await asyncio.gather(
+            *(run_chunk(index, chunk, pairs) for index, chunk, pairs in selected),
+            return_exceptions=True,
+        )
+        
+        succeeded = [r for r in results if not isinstance(r, BaseException)]
+        for failure in (r for r in results if isinstance(r, BaseException)):
+            logger.error(f"Error generando flashcards de un fragmento: {failure}")
+        if not succeeded:
+            rate_limited = [r for r in results if isinstance(r, RateLimitExceeded)]
+            if rate_limited:
+                raise rate_limited[0]
+            raise Exception("Error generando flashcards: fallaron todos los fragmentos")
+        
+        flashcards = self._merge_flashcards(succeeded, num_pairs)
+        usage = {
+            key: sum(r["usage"][key] for r in succeeded)
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+        }
+        parsed = {"flashcards": flashcards} if flashcards else None
+        
+        return {
+            "content": json.dumps(parsed, ensure_ascii=False) if parsed else "",
+            "model": succeeded[0]["model"],
+            "usage": usage,
+            "finish_reason": succeeded[0]["finish_reason"],
+            "parsed_flashcards": parsed,
+            "chunks": {
+                "total": len(chunks),
+                "processed": len(selected),
+                "failed": len(results) - len(succeeded),
+            },
+        }
+    
+    async def stream_flashcards(
+        self,
+        text: str,
+        num_pairs: int = 5,
+        prompt_template: str = None,
+        model: str = settings.DEFAULT_MODEL,
+        temperature: float = FLASHCARD_TEMPERATURE,
+        chunks: Optional[List[str]] = None,
+        allocation: Optional[List[int]] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Extrae flashcards entregando cada una en cuanto su JSON está completo.
+        
+        Cada fragmento del documento se genera en streaming y pasa por un
+        FlashcardStreamParser; las tarjetas de todos los fragmentos se combinan
+        sin duplicados en el orden en que terminan.
+        
+        Args:
+            text: Texto del cual extraer las flashcards
+            num_pairs: Número de pares Q&A a extraer
+            prompt_template: Template del prompt personalizado
+            model: Modelo a usar
+            temperature: Creatividad de la respuesta
+            chunks: Fragmentos ya calculados del texto; si no se pasan, se divide aquí
+            allocation: Flashcards de cada fragmento de chunks; si no se pasa,
+                num_pairs se reparte según los tokens de cada uno
             
+        Yields:
+            {"type": "flashcard", "flashcard": {...}} por cada tarjeta y al final
+            {"type": "done", "result": {...}} con el mismo formato que extract_flashcards
+        """
+        if not prompt_template:
+            from ..prompts.flashcard_prompts import EXTRACT_QA_PAIRS_PROMPT
+            prompt_template = EXTRACT_QA_PAIRS_PROMPT
+        
+        chunks = chunks or self._split_text(text, model)
+        allocation = allocation or distribute_pairs([count_tokens(chunk, model) for chunk in chunks], num_pairs)
+        selected = [
+            (index, chunk, pairs) for index, (chunk, pairs) in enumerate(zip(chunks, allocation)) if pairs > 0
+        ]
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        chunk_semaphore = asyncio.Semaphore(settings.LLM_CHUNK_CONCURRENCY)
+        # Uso de los fragmentos cancelados a mitad de respuesta, que ya no pasan por la cola
+        cancelled_usage: List[Dict[str, int]] = []
+        
+        async def produce(index: int, chunk: str, pairs: int):
+            prompt = prompt_template.format(num_pairs=pairs, text=chunk)
+            parser = FlashcardStreamParser()
+            content: List[str] = []
+            sent = False
+            try:
+                async with chunk_semaphore:
+                    sent = True
+                    async for delta in self.stream_completion(
+                        prompt=prompt,
+                        system_message=FLASHCARD_SYSTEM_MESSAGE,
+                        model=model,
+                        temperature=temperature,
+                        response_format=self._json_response_format(),
+                    ):
+                        content.append(delta)
+                        for card in parser.feed(delta):
+                            await queue.put(("flashcard", {**card, "chunk": index}))
+                completion = "".join(content)
+                # Las tarjetas ya se emitieron; se parsea de nuevo solo para las métricas
+                self._parse_flashcards(completion)
+                await queue.put(("usage", self._stream_usage(prompt, completion, model)))
+            except asyncio.CancelledError:
+                # Cancelado al llegar a num_pairs: el prompt y lo generado hasta aquí ya se pagaron
+                if sent:
+                    cancelled_usage.append(self._stream_usage(prompt, "".join(content), model))
+                raise
+            except Exception as e:
+                logger.error(f"Error generando flashcards en streaming: {e}")
+                await queue.put(("error", e))
+            finally:
+                await queue.put(("end", None))
+        
+        producers = [asyncio.create_task(produce(index, chunk, pairs)) for index, chunk, pairs in selected]
+        seen = set()
+        flashcards: List[Dict[str, Any]] = []
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        errors: List[Exception] = []
+        pending = len(producers)
+        
+        try:
+            while pending and len(flashcards) < num_pairs:
+                kind, payload = await queue.get()
+                if kind == "end":
+                    pending -= 1
+                elif kind == "usage":
+                    for key in usage:
+                        usage[key] += payload[key]
+                elif kind == "error":
+                    errors.append(payload)
+                elif kind == "flashcard":
+                    key = self._normalize_question(payload["question"])
+                    if key and key not in seen:
+                        seen.add(key)
+                        flashcards.append(payload)
+                        yield {"type": "flashcard", "flashcard": payload}
+        finally:
+            # Si ya hay suficientes tarjetas (o el cliente se fue) no seguir pagando tokens
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+            # Las tareas ya terminadas dejaron su uso en la cola sin leer
+            while not queue.empty():
+                kind, payload = queue.get_nowait()
+                if kind == "usage":
+                    cancelled_usage.append(payload)
+            for chunk_usage in cancelled_usage:
+                for key in usage:
+                    usage[key] += chunk_usage[key]
+        
+        if not flashcards and errors:
+            if isinstance(errors[0], RateLimitExceeded):
+                raise errors[0]
+            raise Exception(f"Error generando flashcards: {errors[0]}")
+        
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        parsed = {"flashcards": flashcards} if flashcards else None
+        yield {
+            "type": "done",
+            "result": {
+                "content": json.dumps(parsed, ensure_ascii=False) if parsed else "",
+                "model": model,
+                "usage": usage,
+                "usage_estimated": True,
+                "finish_reason": "stop",
+                "parsed_flashcards": parsed,
+            },
+        }
+    
+    @staticmethod
+    def _stream_usage(prompt: str, completion: str, model: str) -> Dict[str, int]:
+        """
+        Estima con el tokenizer el uso de una respuesta en streaming (la API no
+        lo devuelve) y lo registra en las métricas
+        """
+        usage = {
+            "prompt_tokens": count_tokens(FLASHCARD_SYSTEM_MESSAGE + prompt, model),
+            "completion_tokens": count_tokens(completion, model),
+        }
+        metrics.record_llm_tokens(model, usage["prompt_tokens"], usage["completion_tokens"])
+        return usage
+    
+    @staticmethod
+    def _tag_chunk(result: Dict[str, Any], index: int) -> Dict[str, Any]:
+        """Anota en cada flashcard del resultado el fragmento del que salió"""
+        for card in (result.get("parsed_flashcards") or {}).get("flashcards", []):
+            card["chunk"] = index
         return result
     
+    @staticmethod
+    def _normalize_question(question: str) -> str:
+        """Normaliza una pregunta para detectar duplicados (sin acentos ni puntuación)"""
+        decomposed = unicodedata.normalize("NFKD", question.casefold())
+        without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+        return " ".join(re.sub(r"[^\w\s]", " ", without_accents).split())
+    
+    def _merge_flashcards(self, results: List[Dict[str, Any]], num_pairs: int) -> List[Dict[str, Any]]:
+        """Combina las flashcards de varios fragmentos eliminando preguntas repetidas"""
+        seen = set()
+        merged = []
+        for result in results:
+            parsed = result.get("parsed_flashcards") or {}
+            for card in parsed.get("flashcards", []):
+                key = self._normalize_question(str(card.get("question", "")))
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                merged.append(card)
+        return merged[:num_pairs]
+    
     def log_response(self, response: Dict[str, Any], context: str = ""):
         """
         Loguea la respuesta cruda del LLM para debugging.
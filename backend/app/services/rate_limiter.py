@@ -0,0 +1,200 @@
+"""
+Límites de tasa (peticiones y tokens por minuto) de las llamadas al LLM
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Dict
+
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from .. import metrics, models
+from ..config import settings
+from ..database import session_local
+
+logger = logging.getLogger(__name__)
+
+_TABLE = models.LLMRateLimit.__table__
+
+
+class RateLimitExceeded(Exception):
+    """La llamada no pudo hacerse sin superar los límites de tasa del proveedor"""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _capacity(per_minute: int) -> float:
+    """Tamaño del bucket: lo que se repone en LLM_RATE_LIMIT_BURST_SECONDS"""
+    # Al menos una petición, o con límites bajos nunca cabría ninguna
+    return max(per_minute * settings.LLM_RATE_LIMIT_BURST_SECONDS / 60.0, 1.0)
+
+
+def _refilled(column, per_minute: int, elapsed):
+    """Expresión SQL con el contenido del bucket tras reponerlo, sin pasar de su capacidad"""
+    capacity = _capacity(per_minute)
+    value = column + elapsed * (per_minute / 60.0)
+    return case((value > capacity, capacity), else_=value)
+
+
+class RateLimiter:
+    """
+    Token buckets de peticiones por minuto (RPM) y tokens por minuto (TPM).
+    
+    El estado de cada bucket vive en la tabla llm_rate_limits, de modo que todos
+    los workers de uvicorn comparten el mismo presupuesto. Tomar capacidad es un
+    único UPDATE condicional que repone el bucket según el tiempo transcurrido y
+    descuenta la petición solo si cabe, así que es atómico tanto en SQLite como
+    en PostgreSQL sin bloqueos explícitos. Si no cabe, se calcula cuándo habrá
+    capacidad y la llamada espera en cola en lugar de provocar un 429.
+    
+    Los buckets no guardan el minuto entero: los proveedores aplican el límite
+    en ventanas más cortas (60 RPM son en la práctica 1 por segundo), así que
+    la ráfaga máxima es lo que se repone en LLM_RATE_LIMIT_BURST_SECONDS.
+    
+    Dentro de un worker las llamadas a un mismo proveedor pasan por un lock
+    asyncio (FIFO), así que solo una consulta la tabla mientras espera.
+    """
+    
+    def __init__(self, session_factory=session_local, max_wait: float = settings.LLM_RATE_LIMIT_MAX_WAIT):
+        self._session_factory = session_factory
+        self._max_wait = max_wait
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    async def acquire(self, key: str, rpm: int, tpm: int, cost: int) -> float:
+        """
+        Espera a que haya capacidad para una petición y la descuenta
+        
+        Args:
+            key: Identificador del bucket (nombre del proveedor)
+            rpm: Peticiones por minuto permitidas (0: sin límite)
+            tpm: Tokens por minuto permitidos (0: sin límite)
+            cost: Tokens estimados de la petición (prompt más max_tokens)
+        
+        Returns:
+            Segundos que la petición esperó en cola
+        
+        Raises:
+            RateLimitExceeded: Si la espera superaría LLM_RATE_LIMIT_MAX_WAIT
+        """
+        if not rpm and not tpm:
+            return 0.0
+        
+        # Una petición mayor que el bucket entero solo espera a que esté lleno
+        cost = min(cost, _capacity(tpm)) if tpm else 0
+        start = time.monotonic()
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            while True:
+                wait = await self._try_acquire(key, rpm, tpm, cost)
+                waited = time.monotonic() - start
+                if wait <= 0:
+                    metrics.LLM_RATE_LIMIT_WAIT.labels(key).observe(waited)
+                    return waited
+                if waited + wait > self._max_wait:
+                    metrics.LLM_RATE_LIMITED.labels(key).inc()
+                    raise RateLimitExceeded(
+                        f"Límite de tasa del proveedor LLM {key} alcanzado", retry_after=wait
+                    )
+                # Jitter para que los workers no consulten la tabla a la vez
+                await asyncio.sleep(wait * random.uniform(1.0, 1.1))
+    
+    async def block(self, key: str, seconds: float):
+        """Pausa el proveedor para todos los workers tras recibir un 429"""
+        await self._block(key, seconds)
+    
+    async def _try_acquire(self, key: str, rpm: int, tpm: int, cost: int) -> float:
+        """Descuenta la petición si cabe; si no, devuelve los segundos hasta que quepa"""
+        now = time.time()
+        async with self._session_factory() as db:
+            try:
+                elapsed = now - _TABLE.c.updated_at
+                requests = _refilled(_TABLE.c.requests_available, rpm, elapsed) if rpm else _TABLE.c.requests_available
+                tokens = _refilled(_TABLE.c.tokens_available, tpm, elapsed) if tpm else _TABLE.c.tokens_available
+                
+                conditions = [_TABLE.c.key == key, _TABLE.c.blocked_until <= now]
+                if rpm:
+                    conditions.append(requests >= 1)
+                if tpm:
+                    conditions.append(tokens >= cost)
+                result = await db.execute(
+                    update(_TABLE)
+                    .where(*conditions)
+                    .values(
+                        requests_available=requests - (1 if rpm else 0),
+                        tokens_available=tokens - cost,
+                        updated_at=now,
+                    )
+                )
+                await db.commit()
+                if result.rowcount:
+                    return 0.0
+                
+                row = (await db.execute(select(_TABLE).where(_TABLE.c.key == key))).first()
+                if row is None:
+                    # Si otro worker lo creó a la vez se reintenta por el UPDATE
+                    return 0.0 if await self._create_bucket(db, key, rpm, tpm, cost, now) else 0.01
+                return self._wait_time(row, rpm, tpm, cost, now)
+            except SQLAlchemyError as e:
+                # Un fallo del limitador no debe dejar sin LLM a la aplicación
+                await db.rollback()
+                logger.warning(f"No se pudo consultar el límite de tasa de {key}, se envía la petición: {e}")
+                return 0.0
+    
+    @staticmethod
+    async def _create_bucket(db, key: str, rpm: int, tpm: int, cost: int, now: float) -> bool:
+        """Crea el bucket lleno y descuenta la primera petición; False si ya existía"""
+        try:
+            await db.execute(_TABLE.insert().values(
+                key=key,
+                requests_available=max(_capacity(rpm) - 1, 0),
+                tokens_available=max(_capacity(tpm) - cost, 0),
+                updated_at=now,
+                blocked_until=0.0,
+            ))
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+            return False
+    
+    @staticmethod
+    def _wait_time(row, rpm: int, tpm: int, cost: int, now: float) -> float:
+        elapsed = max(now - row.updated_at, 0.0)
+        wait = row.blocked_until - now
+        if rpm:
+            requests = min(_capacity(rpm), row.requests_available + elapsed * rpm / 60.0)
+            wait = max(wait, (1 - requests) * 60.0 / rpm)
+        if tpm:
+            tokens = min(_capacity(tpm), row.tokens_available + elapsed * tpm / 60.0)
+            wait = max(wait, (cost - tokens) * 60.0 / tpm)
+        # Nunca 0: la fila cambió entre el UPDATE y la lectura, se reintenta enseguida
+        return max(wait, 0.01)
+    
+    async def _block(self, key: str, seconds: float):
+        until = time.time() + seconds
+        async with self._session_factory() as db:
+            try:
+                result = await db.execute(
+                    update(_TABLE)
+                    .where(_TABLE.c.key == key, _TABLE.c.blocked_until < until)
+                    .values(blocked_until=until)
+                )
+                await db.commit()
+                if not result.rowcount and await db.get(models.LLMRateLimit, key) is None:
+                    db.add(models.LLMRateLimit(
+                        key=key, requests_available=0.0, tokens_available=0.0,
+                        updated_at=time.time(), blocked_until=until,
+                    ))
+                    await db.commit()
+            except SQLAlchemyError as e:
+                await db.rollback()
+                logger.warning(f"No se pudo registrar el bloqueo por 429 de {key}: {e}")
+
+
+# Instancia global del limitador
+rate_limiter = RateLimiter()
@@ -0,0 +1,394 @@
+"""
+Búsqueda de texto completo sobre documentos y flashcards
+"""
+
+import html
+import logging
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Set
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from .. import models
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+# Marcas que el motor pone alrededor de los términos; se cambian por las
+# etiquetas HTML después de escapar el texto
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+# Palabras alrededor del primer término encontrado en el resaltado de un documento
+SNIPPET_WORDS = 24
+
+_SQLITE_DDL = [
+    # Sin contenido (content=''): guarda solo el índice invertido, el texto está
+    # comprimido en document_chunks
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5(
+        body, content = '', tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+        question, answer, document_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+_POSTGRES_DDL = [
+    # Solo el tsvector de cada fragmento, sin copia del texto
+    """
+    CREATE TABLE IF NOT EXISTS document_chunks_search (
+        chunk_id INTEGER PRIMARY KEY REFERENCES document_chunks(id) ON DELETE CASCADE,
+        document_id INTEGER NOT NULL,
+        tsv TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_search_tsv ON document_chunks_search USING GIN (tsv)",
+    """
+    CREATE TABLE IF NOT EXISTS flashcards_search (
+        flashcard_id INTEGER PRIMARY KEY REFERENCES flashcards(id) ON DELETE CASCADE,
+        document_id INTEGER NOT NULL,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        tsv TSVECTOR GENERATED ALWAYS AS (
+            setweight(to_tsvector('{config}', question), 'A')
+            || setweight(to_tsvector('{config}', answer), 'B')
+        ) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_flashcards_search_tsv ON flashcards_search USING GIN (tsv)",
+]
+
+# Tablas del índice (y las tablas internas de FTS5) que no pertenecen a los modelos
+INDEX_TABLE_PREFIXES = (
+    "document_chunks_fts", "flashcards_fts", "document_chunks_search", "flashcards_search",
+    # Índice de documentos completos anterior a la revisión 0006
+    "documents_fts", "documents_search",
+)
+
+
+class SearchService:
+    """
+    Índice de búsqueda según el motor de base de datos.
+    
+    En SQLite usa tablas virtuales FTS5 (ranking bm25); en PostgreSQL, tablas
+    con una columna tsvector e índice GIN (ranking ts_rank_cd). El índice se
+    actualiza desde la aplicación al crear fragmentos y flashcards.
+    
+    Los documentos se indexan por fragmentos y sin guardar el texto: un
+    documento puntúa como su mejor fragmento y el resaltado se construye con
+    el texto comprimido de ese fragmento. Todo el texto resaltado se escapa
+    antes de añadir las etiquetas <mark>.
+    """
+    
+    @staticmethod
+    def _dialect(bind) -> str:
+        return bind.dialect.name
+    
+    @staticmethod
+    def index_statements(dialect: str) -> List[str]:
+        """
+        DDL que crea las tablas e índices de búsqueda si no existen
+        
+        Args:
+            dialect: Nombre del dialecto de SQLAlchemy
+        
+        Returns:
+            Sentencias a ejecutar, vacía si el motor no tiene búsqueda de texto completo
+        """
+        if dialect == "sqlite":
+            return list(_SQLITE_DDL)
+        if dialect == "postgresql":
+            return [ddl.format(config=settings.SEARCH_TEXT_CONFIG) for ddl in _POSTGRES_DDL]
+        logger.warning(f"Búsqueda de texto completo no soportada en {dialect}")
+        return []
+    
+    @staticmethod
+    def is_index_table(name: str) -> bool:
+        """Indica si la tabla es del índice de búsqueda y no de los modelos"""
+        return name.startswith(INDEX_TABLE_PREFIXES)
+    
+    async def create_index(self, engine: AsyncEngine):
+        """Crea las tablas e índices de búsqueda si no existen"""
+        statements = self.index_statements(self._dialect(engine))
+        async with engine.begin() as connection:
+            for statement in statements:
+                await connection.execute(text(statement))
+    
+    async def index_chunks(self, db: AsyncSession, chunks: Iterable[Any]):
+        """
+        Añade fragmentos nuevos al índice (sin hacer commit)
+        
+        Args:
+            db: Sesión de base de datos
+            chunks: Filas de models.DocumentChunk con id asignado y texto cargado
+        """
+        rows = [{"id": chunk.id, "document_id": chunk.document_id, "body": chunk.text or ""} for chunk in chunks]
+        if not rows:
+            return
+        
+        dialect = self._dialect(db.get_bind())
+        if dialect == "sqlite":
+            await db.execute(text("INSERT INTO document_chunks_fts (rowid, body) VALUES (:id, :body)"), rows)
+        elif dialect == "postgresql":
+            await db.execute(
+                text(
+                    "INSERT INTO document_chunks_search (chunk_id, document_id, tsv) "
+                    "VALUES (:id, :document_id, to_tsvector(:config, :body)) ON CONFLICT (chunk_id) DO NOTHING"
+                ),
+                [dict(row, config=settings.SEARCH_TEXT_CONFIG) for row in rows],
+            )
+    
+    async def remove_flashcards(self, db: AsyncSession, flashcard_ids: List[int]):
+        """Quita flashcards del índice (sin hacer commit)"""
+        if not flashcard_ids:
+            return
+        
+        rows = [{"id": flashcard_id} for flashcard_id in flashcard_ids]
+        dialect = self._dialect(db.get_bind())
+        if dialect == "sqlite":
+            await db.execute(text("DELETE FROM flashcards_fts WHERE rowid = :id"), rows)
+        elif dialect == "postgresql":
+            await db.execute(text("DELETE FROM flashcards_search WHERE flashcard_id = :id"), rows)
+    
+    async def index_flashcards(self, db: AsyncSession, flashcards: Iterable[Any]):
+        """
+        Añade flashcards guardadas al índice (sin hacer commit)
+        
+        Args:
+            db: Sesión de base de datos
+            flashcards: Filas de models.Flashcard con id asignado
+        """
+        rows = [
+            {
+                "id": card.id,
+                "document_id": card.document_id,
+                "question": card.question,
+                "answer": card.answer,
+            }
+            for card in flashcards
+        ]
+        if not rows:
+            return
+        
+        dialect = self._dialect(db.get_bind())
+        if dialect == "sqlite":
+            await db.execute(
+                text(
+                    "INSERT INTO flashcards_fts (rowid, question, answer, document_id) "
+                    "VALUES (:id, :question, :answer, :document_id)"
+                ),
+                rows,
+            )
+        elif dialect == "postgresql":
+            await db.execute(
+                text(
+                    "INSERT INTO flashcards_search (flashcard_id, document_id, question, answer) "
+                    "VALUES (:id, :document_id, :question, :answer)"
+                ),
+                rows,
+            )
+    
+    @staticmethod
+    def _fts5_query(query: str) -> str:
+        """Convierte la búsqueda del usuario en términos FTS5 literales (sin operadores)"""
+        terms = re.findall(r"\w+", query)
+        return " ".join(f'"{term}"' for term in terms)
+    
+    @staticmethod
+    def _fold(word: str) -> str:
+        """Minúsculas y sin tildes, como el tokenizador de FTS5 con remove_diacritics"""
+        decomposed = unicodedata.normalize("NFKD", word.casefold())
+        return "".join(char for char in decomposed if not unicodedata.combining(char))
+    
+    @classmethod
+    def _is_match(cls, word: str, terms: Set[str]) -> bool:
+        """Palabra igual a un término o que lo extiende (plurales y flexiones, como el stemming de PostgreSQL)"""
+        folded = cls._fold(word)
+        return any(folded == term or (len(term) >= 4 and folded.startswith(term)) for term in terms)
+    
+    @classmethod
+    def highlight(cls, body: str, query: str, words: int = SNIPPET_WORDS) -> str:
+        """
+        Fragmento de un texto alrededor del primer término buscado, escapado como HTML
+        
+        Args:
+            body: Texto en el que se buscó
+            query: Texto de la búsqueda
+            words: Palabras máximas del fragmento
+        
+        Returns:
+            HTML con los términos entre HIGHLIGHT_START y HIGHLIGHT_END
+        """
+        tokens = list(re.finditer(r"\w+", body))
+        if not tokens:
+            return html.escape(body[:words * 8])
+        
+        terms = {cls._fold(term) for term in re.findall(r"\w+", query)}
+        hits = [index for index, token in enumerate(tokens) if cls._is_match(token.group(), terms)]
+        first = max(0, min((hits[0] if hits else 0) - words // 4, len(tokens) - words))
+        last = min(len(tokens), first + words)
+        
+        start = tokens[first].start() if first > 0 else 0
+        end = tokens[last - 1].end() if last < len(tokens) else len(body)
+        parts = ["…"] if first > 0 else []
+        for index in hits:
+            if first <= index < last:
+                token = tokens[index]
+                parts.append(html.escape(body[start:token.start()]))
+                parts.append(HIGHLIGHT_START + html.escape(token.group()) + HIGHLIGHT_END)
+                start = token.end()
+        parts.append(html.escape(body[start:end]))
+        if last < len(tokens):
+            parts.append("…")
+        return "".join(parts)
+    
+    @staticmethod
+    def _escape_marked(value: str) -> str:
+        """Escapa como HTML un texto resaltado por el motor y cambia sus marcas por etiquetas"""
+        return html.escape(value).replace(_MARK_START, HIGHLIGHT_START).replace(_MARK_END, HIGHLIGHT_END)
+    
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        scope: str = "all",
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Busca documentos y/o flashcards ordenados por relevancia
+        
+        Args:
+            db: Sesión de base de datos
+            query: Texto a buscar
+            scope: "documents", "flashcards" o "all"
+            limit: Resultados máximos por tipo
+            offset: Resultados a saltar por tipo
+        
+        Returns:
+            Dict con las listas de resultados resaltados de cada tipo
+        """
+        dialect = self._dialect(db.get_bind())
+        if dialect not in ("sqlite", "postgresql"):
+            raise NotImplementedError(f"Búsqueda de texto completo no soportada en {dialect}")
+        
+        results: Dict[str, Any] = {}
+        if scope in ("all", "documents"):
+            results["documents"] = self._page(
+                await self._search_documents(db, dialect, query, limit + 1, offset), limit
+            )
+        if scope in ("all", "flashcards"):
+            results["flashcards"] = self._page(
+                await self._search_flashcards(db, dialect, query, limit + 1, offset), limit
+            )
+        return results
+    
+    @staticmethod
+    def _page(rows: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+        """Recorta la fila extra pedida para saber si hay más resultados"""
+        return {"items": rows[:limit], "has_more": len(rows) > limit}
+    
+    async def _search_documents(self, db: AsyncSession, dialect: str, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        if dialect == "sqlite":
+            match = self._fts5_query(query)
+            if not match:
+                return []
+            matches = (
+                "SELECT rowid AS chunk_id, -bm25(document_chunks_fts) AS rank "
+                "FROM document_chunks_fts WHERE document_chunks_fts MATCH :query"
+            )
+            params = {"query": match}
+        else:
+            matches = (
+                "SELECT chunk_id, ts_rank_cd(tsv, q) AS rank "
+                "FROM document_chunks_search, websearch_to_tsquery(:config, :query) AS q WHERE tsv @@ q"
+            )
+            params = {"query": query, "config": settings.SEARCH_TEXT_CONFIG}
+        
+        # Cada documento aparece una vez, con el ranking de su mejor fragmento
+        sql = text(
+            "SELECT document_id, chunk_id, rank FROM ("
+            "SELECT c.document_id, m.chunk_id, m.rank, "
+            "ROW_NUMBER() OVER (PARTITION BY c.document_id ORDER BY m.rank DESC) AS position "
+            f"FROM ({matches}) AS m JOIN document_chunks AS c ON c.id = m.chunk_id"
+            ") AS best WHERE position = 1 ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        )
+        params.update({"limit": limit, "offset": offset})
+        rows = (await db.execute(sql, params)).all()
+        if not rows:
+            return []
+        
+        # El texto de cada fragmento se recorta del documento con sus offsets
+        bodies = {
+            chunk.id: chunk.raw_text[chunk.char_start:chunk.char_end]
+            for chunk in (await db.execute(
+                select(
+                    models.DocumentChunk.id,
+                    models.DocumentChunk.char_start,
+                    models.DocumentChunk.char_end,
+                    models.Docs.raw_text,
+                )
+                .join(models.Docs, models.Docs.id_ == models.DocumentChunk.document_id)
+                .where(models.DocumentChunk.id.in_([row.chunk_id for row in rows]))
+            )).all()
+            if chunk.raw_text is not None
+        }
+        return [
+            {
+                "document_id": row.document_id,
+                "rank": float(row.rank),
+                "highlight": self.highlight(bodies.get(row.chunk_id) or "", query),
+            }
+            for row in rows
+        ]
+    
+    async def _search_flashcards(self, db: AsyncSession, dialect: str, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        if dialect == "sqlite":
+            match = self._fts5_query(query)
+            if not match:
+                return []
+            sql = text(
+                "SELECT rowid AS flashcard_id, document_id, -bm25(flashcards_fts, 2.0, 1.0) AS rank, "
+                "highlight(flashcards_fts, 0, :start, :end) AS question, "
+                "snippet(flashcards_fts, 1, :start, :end, '…', 24) AS answer "
+                "FROM flashcards_fts WHERE flashcards_fts MATCH :query "
+                "ORDER BY bm25(flashcards_fts, 2.0, 1.0) LIMIT :limit OFFSET :offset"
+            )
+            params = {"query": match}
+        else:
+            sql = text(
+                "SELECT flashcard_id, document_id, ts_rank_cd(tsv, q) AS rank, "
+                "ts_headline(:config, question, q, 'StartSel=' || :start || ', StopSel=' || :end "
+                "|| ', HighlightAll=true') AS question, "
+                "ts_headline(:config, answer, q, 'StartSel=' || :start || ', StopSel=' || :end "
+                "|| ', MaxWords=24, MinWords=8') AS answer "
+                "FROM flashcards_search, websearch_to_tsquery(:config, :query) AS q "
+                "WHERE tsv @@ q ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+            )
+            params = {"query": query, "config": settings.SEARCH_TEXT_CONFIG}
+        
+        params.update({"start": _MARK_START, "end": _MARK_END, "limit": limit, "offset": offset})
+        return [
+            {
+                "flashcard_id": row.flashcard_id,
+                "document_id": int(row.document_id),
+                "rank": float(row.rank),
+                "question": self._escape_marked(row.question),
+                "answer": self._escape_marked(row.answer),
+            }
+            for row in await db.execute(sql, params)
+        ]
+
+
+# Instancia global del servicio
+search_service = SearchService()
@@ -0,0 +1,83 @@
+"""
+Agrupación de llamadas concurrentes idénticas (single-flight)
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from .. import metrics
+
+
+class SingleFlight:
+    """
+    Ejecuta una sola vez las operaciones concurrentes con la misma clave.
+    
+    La primera petición con una clave lanza la operación como tarea; las que
+    llegan mientras sigue en curso esperan esa misma tarea y reciben su
+    resultado o su excepción. Cada espera va envuelta en asyncio.shield, así
+    que cancelar una petición (un cliente que se desconecta) no cancela la
+    operación compartida de la que dependen las demás. La clave se libera en
+    cuanto la operación termina: las peticiones posteriores lanzan una nueva.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self._started_at: Dict[str, float] = {}
+    
+    async def do(self, key: str, operation: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta la operación o espera la que ya está en curso con la misma clave
+        
+        Args:
+            key: Clave que identifica operaciones equivalentes
+            operation: Función sin argumentos que devuelve la corrutina a ejecutar;
+                no se llama si ya hay una operación en curso con la clave
+        
+        Returns:
+            Tupla (resultado, compartido); compartido es True si la petición
+            reutilizó una operación lanzada por otra
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.create_task(operation())
+            self._calls[key] = task
+            self._started_at[key] = time.monotonic()
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+            metrics.SINGLE_FLIGHT_IN_FLIGHT.labels(self.name).inc()
+        
+        metrics.SINGLE_FLIGHT_REQUESTS.labels(self.name, "shared" if shared else "leader").inc()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+    
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._started_at[key]
+        metrics.SINGLE_FLIGHT_IN_FLIGHT.labels(self.name).dec()
+        # Si todas las peticiones se cancelaron nadie lee la excepción
+        if not task.cancelled():
+            task.exception()
+    
+    def is_running(self, key: str) -> bool:
+        """Indica si hay una operación en curso con la clave"""
+        return key in self._calls
+    
+    def in_flight(self) -> Dict[str, Dict[str, Any]]:
+        """Operaciones en curso por clave, con las peticiones que las esperan y su antigüedad"""
+        now = time.monotonic()
+        return {
+            key: {
+                "waiters": self._waiters.get(key, 0),
+                "age_seconds": round(now - self._started_at[key], 3),
+            }
+            for key in self._calls
+        }
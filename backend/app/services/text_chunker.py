@@ -0,0 +1,298 @@
+"""
+División de texto en fragmentos acotados por tokens
+"""
+
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .tokenizer import count_tokens
+
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+")
+_WORD = re.compile(r"\S+")
+
+# Cortes definidos por el contenido en chunk_document: un tramo es candidato
+# con probabilidad proporcional a sus tokens (de media, uno cada
+# _ANCHOR_MEAN_FILL de max_tokens) y corta si el candidato anterior queda al
+# menos _ANCHOR_MIN_FILL de max_tokens atrás
+_ANCHOR_MEAN_FILL = 0.5
+_ANCHOR_MIN_FILL = 0.25
+
+
+def _split_oversized(piece: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    """Divide un párrafo demasiado grande por oraciones y, si hace falta, por palabras"""
+    parts: List[str] = []
+    for sentence in _SENTENCE_SPLIT.split(piece):
+        if count_tokens(sentence, model) <= max_tokens:
+            parts.append(sentence)
+            continue
+        
+        # Oración sin puntuación útil (tablas, texto de PDF roto): cortar por palabras
+        window: List[str] = []
+        window_tokens = 0
+        for word in sentence.split():
+            word_tokens = count_tokens(" " + word, model)
+            if window and window_tokens + word_tokens > max_tokens:
+                parts.append(" ".join(window))
+                window = []
+                window_tokens = 0
+            window.append(word)
+            window_tokens += word_tokens
+        if window:
+            parts.append(" ".join(window))
+    return parts
+
+
+def chunk_text(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Divide un texto en fragmentos de como máximo max_tokens tokens
+    
+    Respeta los límites de párrafo y de oración siempre que es posible, de modo
+    que cada fragmento sea autocontenido para el LLM.
+    
+    Args:
+        text: Texto a dividir
+        max_tokens: Tokens máximos por fragmento
+        model: Modelo cuyo tokenizer usar
+    
+    Returns:
+        Lista de fragmentos en orden
+    """
+    if not text or not text.strip():
+        return []
+    
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    
+    for paragraph in _PARAGRAPH_SPLIT.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        
+        paragraph_tokens = count_tokens(paragraph, model)
+        if paragraph_tokens > max_tokens:
+            pieces = _split_oversized(paragraph, max_tokens, model)
+        else:
+            pieces = [paragraph]
+        
+        for piece in pieces:
+            piece_tokens = paragraph_tokens if len(pieces) == 1 else count_tokens(piece, model)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _spans(text: str, separator: re.Pattern, start: int, end: int) -> List[Tuple[int, int]]:
+    """Tramos [inicio, fin) de text[start:end] entre separadores, sin espacios en los bordes"""
+    bounds: List[Tuple[int, int]] = []
+    cursor = start
+    for match in separator.finditer(text, start, end):
+        bounds.append((cursor, match.start()))
+        cursor = match.end()
+    bounds.append((cursor, end))
+    
+    spans = []
+    for left, right in bounds:
+        while left < right and text[left].isspace():
+            left += 1
+        while right > left and text[right - 1].isspace():
+            right -= 1
+        if left < right:
+            spans.append((left, right))
+    return spans
+
+
+def _locate_pages(text: str, pages: List[str]) -> List[Tuple[int, int, int]]:
+    """
+    Posición de cada página dentro del texto del documento
+    
+    Returns:
+        Tuplas (número de página desde 1, inicio, fin); si alguna página no se
+        encuentra, todo el texto cuenta como la página 1
+    """
+    located = []
+    cursor = 0
+    for number, page in enumerate(pages, start=1):
+        page = page.strip()
+        if not page:
+            continue
+        position = text.find(page, cursor)
+        if position < 0:
+            return [(1, 0, len(text))]
+        located.append((number, position, position + len(page)))
+        cursor = position + len(page)
+    return located
+
+
+def _page_segments(text: str, start: int, end: int, max_tokens: int, model: Optional[str]) -> List[Tuple[int, int, int]]:
+    """Tramos (inicio, fin, tokens) de una página, cada uno de como máximo max_tokens tokens"""
+    segments = []
+    for paragraph in _spans(text, _PARAGRAPH_SPLIT, start, end):
+        tokens = count_tokens(text[paragraph[0]:paragraph[1]], model)
+        if tokens <= max_tokens:
+            segments.append((*paragraph, tokens))
+            continue
+        
+        for sentence in _spans(text, _SENTENCE_SPLIT, *paragraph):
+            tokens = count_tokens(text[sentence[0]:sentence[1]], model)
+            if tokens <= max_tokens:
+                segments.append((*sentence, tokens))
+                continue
+            
+            # Oración sin puntuación útil: ventanas de palabras
+            window_start = window_end = None
+            window_tokens = 0
+            for word in _WORD.finditer(text, *sentence):
+                word_tokens = count_tokens(" " + word.group(), model)
+                if window_start is not None and window_tokens + word_tokens > max_tokens:
+                    segments.append((window_start, window_end, window_tokens))
+                    window_start = None
+                    window_tokens = 0
+                if window_start is None:
+                    window_start = word.start()
+                window_end = word.end()
+                window_tokens += word_tokens
+            if window_start is not None:
+                segments.append((window_start, window_end, window_tokens))
+    return segments
+
+
+def _is_anchor_candidate(segment: str, tokens: int, max_tokens: int) -> bool:
+    """Indica, solo por su contenido, si un tramo puede cerrar un fragmento"""
+    # El CRC32 se reparte uniforme en [0, 2^32): un tramo largo es candidato más a menudo
+    threshold = min(1.0, tokens / (max_tokens * _ANCHOR_MEAN_FILL))
+    return zlib.crc32(segment.encode("utf-8")) < threshold * 2 ** 32
+
+
+def _anchors(text: str, segments: List[Tuple[int, int, int, int]], max_tokens: int) -> Set[int]:
+    """
+    Índices de los tramos tras los que se cierra un fragmento
+    
+    Un candidato corta solo si el candidato anterior queda al menos
+    _ANCHOR_MIN_FILL de max_tokens atrás, para no crear fragmentos diminutos.
+    La distancia se mide entre candidatos y no desde el último corte, así que
+    cada corte depende solo del texto que lo rodea y no de dónde cayeron los
+    anteriores.
+    """
+    anchors = set()
+    since_candidate = 0
+    for index, (_, start, end, tokens) in enumerate(segments):
+        since_candidate += tokens
+        if _is_anchor_candidate(text[start:end], tokens, max_tokens):
+            if since_candidate >= max_tokens * _ANCHOR_MIN_FILL:
+                anchors.add(index)
+            since_candidate = 0
+    return anchors
+
+
+def chunk_document(text: str, pages: List[str], max_tokens: int, model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Divide un documento en fragmentos que recuerdan de qué páginas vienen
+    
+    Igual que chunk_text, respeta párrafos y oraciones y no supera max_tokens
+    por fragmento, pero cada fragmento es un tramo literal del texto del
+    documento: sus offsets permiten recortarlo y sus páginas, pedir
+    flashcards o leer solo un rango de páginas.
+    
+    Los fragmentos se cierran tras los tramos "ancla", elegidos por su
+    contenido (_anchors). Sin anclas, una edición que cambia el tamaño de un
+    fragmento desplaza todos los cortes siguientes; con ellas, editar un
+    párrafo cambia solo el fragmento en el que cae, o también el contiguo si
+    la edición crea o quita un ancla, así que dos versiones de un documento
+    comparten los fragmentos que no cambiaron. Entre dos anclas que quedan a
+    más de max_tokens se corta por tamaño, contando desde la primera. Un
+    texto que cabe en max_tokens es siempre un único fragmento.
+    
+    Args:
+        text: Texto completo del documento, tal y como se guarda
+        pages: Texto de cada página, en orden (para un TXT, [text])
+        max_tokens: Tokens máximos por fragmento
+        model: Modelo cuyo tokenizer usar
+    
+    Returns:
+        Dicts con ordinal, page_start, page_end (desde 1, inclusivos),
+        char_start, char_end, token_count y text de cada fragmento
+    """
+    chunks: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    current_tokens = 0
+    
+    def close():
+        current["text"] = text[current["char_start"]:current["char_end"]]
+        current["token_count"] = count_tokens(current["text"], model)
+        chunks.append(current)
+    
+    segments = [
+        (page_number, *segment)
+        for page_number, page_start, page_end in _locate_pages(text, pages)
+        for segment in _page_segments(text, page_start, page_end, max_tokens, model)
+    ]
+    anchors = _anchors(text, segments, max_tokens) if sum(tokens for *_, tokens in segments) > max_tokens else set()
+    
+    for index, (page_number, start, end, tokens) in enumerate(segments):
+        if current and current_tokens + tokens > max_tokens:
+            close()
+            current = None
+        if current is None:
+            current = {"ordinal": len(chunks), "page_start": page_number, "char_start": start}
+            current_tokens = 0
+        current["page_end"] = page_number
+        current["char_end"] = end
+        current_tokens += tokens
+        
+        if index in anchors:
+            close()
+            current = None
+    
+    if current:
+        close()
+    return chunks
+
+
+def distribute_pairs(chunk_tokens: List[int], num_pairs: int) -> List[int]:
+    """
+    Reparte el número de flashcards pedido entre los fragmentos
+    
+    Si hay al menos tantas flashcards como fragmentos, cada fragmento recibe
+    una y el resto se reparte en proporción a su tamaño. Si hay menos, se eligen
+    fragmentos espaciados uniformemente para cubrir todo el documento.
+    
+    Args:
+        chunk_tokens: Tokens de cada fragmento
+        num_pairs: Flashcards totales pedidas
+    
+    Returns:
+        Flashcards a pedir por fragmento (0 = no se procesa)
+    """
+    n = len(chunk_tokens)
+    if n == 0 or num_pairs <= 0:
+        return [0] * n
+    
+    if num_pairs < n:
+        allocation = [0] * n
+        step = n / num_pairs
+        for i in range(num_pairs):
+            allocation[int(i * step + step / 2)] = 1
+        return allocation
+    
+    # Uno por fragmento y el resto por mayor residuo proporcional al tamaño
+    allocation = [1] * n
+    remaining = num_pairs - n
+    total = sum(chunk_tokens) or n
+    shares = [remaining * tokens / total for tokens in chunk_tokens]
+    for i, share in enumerate(shares):
+        allocation[i] += int(share)
+    leftover = num_pairs - sum(allocation)
+    by_remainder = sorted(range(n), key=lambda i: shares[i] - int(shares[i]), reverse=True)
+    for i in by_remainder[:leftover]:
+        allocation[i] += 1
+    return allocation
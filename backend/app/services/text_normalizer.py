@@ -0,0 +1,135 @@
+"""
+Normalización del texto extraído antes de enviarlo al LLM
+"""
+
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .tokenizer import count_tokens, is_exact
+
+# Líneas de cabecera/pie que se examinan al principio y al final de cada página
+BOILERPLATE_ZONE_LINES = 3
+# Fracción de páginas en las que debe repetirse una línea para considerarla cabecera o pie
+BOILERPLATE_MIN_PAGE_RATIO = 0.5
+BOILERPLATE_MIN_PAGES = 3
+
+_INVISIBLE_CHARS = dict.fromkeys(map(ord, "\u00ad\u200b\u200c\u200d\u2060\ufeff"), None)
+_PAGE_NUMBER = re.compile(
+    r"^[-–—\s]*(?:p[aá]g(?:ina)?\.?\s*|page\s*)?\d{1,4}(?:\s*(?:/|de|of)\s*\d{1,4})?[-–—\s]*$",
+    re.IGNORECASE,
+)
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u3000]+")
+# Palabra cortada con guion al final de línea y continuada en minúscula
+_HYPHENATION = re.compile(r"(\w)[-\u2010]\n(?=[a-záéíóúüñ])")
+_LIST_ITEM = re.compile(r"^(?:[-•*▪◦·]|\d{1,3}[.)]|[a-z][.)])\s")
+_LINE_END = re.compile(r"[.!?:;…]$")
+
+
+def _boilerplate_key(line: str) -> str:
+    """Clave de comparación: sin números (cambian de página a página) ni espacios ni mayúsculas"""
+    return _DIGITS.sub("#", _SPACES.sub(" ", line).strip()).casefold()
+
+
+def _clean_line(line: str) -> str:
+    return _SPACES.sub(" ", line).strip()
+
+
+def _find_boilerplate(pages: List[List[str]]) -> set:
+    """Claves de las líneas que se repiten en la cabecera o el pie de muchas páginas"""
+    if len(pages) < BOILERPLATE_MIN_PAGES:
+        return set()
+    
+    counts: Counter = Counter()
+    for lines in pages:
+        zone = lines[:BOILERPLATE_ZONE_LINES] + lines[-BOILERPLATE_ZONE_LINES:]
+        counts.update({_boilerplate_key(line) for line in zone if line})
+    
+    threshold = max(BOILERPLATE_MIN_PAGES, len(pages) * BOILERPLATE_MIN_PAGE_RATIO)
+    return {key for key, count in counts.items() if key and count >= threshold}
+
+
+def _strip_page_edges(lines: List[str], boilerplate: set) -> List[str]:
+    """Quita cabeceras, pies y números de página del principio y el final de una página"""
+    def removable(line: str) -> bool:
+        return not line or _boilerplate_key(line) in boilerplate or bool(_PAGE_NUMBER.match(line))
+    
+    start, end = 0, len(lines)
+    while start < end and start < BOILERPLATE_ZONE_LINES and removable(lines[start]):
+        start += 1
+    while end > start and len(lines) - end < BOILERPLATE_ZONE_LINES and removable(lines[end - 1]):
+        end -= 1
+    return lines[start:end]
+
+
+def _reflow(lines: List[str]) -> str:
+    """
+    Une las líneas cortadas por el ancho de la página en párrafos
+    
+    Se conserva el salto de línea tras una oración terminada, antes de un
+    elemento de lista y en las líneas en blanco; el resto de saltos se
+    convierten en espacios.
+    """
+    text = _HYPHENATION.sub(r"\1", "\n".join(lines))
+    output: List[str] = []
+    for line in text.split("\n"):
+        if not line:
+            if output and output[-1] != "\n\n":
+                output.append("\n\n")
+            continue
+        if output and output[-1] not in ("\n\n",):
+            previous = output[-1]
+            output.append("\n" if _LINE_END.search(previous) or _LIST_ITEM.match(line) else " ")
+        output.append(line)
+    return "".join(output).strip()
+
+
+def normalize_pages(pages: List[str]) -> List[str]:
+    """
+    Normaliza el texto de cada página de un documento
+    
+    Aplica NFKC (ligaduras, espacios raros), elimina caracteres invisibles,
+    cabeceras y pies repetidos y números de página, une las palabras cortadas
+    con guion y los saltos de línea dentro de un párrafo, y colapsa espacios.
+    
+    Args:
+        pages: Texto de cada página, en orden
+    
+    Returns:
+        Texto normalizado de cada página (las páginas vacías quedan como "")
+    """
+    split_pages = [
+        [_clean_line(line) for line in unicodedata.normalize("NFKC", page).translate(_INVISIBLE_CHARS).split("\n")]
+        for page in pages
+    ]
+    boilerplate = _find_boilerplate(split_pages)
+    return [_reflow(_strip_page_edges(lines, boilerplate)) for lines in split_pages]
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza un texto sin páginas (TXT o texto pegado)"""
+    return normalize_pages([text])[0]
+
+
+def join_pages(pages: List[str]) -> str:
+    """Une las páginas normalizadas en un único texto separado por párrafos"""
+    return "\n\n".join(page for page in pages if page)
+
+
+def token_savings(original: str, normalized: str, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Compara los tokens del texto original y del normalizado
+    
+    Returns:
+        Dict con tokens antes y después, ahorro relativo y si el conteo es exacto
+    """
+    before = count_tokens(original, model)
+    after = count_tokens(normalized, model)
+    return {
+        "tokens_before": before,
+        "tokens_after": after,
+        "savings_ratio": round(1 - after / before, 4) if before else 0.0,
+        "exact": is_exact(model),
+    }
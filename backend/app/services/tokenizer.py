@@ -0,0 +1,63 @@
+"""
+Conteo de tokens para dimensionar prompts
+"""
+
+import logging
+from functools import lru_cache
+from typing import Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Promedio aproximado de caracteres por token en texto en español/inglés
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """
+    Obtiene el encoding de tiktoken para el modelo, o None si no está disponible.
+    
+    tiktoken descarga los ficheros BPE la primera vez; sin red (o sin el paquete)
+    se usa la aproximación por caracteres.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken no instalado, se usará una aproximación de tokens")
+        return None
+    
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el encoding de tiktoken ({e}), se usará una aproximación")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Cuenta los tokens de un texto para el modelo indicado
+    
+    Args:
+        text: Texto a medir
+        model: Modelo cuyo tokenizer usar (default: settings.DEFAULT_MODEL)
+        
+    Returns:
+        Número de tokens (aproximado si tiktoken no está disponible)
+    """
+    if not text:
+        return 0
+    
+    encoding = _get_encoding(model or settings.DEFAULT_MODEL)
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def is_exact(model: Optional[str] = None) -> bool:
+    """Indica si count_tokens usa el tokenizer real del modelo"""
+    return _get_encoding(model or settings.DEFAULT_MODEL) is not None
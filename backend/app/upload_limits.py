@@ -0,0 +1,89 @@
+"""
+Límite de tamaño del cuerpo de las peticiones de subida
+
+Starlette lee y guarda el multipart completo antes de llamar al endpoint, así
+que el límite por archivo de DocumentService.spool_upload llega tarde para no
+recibir el cuerpo. Este middleware rechaza la petición con 413 antes de leerla
+si Content-Length ya supera el límite y, si no lo trae (transfer-encoding
+chunked), en cuanto los bytes recibidos lo superan.
+"""
+
+import json
+from typing import Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+
+# Margen para las cabeceras y los separadores del multipart de cada archivo
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def upload_limits() -> Dict[str, int]:
+    """Tamaño máximo del cuerpo por ruta de subida"""
+    return {
+        "/api/documents": settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES,
+        "/api/documents/batch": settings.BATCH_MAX_REQUEST_SIZE,
+    }
+
+
+class _BodyTooLarge(Exception):
+    """El cuerpo recibido superó el límite a mitad de lectura"""
+
+
+class UploadSizeLimitMiddleware:
+    """Middleware ASGI que acota el tamaño del cuerpo de los POST de subida"""
+    
+    def __init__(self, app: ASGIApp, limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.limits = limits if limits is not None else upload_limits()
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+        
+        received = 0
+        response_started = False
+        
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _BodyTooLarge()
+            return message
+        
+        async def tracked_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except _BodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(send, limit)
+    
+    @staticmethod
+    async def _reject(send: Send, limit: int):
+        body = json.dumps(
+            {"detail": f"La petición supera el tamaño máximo de {limit / (1024 * 1024):g} MB"},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
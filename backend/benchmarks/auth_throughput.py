@@ -0,0 +1,76 @@
+"""
+Throughput de logins por worker, con el hashing en el event loop y en el pool.
+
+Simula una ráfaga de logins concurrentes dentro de un único event loop (un
+worker de uvicorn). En modo "inline" la verificación de pbkdf2_sha256 corre
+dentro de la corrutina, como hacían antes los handlers; en modo "executor"
+usa AuthService, que la delega a su pool de hilos. Para cada modo reporta
+logins por segundo y el mayor retraso del event loop, que es lo que sufren el
+resto de peticiones del worker durante la ráfaga.
+
+Uso:
+    python -m benchmarks.auth_throughput --logins 200 --rounds 29000 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.services.auth_service import AuthService
+from benchmarks.llm_concurrency import measure_loop_lag
+
+
+async def login_inline(service: AuthService, password: str, hashed: str) -> bool:
+    """Verificación como la hacían los handlers: bloqueando el event loop"""
+    valid, _ = service.pwd_context.verify_and_update(password, hashed)
+    return valid
+
+
+async def login_executor(service: AuthService, password: str, hashed: str) -> bool:
+    """Verificación delegada al pool de hilos de AuthService"""
+    valid, _ = await service.verify_password(password, hashed)
+    return valid
+
+
+async def run_mode(mode: str, service: AuthService, logins: int, hashed: str) -> dict:
+    login = login_inline if mode == "inline" else login_executor
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(0.05)
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login(service, "contraseña-segura", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    max_lag = await lag_task
+    assert all(results)
+    
+    return {
+        "mode": mode,
+        "logins": logins,
+        "elapsed_s": round(elapsed, 3),
+        "logins_per_second": round(logins / elapsed, 1),
+        "max_event_loop_lag_ms": round(max_lag * 1000, 2),
+    }
+
+
+async def run(logins: int, rounds: int, workers: int) -> dict:
+    service = AuthService(rounds=rounds, max_workers=workers)
+    hashed = await service.hash_password("contraseña-segura")
+    try:
+        modes = [await run_mode(mode, service, logins, hashed) for mode in ("inline", "executor")]
+    finally:
+        service.shutdown()
+    return {"rounds": rounds, "workers": workers, "results": modes}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput de login por worker")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=29000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    
+    print(json.dumps(asyncio.run(run(args.logins, args.rounds, args.workers)), indent=2))
@@ -0,0 +1,153 @@
+"""
+Arranque en frío de la API: tiempo de importación y tiempo hasta la primera respuesta.
+
+Cada ejecución lanza procesos nuevos, como un worker de uvicorn o un contenedor
+recién escalado:
+
+    import         python -X importtime -c "import app.main"; el tiempo propio de
+                   cada módulo se agrupa por paquete raíz (fastapi, sqlalchemy...)
+    health         desde que arranca uvicorn hasta el primer 200 de /health
+    first_query    desde que arranca uvicorn hasta el primer 200 de
+                   GET /api/documents (abre la primera conexión a la base de datos)
+
+La base de datos es un SQLite temporal migrado antes de medir, así que el
+arranque no incluye la creación del esquema.
+
+Uso:
+    python -m benchmarks.cold_start --runs 10 --output results/cold_start.json
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.load_test import BACKEND_DIRECTORY, migrate_database
+from benchmarks.results import build_report, summarize_latencies, write_report
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| \s*(\S+)")
+
+
+def parse_importtime(output: str) -> Tuple[float, Dict[str, float]]:
+    """
+    Interpreta la salida de -X importtime
+    
+    Returns:
+        Tupla (milisegundos acumulados de app.main, milisegundos propios por paquete raíz)
+    """
+    total = 0.0
+    packages: Dict[str, float] = defaultdict(float)
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, module = match.groups()
+        packages[module.split(".")[0]] += int(self_us) / 1000
+        if module == "app.main":
+            total = int(cumulative_us) / 1000
+    return total, packages
+
+
+def measure_import(env: Dict[str, str]) -> Tuple[float, Dict[str, float]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIRECTORY, env=env, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(completed.stderr)
+
+
+def wait_for(client: httpx.Client, url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Sondea la URL hasta el primer 200 y devuelve el instante en que respondió"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn terminó con código {process.returncode}")
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} no respondió en {timeout} segundos")
+
+
+def measure_first_response(env: Dict[str, str], port: int, timeout: float) -> Tuple[float, float]:
+    """Segundos hasta el primer /health y hasta la primera consulta a la base de datos"""
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIRECTORY, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            health = wait_for(client, f"{base_url}/health", process, timeout)
+            first_query = wait_for(client, f"{base_url}/api/documents", process, timeout)
+    finally:
+        process.terminate()
+        process.wait()
+    return health - start, first_query - start
+
+
+def run(runs: int, port: int, top: int, timeout: float) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{directory}/cold_start.db",
+            "UPLOAD_DIRECTORY": f"{directory}/uploads",
+            "OPENAI_API_KEY": "sk-fake",
+        }
+        migrate_database(env)
+        # La primera importación compila los .pyc; no cuenta
+        measure_import(env)
+        
+        import_totals: List[float] = []
+        package_samples: Dict[str, List[float]] = defaultdict(list)
+        health: List[float] = []
+        first_query: List[float] = []
+        for _ in range(runs):
+            total, packages = measure_import(env)
+            import_totals.append(total)
+            for package, milliseconds in packages.items():
+                package_samples[package].append(milliseconds)
+            
+            to_health, to_query = measure_first_response(env, port, timeout)
+            health.append(to_health)
+            first_query.append(to_query)
+    
+    packages_ms = {
+        package: round(statistics.median(samples), 2)
+        for package, samples in package_samples.items()
+    }
+    heaviest = dict(sorted(packages_ms.items(), key=lambda item: item[1], reverse=True)[:top])
+    return {
+        "import": {
+            "app_main": summarize_latencies([total / 1000 for total in import_totals]),
+            "packages_self_ms": heaviest,
+        },
+        "time_to_first_response": {
+            "health": summarize_latencies(health),
+            "first_query": summarize_latencies(first_query),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de importación y de primera respuesta de la API")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--top", type=int, default=15, help="Paquetes más lentos de importar a reportar")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("cold_start", parameters, run(args.runs, args.port, args.top, args.timeout)), args.output)
@@ -0,0 +1,66 @@
+"""
+Compara dos resultados JSON de un mismo benchmark.
+
+Recorre los valores numéricos de "results" y muestra los que cambian más que
+el umbral indicado. Para latencias y tiempos un aumento es una regresión;
+para throughput (por segundo) lo es una disminución.
+
+Uso:
+    python -m benchmarks.compare results/antes.json results/despues.json --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+# Métricas en las que más es mejor
+HIGHER_IS_BETTER = ("per_second", "throughput", "rps")
+
+
+def flatten(value: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Aplana el JSON en pares (ruta, número); las listas usan document/scenario como clave si existe"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            label = index
+            if isinstance(item, dict):
+                label = item.get("document") or item.get("scenario") or item.get("mode") or index
+            yield from flatten(item, f"{prefix}[{label}]")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, float(value)
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> int:
+    old = dict(flatten(before["results"]))
+    new = dict(flatten(after["results"]))
+    regressions = 0
+    print(f"{before.get('commit')} -> {after.get('commit')} ({before['benchmark']})")
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] == 0:
+            continue
+        change = (new[key] - old[key]) / abs(old[key])
+        if abs(change) < threshold:
+            continue
+        worse = change < 0 if any(marker in key for marker in HIGHER_IS_BETTER) else change > 0
+        regressions += worse
+        mark = "REGRESIÓN" if worse else "mejora"
+        print(f"  {mark:9} {key}: {old[key]:g} -> {new[key]:g} ({change:+.1%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmark")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Cambio relativo mínimo a mostrar")
+    args = parser.parse_args()
+    
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    
+    sys.exit(1 if compare(before, after, args.threshold) else 0)
@@ -0,0 +1,131 @@
+"""
+Corpus fijo de documentos para los benchmarks.
+
+Genera PDFs y TXTs deterministas (misma semilla, mismos bytes) para que los
+resultados de distintos commits sean comparables. Los PDFs se escriben a mano
+con una fuente Type1 estándar, sin dependencias extra.
+"""
+
+import random
+from typing import Dict, List
+
+LINES_PER_PAGE = 45
+WORDS_PER_LINE = 12
+
+BASE_VOCABULARY = (
+    "fotosíntesis clorofila célula membrana energía proteína enzima mitosis meiosis "
+    "ecosistema población especie evolución genética cromosoma núcleo átomo molécula "
+    "reacción ácido base sal oxidación reducción fuerza masa aceleración velocidad "
+    "trabajo potencia onda frecuencia luz sonido electricidad magnetismo historia "
+    "revolución imperio república constitución economía mercado oferta demanda precio "
+    "derivada integral límite función matriz vector probabilidad estadística muestra"
+).split()
+
+# Vocabulario con distribución tipo Zipf: pocas palabras muy frecuentes y una cola larga
+VOCABULARY = BASE_VOCABULARY + [f"término{i}" for i in range(20_000)]
+
+
+def pick_word(rng: random.Random) -> str:
+    index = int(rng.paretovariate(0.8)) - 1
+    return VOCABULARY[index % len(VOCABULARY)]
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Construye un PDF mínimo con una línea de texto por cada elemento de cada página"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            "<< /Type /Pages /Kids [%s] /Count %d >>"
+            % (" ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages))
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, lines in enumerate(pages):
+        operations = ["BT /F1 10 Tf 40 800 Td 12 TL"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operations.append(f"({escaped}) Tj T*")
+        operations.append("ET")
+        stream = "\n".join(operations).encode("cp1252", errors="replace")
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+            ).encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return output
+
+
+def make_lines(rng: random.Random, count: int) -> List[str]:
+    return [" ".join(pick_word(rng) for _ in range(WORDS_PER_LINE)) for _ in range(count)]
+
+
+def make_txt_document(rng: random.Random, pages: int) -> bytes:
+    """TXT con el mismo volumen de texto que un PDF de `pages` páginas"""
+    paragraphs = [" ".join(make_lines(rng, LINES_PER_PAGE)) for _ in range(pages)]
+    return "\n\n".join(paragraphs).encode("utf-8")
+
+
+def make_pdf_document(rng: random.Random, pages: int) -> bytes:
+    return make_pdf([make_lines(rng, LINES_PER_PAGE) for _ in range(pages)])
+
+
+# (tipo, páginas) de cada documento del corpus fijo
+CORPUS_SPEC = (
+    ("txt", 1),
+    ("txt", 20),
+    ("txt", 200),
+    ("pdf", 1),
+    ("pdf", 20),
+    ("pdf", 200),
+)
+
+
+def build_corpus(seed: int = 42) -> List[Dict]:
+    """
+    Genera el corpus fijo del micro-benchmark de extracción
+    
+    Returns:
+        Lista de dicts con filename, content, content_type y pages
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for file_type, pages in CORPUS_SPEC:
+        if file_type == "pdf":
+            content, content_type = make_pdf_document(rng, pages), "application/pdf"
+        else:
+            content, content_type = make_txt_document(rng, pages), "text/plain"
+        corpus.append({
+            "filename": f"{file_type}_{pages}p.{file_type}",
+            "content": content,
+            "content_type": content_type,
+            "pages": pages,
+        })
+    return corpus
+
+
+def unique_document(index: int, file_type: str = "txt", pages: int = 2) -> Dict:
+    """Documento distinto para cada índice, para que las subidas no se dedupliquen"""
+    rng = random.Random(index)
+    if file_type == "pdf":
+        content, content_type = make_pdf_document(rng, pages), "application/pdf"
+    else:
+        content, content_type = make_txt_document(rng, pages), "text/plain"
+    return {
+        "filename": f"doc_{index}.{file_type}",
+        "content": content,
+        "content_type": content_type,
+        "pages": pages,
+    }
@@ -0,0 +1,177 @@
+"""
+Almacenamiento del texto de los documentos: texto plano frente a zlib con longitud y vista previa guardadas.
+
+Crea dos SQLite temporales con los mismos documentos sintéticos (del tamaño de
+un libro, generados con benchmarks.corpus):
+
+    plain        el esquema anterior: raw_text en una columna de texto; el
+                 listado calcula length() y substr() sobre el texto completo
+    compressed   models.Docs: text_compressed con zlib más text_length y
+                 preview, que el listado lee sin tocar el texto
+
+Para cada uno mide el tamaño del archivo, el tiempo de inserción, la latencia
+de una página del listado y la de leer el texto completo de un documento
+(descompresión incluida).
+
+Uso:
+    python -m benchmarks.document_storage --documents 100 --pages 50 --output results/document_storage.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import models
+from app.config import settings
+from app.database import build_engine
+from benchmarks.corpus import make_txt_document
+from benchmarks.results import build_report, summarize_latencies, write_report
+
+plain_metadata = MetaData()
+
+# Tabla documents tal y como estaba antes de comprimir el texto
+plain_documents = Table(
+    "documents",
+    plain_metadata,
+    Column("id_", Integer, primary_key=True),
+    Column("raw_text", Text),
+    Column("created_at", String),
+    Column("content_hash", String(64), unique=True),
+)
+
+compressed_documents = models.Docs.__table__
+
+
+def make_texts(documents: int, pages: int) -> List[str]:
+    rng = random.Random(42)
+    return [make_txt_document(rng, pages).decode("utf-8") for _ in range(documents)]
+
+
+async def database_size(engine: AsyncEngine) -> int:
+    """Bytes ocupados por la base de datos, con el WAL ya volcado al archivo principal"""
+    async with engine.connect() as connection:
+        await connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        page_count = await connection.scalar(text("PRAGMA page_count"))
+        page_size = await connection.scalar(text("PRAGMA page_size"))
+    return page_count * page_size
+
+
+async def insert(engine: AsyncEngine, texts: List[str], compressed: bool) -> float:
+    rows = []
+    for document_id, body in enumerate(texts, start=1):
+        row = {"id_": document_id, "created_at": "2025-01-01", "content_hash": f"{document_id:064x}"}
+        if compressed:
+            row.update({
+                "text_compressed": body,
+                "text_length": len(body),
+                "preview": body[:settings.DOCUMENT_PREVIEW_LENGTH],
+            })
+        else:
+            row["raw_text"] = body
+        rows.append(row)
+    
+    table = compressed_documents if compressed else plain_documents
+    start = time.perf_counter()
+    async with engine.begin() as connection:
+        for row in rows:
+            await connection.execute(table.insert(), row)
+    return time.perf_counter() - start
+
+
+def listing_query(compressed: bool, page_size: int, offset: int):
+    """La consulta de GET /api/documents con cada esquema"""
+    if compressed:
+        query = select(
+            compressed_documents.c.id_,
+            compressed_documents.c.text_length,
+            compressed_documents.c.preview,
+            compressed_documents.c.created_at,
+        ).order_by(compressed_documents.c.id_.desc())
+    else:
+        query = select(
+            plain_documents.c.id_,
+            func.length(plain_documents.c.raw_text),
+            func.substr(plain_documents.c.raw_text, 1, settings.DOCUMENT_PREVIEW_LENGTH),
+            plain_documents.c.created_at,
+        ).order_by(plain_documents.c.id_.desc())
+    return query.limit(page_size).offset(offset)
+
+
+def read_query(compressed: bool, document_id: int):
+    if compressed:
+        return select(compressed_documents.c.text_compressed).where(compressed_documents.c.id_ == document_id)
+    return select(plain_documents.c.raw_text).where(plain_documents.c.id_ == document_id)
+
+
+async def measure_reads(engine: AsyncEngine, documents: int, compressed: bool, repetitions: int) -> Dict:
+    rng = random.Random(7)
+    page_size = min(settings.DOCUMENTS_PAGE_SIZE, documents)
+    listing: List[float] = []
+    full_text: List[float] = []
+    async with engine.connect() as connection:
+        for _ in range(repetitions):
+            offset = rng.randrange(0, max(1, documents - page_size + 1))
+            start = time.perf_counter()
+            (await connection.execute(listing_query(compressed, page_size, offset))).all()
+            listing.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            await connection.scalar(read_query(compressed, rng.randint(1, documents)))
+            full_text.append(time.perf_counter() - start)
+    return {"listing_page": summarize_latencies(listing), "full_text": summarize_latencies(full_text)}
+
+
+async def run_layout(directory: str, texts: List[str], compressed: bool, repetitions: int) -> Dict:
+    name = "compressed" if compressed else "plain"
+    engine = build_engine(f"sqlite:///{os.path.join(directory, name + '.db')}")
+    async with engine.begin() as connection:
+        if compressed:
+            await connection.run_sync(models.base.metadata.create_all, tables=[compressed_documents])
+        else:
+            await connection.run_sync(plain_metadata.create_all)
+    
+    insert_seconds = await insert(engine, texts, compressed)
+    size = await database_size(engine)
+    reads = await measure_reads(engine, len(texts), compressed, repetitions)
+    await engine.dispose()
+    return {
+        "database_bytes": size,
+        "insert_s": round(insert_seconds, 3),
+        **reads,
+    }
+
+
+async def run(documents: int, pages: int, repetitions: int) -> Dict:
+    texts = make_texts(documents, pages)
+    text_bytes = sum(len(body.encode("utf-8")) for body in texts)
+    with tempfile.TemporaryDirectory() as directory:
+        plain = await run_layout(directory, texts, compressed=False, repetitions=repetitions)
+        compressed = await run_layout(directory, texts, compressed=True, repetitions=repetitions)
+    return {
+        "text_bytes": text_bytes,
+        "plain": plain,
+        "compressed": compressed,
+        "size_ratio": round(compressed["database_bytes"] / plain["database_bytes"], 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tamaño y latencia de lectura del texto de los documentos")
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=50, help="Páginas de texto por documento")
+    parser.add_argument("--repetitions", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    parameters = {
+        **{key: value for key, value in vars(args).items() if key != "output"},
+        "compression_level": settings.DOCUMENT_COMPRESSION_LEVEL,
+    }
+    write_report(build_report("document_storage", parameters, asyncio.run(run(args.documents, args.pages, args.repetitions))), args.output)
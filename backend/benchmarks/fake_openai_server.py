@@ -0,0 +1,287 @@
+"""
+Servidor local que imita la API de chat completions de OpenAI.
+
+Responde con flashcards fijas tras una latencia configurable, lo que permite
+medir la concurrencia del backend sin gastar tokens reales. Opcionalmente
+simula la velocidad de generación (tokens por segundo) y falla una fracción
+de las peticiones para probar el manejo de errores.
+
+Uso:
+    python -m benchmarks.fake_openai_server --port 8099 --latency 1.0
+    python -m benchmarks.fake_openai_server --tokens-per-second 50 --failure-rate 0.1 --failure-status 429
+    python -m benchmarks.fake_openai_server --latency 0.2 --slow-rate 0.05 --slow-latency 3
+    python -m benchmarks.fake_openai_server --malformed-rate 0.2
+    python -m benchmarks.fake_openai_server --rpm 600 --rate-burst-seconds 1
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_FLASHCARDS = {
+    "flashcards": [
+        {
+            "question": "¿Qué es la fotosíntesis?",
+            "answer": "El proceso por el cual las plantas convierten luz en energía química",
+        },
+        {
+            "question": "¿Dónde ocurre la fotosíntesis?",
+            "answer": "En los cloroplastos de las hojas",
+        },
+    ]
+}
+
+
+# Cada fragmento en streaming lleva 8 caracteres, unos 2 tokens
+CHUNK_CHARS = 8
+
+
+def malformed_variants(content: str) -> list:
+    """Errores típicos de un LLM al devolver JSON: markdown, comas finales y corte por max_tokens"""
+    return [
+        f"```json\n{content}\n```",
+        content.replace("}]", "},]"),
+        "Aquí tienes las flashcards:\n" + content,
+        content[: int(len(content) * 0.75)],
+    ]
+
+
+def create_app(
+    latency: float = 1.0,
+    token_delay: float = 0.0,
+    tokens_per_second: float = 0.0,
+    failure_rate: float = 0.0,
+    failure_status: int = 500,
+    slow_rate: float = 0.0,
+    slow_latency: float = 0.0,
+    malformed_rate: float = 0.0,
+    json_mode: bool = True,
+    rpm: int = 0,
+    rate_burst_seconds: float = 1.0,
+    seed: int = 0,
+) -> FastAPI:
+    """
+    Crea la aplicación del servidor falso
+    
+    Args:
+        latency: Segundos que tarda cada respuesta (o el primer token en streaming)
+        token_delay: Segundos entre fragmentos de una respuesta en streaming
+        tokens_per_second: Velocidad de generación simulada; si es > 0 sustituye
+            a token_delay y alarga también las respuestas sin streaming
+        failure_rate: Fracción de peticiones que responden con error (0.0 - 1.0)
+        failure_status: Código HTTP de los errores inyectados (500, 429, 503...)
+        slow_rate: Fracción de peticiones que tardan slow_latency en vez de latency,
+            para simular la cola de latencia de un proveedor real
+        slow_latency: Latencia de las peticiones lentas
+        malformed_rate: Fracción de respuestas con JSON mal formado o truncado
+        json_mode: Si es False responde 400 a las peticiones con response_format,
+            como algunos servidores locales
+        rpm: Peticiones por minuto antes de responder 429 con Retry-After (0: sin límite)
+        rate_burst_seconds: Ráfaga que admite el límite, en segundos de cuota
+        seed: Semilla para que los fallos sean reproducibles
+        
+    Returns:
+        Aplicación FastAPI compatible con /v1/chat/completions
+    """
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.token_delay = token_delay
+    app.state.tokens_per_second = tokens_per_second
+    app.state.failure_rate = failure_rate
+    app.state.failure_status = failure_status
+    app.state.slow_rate = slow_rate
+    app.state.slow_latency = slow_latency
+    app.state.malformed_rate = malformed_rate
+    app.state.rng = random.Random(seed)
+    app.state.in_flight = 0
+    app.state.max_in_flight = 0
+    app.state.requests = 0
+    app.state.failures = 0
+    app.state.rate_limited = 0
+    app.state.bucket = (max(rpm * rate_burst_seconds / 60, 1.0), time.monotonic())
+    
+    def rate_limit_wait() -> float:
+        """Token bucket como el de OpenAI: 0 si la petición cabe, o segundos hasta que quepa"""
+        if not rpm:
+            return 0.0
+        capacity = max(rpm * rate_burst_seconds / 60, 1.0)
+        available, updated = app.state.bucket
+        now = time.monotonic()
+        available = min(capacity, available + (now - updated) * rpm / 60)
+        if available >= 1:
+            app.state.bucket = (available - 1, now)
+            return 0.0
+        app.state.bucket = (available, now)
+        return (1 - available) * 60 / rpm
+    
+    def first_token_latency() -> float:
+        if app.state.rng.random() < app.state.slow_rate:
+            return app.state.slow_latency
+        return app.state.latency
+    
+    def generation_time(completion_tokens: int) -> float:
+        if app.state.tokens_per_second > 0:
+            return completion_tokens / app.state.tokens_per_second
+        return 0.0
+    
+    def chunk_delay() -> float:
+        if app.state.tokens_per_second > 0:
+            return CHUNK_CHARS / 4 / app.state.tokens_per_second
+        return app.state.token_delay
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        
+        if body.get("response_format") and not json_mode:
+            return JSONResponse(
+                status_code=400,
+                content={"error": {"message": "Unrecognized request argument: response_format", "type": "invalid_request_error", "code": None}},
+            )
+        
+        wait = rate_limit_wait()
+        if wait:
+            app.state.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after-ms": str(int(wait * 1000) + 1)},
+            )
+        
+        if app.state.rng.random() < app.state.failure_rate:
+            app.state.failures += 1
+            await asyncio.sleep(app.state.latency)
+            headers = {"retry-after": "1"} if app.state.failure_status == 429 else None
+            return JSONResponse(
+                status_code=app.state.failure_status,
+                content={"error": {"message": "Fallo inyectado", "type": "server_error", "code": None}},
+                headers=headers,
+            )
+        
+        app.state.in_flight += 1
+        app.state.max_in_flight = max(app.state.max_in_flight, app.state.in_flight)
+        content = json.dumps(FAKE_FLASHCARDS, ensure_ascii=False)
+        finish_reason = "stop"
+        if app.state.rng.random() < app.state.malformed_rate:
+            variants = malformed_variants(content)
+            index = app.state.rng.randrange(len(variants))
+            content = variants[index]
+            if index == len(variants) - 1:
+                finish_reason = "length"
+        
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_chunks(body.get("model", "fake-model"), content),
+                media_type="text/event-stream",
+            )
+        
+        prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        
+        try:
+            await asyncio.sleep(first_token_latency() + generation_time(completion_tokens))
+        finally:
+            app.state.in_flight -= 1
+        
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+    
+    async def stream_chunks(model: str, content: str):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        try:
+            await asyncio.sleep(first_token_latency())
+            for start in range(0, len(content), CHUNK_CHARS):
+                delta = {"content": content[start:start + CHUNK_CHARS]}
+                yield format_chunk(completion_id, model, delta, None)
+                await asyncio.sleep(chunk_delay())
+            yield format_chunk(completion_id, model, {}, "stop")
+            yield "data: [DONE]\n\n"
+        finally:
+            app.state.in_flight -= 1
+    
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "created": 0, "owned_by": "benchmarks"}]}
+    
+    @app.get("/stats")
+    async def stats():
+        return {
+            "max_in_flight": app.state.max_in_flight,
+            "requests": app.state.requests,
+            "failures": app.state.failures,
+            "rate_limited": app.state.rate_limited,
+        }
+    
+    return app
+
+
+def format_chunk(completion_id: str, model: str, delta: dict, finish_reason) -> str:
+    """Serializa un chunk de chat.completion.chunk como evento SSE"""
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    parser = argparse.ArgumentParser(description="Servidor OpenAI falso para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--no-json-mode", action="store_true", help="Rechaza response_format con un 400")
+    parser.add_argument("--rpm", type=int, default=0, help="Límite de peticiones por minuto (429 al superarlo)")
+    parser.add_argument("--rate-burst-seconds", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    app = create_app(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        failure_status=args.failure_status,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        malformed_rate=args.malformed_rate,
+        json_mode=not args.no_json_mode,
+        rpm=args.rpm,
+        rate_burst_seconds=args.rate_burst_seconds,
+        seed=args.seed,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,138 @@
+"""
+Regeneración de una nueva versión de un documento: completa frente a incremental.
+
+Divide un documento sintético del tamaño de un libro (benchmarks.corpus) y
+varias versiones editadas con ChunkService.split, y para cada edición compara
+sin llamar al LLM:
+
+    full          todos los fragmentos (con alguna tarjeta asignada) van al LLM
+    incremental   solo los fragmentos cuyo hash no estaba en la versión
+                  anterior, según FlashcardService.plan_incremental; las
+                  tarjetas del resto se copian
+
+Uso:
+    python -m benchmarks.incremental_regeneration --pages 300 --pairs 100 --output results/incremental_regeneration.json
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from typing import Callable, Dict, List
+
+from app.config import settings
+from app.services.chunk_service import chunk_service
+from app.services.flashcard_service import FlashcardService
+from app.services.text_chunker import distribute_pairs
+from app.services.text_normalizer import join_pages
+from benchmarks.corpus import LINES_PER_PAGE, make_lines
+from benchmarks.results import build_report, write_report
+
+
+def make_pages(rng: random.Random, pages: int) -> List[str]:
+    return [" ".join(make_lines(rng, LINES_PER_PAGE)) for _ in range(pages)]
+
+
+def typo(pages: List[str], rng: random.Random) -> List[str]:
+    """Cambia una palabra en mitad del documento"""
+    edited = list(pages)
+    middle = len(edited) // 2
+    words = edited[middle].split(" ")
+    words[len(words) // 2] += "s"
+    edited[middle] = " ".join(words)
+    return edited
+
+
+def inserted_page(pages: List[str], rng: random.Random) -> List[str]:
+    """Inserta una página nueva en el primer tercio"""
+    position = len(pages) // 3
+    return pages[:position] + make_pages(rng, 1) + pages[position:]
+
+
+def cut_paragraph(pages: List[str], rng: random.Random) -> List[str]:
+    """Recorta media página en el último tercio"""
+    edited = list(pages)
+    position = 2 * len(edited) // 3
+    edited[position] = edited[position][:len(edited[position]) // 2]
+    return edited
+
+
+def appended_pages(pages: List[str], rng: random.Random) -> List[str]:
+    """Añade cinco páginas al final"""
+    return pages + make_pages(rng, 5)
+
+
+EDITS: Dict[str, Callable[[List[str], random.Random], List[str]]] = {
+    "typo": typo,
+    "inserted_page": inserted_page,
+    "cut_paragraph": cut_paragraph,
+    "appended_pages": appended_pages,
+}
+
+
+def split(pages: List[str]) -> List[Dict]:
+    chunks = chunk_service.split(join_pages(pages), pages)
+    for chunk in chunks:
+        chunk["hash"] = hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest()
+    return chunks
+
+
+def sent_tokens(chunks: List[Dict], allocation: List[int]) -> int:
+    return sum(chunk["token_count"] for chunk, pairs in zip(chunks, allocation) if pairs > 0)
+
+
+def run(pages: int, pairs: int) -> Dict:
+    rng = random.Random(42)
+    original_pages = make_pages(rng, pages)
+    original = split(original_pages)
+    
+    # Tarjetas de la versión anterior tal y como las repartiría una generación completa
+    allocation = distribute_pairs([chunk["token_count"] for chunk in original], pairs)
+    previous_cards = [
+        ({"question": f"p{chunk['ordinal']}.{n}", "answer": ""}, chunk["hash"])
+        for chunk, count in zip(original, allocation)
+        for n in range(count)
+    ]
+    previous_hashes = {chunk["hash"] for chunk in original}
+    
+    results = {}
+    for name, edit in EDITS.items():
+        edited = split(edit(original_pages, random.Random(7)))
+        tokens = [chunk["token_count"] for chunk in edited]
+        
+        start = time.perf_counter()
+        plan = FlashcardService.plan_incremental(
+            [chunk["hash"] for chunk in edited], tokens, previous_hashes, previous_cards, pairs
+        )
+        plan_seconds = time.perf_counter() - start
+        
+        full_allocation = distribute_pairs(tokens, pairs)
+        full_tokens = sent_tokens(edited, full_allocation)
+        incremental_tokens = sum(tokens[index] for index, _ in plan["changed"])
+        results[name] = {
+            "chunks": len(edited),
+            "changed_chunks": plan["changed_chunks"],
+            "carried_cards": len(plan["carried"]),
+            "generated_cards": sum(count for _, count in plan["changed"]),
+            "llm_calls": {"full": sum(1 for count in full_allocation if count), "incremental": len(plan["changed"])},
+            "prompt_tokens": {"full": full_tokens, "incremental": incremental_tokens},
+            "token_ratio": round(incremental_tokens / full_tokens, 4) if full_tokens else None,
+            "plan_ms": round(plan_seconds * 1000, 3),
+        }
+    
+    return {
+        "chunks": len(original),
+        "chunk_max_tokens": settings.LLM_CHUNK_MAX_TOKENS,
+        "edits": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fragmentos y tokens enviados al LLM al regenerar una versión editada")
+    parser.add_argument("--pages", type=int, default=300, help="Páginas del documento")
+    parser.add_argument("--pairs", type=int, default=100, help="Flashcards de una generación completa")
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("incremental_regeneration", parameters, run(args.pages, args.pairs)), args.output)
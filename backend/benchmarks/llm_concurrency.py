@@ -0,0 +1,89 @@
+"""
+Prueba de carga de LLMService contra el servidor OpenAI falso.
+
+Lanza N generaciones simultáneas y comprueba que se solapan: con un cliente
+asíncrono el tiempo total debe acercarse a ceil(N / límite) * latencia y no a
+N * latencia. También mide el retraso máximo del event loop mientras dura la
+carga, que debe mantenerse en milisegundos.
+
+Uso:
+    python -m benchmarks.llm_concurrency --requests 20 --latency 0.5 --limit 10
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import threading
+import time
+
+import uvicorn
+
+from app.services.llm_service import LLMService
+from benchmarks.fake_openai_server import create_app
+
+
+def start_fake_server(port: int, latency: float, **options) -> uvicorn.Server:
+    """Arranca el servidor falso en un hilo y espera a que acepte conexiones"""
+    config = uvicorn.Config(create_app(latency, **options), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Devuelve el mayor retraso observado del event loop en segundos"""
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+async def run(requests: int, latency: float, limit: int, port: int) -> dict:
+    service = LLMService(
+        api_key="sk-fake",
+        base_url=f"http://127.0.0.1:{port}/v1",
+        max_concurrent_requests=limit,
+    )
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(service.generate_completion(prompt=f"prompt {i}") for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    max_lag = await lag_task
+    await service.aclose()
+    
+    return {
+        "requests": requests,
+        "latency_s": latency,
+        "concurrency_limit": limit,
+        "elapsed_s": round(elapsed, 3),
+        "serial_estimate_s": round(requests * latency, 3),
+        "ideal_s": round(math.ceil(requests / limit) * latency, 3),
+        "overlap_factor": round(requests * latency / elapsed, 2),
+        "max_event_loop_lag_ms": round(max_lag * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de concurrencia de LLMService")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    
+    server = start_fake_server(args.port, args.latency)
+    try:
+        result = asyncio.run(run(args.requests, args.latency, args.limit, args.port))
+    finally:
+        server.should_exit = True
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,80 @@
+"""
+Latencia de cola de LLMService con y sin hedging.
+
+Arranca dos servidores falsos con la misma latencia habitual y una fracción
+de respuestas lentas, y lanza las mismas generaciones con el hedging activado
+y desactivado. Reporta p50/p95/p99 y cuántas llamadas extra se hicieron, que
+es el coste del hedging.
+
+Uso:
+    python -m benchmarks.llm_hedging --requests 400 --latency 0.2 --slow-rate 0.05 --slow-latency 3
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.config import settings
+from app.services.llm_providers import LLMProvider
+from app.services.llm_service import LLMService
+from benchmarks.llm_concurrency import start_fake_server
+from benchmarks.results import build_report, summarize_latencies, write_report
+
+
+async def run_mode(hedging: bool, requests: int, concurrency: int, ports: list) -> dict:
+    settings.LLM_HEDGE_ENABLED = hedging
+    service = LLMService(providers=[
+        LLMProvider(name=f"fake{index}", api_key="sk-fake", base_url=f"http://127.0.0.1:{port}/v1")
+        for index, port in enumerate(ports)
+    ])
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    
+    async def one(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await service.generate_completion(prompt=f"prompt {index}")
+            latencies.append(time.perf_counter() - start)
+    
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        await service.aclose()
+    
+    return {
+        "mode": "hedging" if hedging else "sin_hedging",
+        "requests": requests,
+        "llm_calls": service.pool._requests + service.pool._hedges,
+        "extra_calls_ratio": round(service.pool._hedges / requests, 4),
+        "latency": summarize_latencies(latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia de cola con y sin hedging")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--hedge-quantile", type=float, default=settings.LLM_HEDGE_QUANTILE)
+    parser.add_argument("--hedge-min-delay", type=float, default=0.1)
+    parser.add_argument("--ports", default="8099,8098")
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    settings.LLM_HEDGE_QUANTILE = args.hedge_quantile
+    settings.LLM_HEDGE_MIN_DELAY = args.hedge_min_delay
+    ports = [int(port) for port in args.ports.split(",")]
+    servers = [
+        start_fake_server(port, args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency, seed=index)
+        for index, port in enumerate(ports)
+    ]
+    try:
+        results = [asyncio.run(run_mode(hedging, args.requests, args.concurrency, ports)) for hedging in (False, True)]
+    finally:
+        for server in servers:
+            server.should_exit = True
+    
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("llm_hedging", parameters, results), args.output)
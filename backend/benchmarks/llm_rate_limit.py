@@ -0,0 +1,118 @@
+"""
+Llamadas al LLM con y sin el limitador de tasa compartido.
+
+Arranca el servidor falso con un límite de peticiones por minuto y lanza las
+mismas generaciones desde varios procesos (como varios workers de uvicorn)
+que comparten una base de datos SQLite temporal. Sin limitador los procesos
+chocan con el 429 y dependen de los reintentos; con limitador las peticiones
+esperan en cola y el servidor no debería devolver ningún 429.
+
+Uso:
+    python -m benchmarks.llm_rate_limit --requests 200 --workers 4 --rpm 1200
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+
+from app import models
+from app.services.llm_providers import LLMProvider
+from app.services.llm_service import LLMService
+from benchmarks.llm_concurrency import start_fake_server
+from benchmarks.results import build_report, summarize_latencies, write_report
+
+
+async def worker_requests(requests: int, concurrency: int, port: int, rpm: int) -> dict:
+    service = LLMService(providers=[
+        LLMProvider(name="fake", api_key="sk-fake", base_url=f"http://127.0.0.1:{port}/v1", rpm=rpm)
+    ])
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await service.generate_completion(prompt=f"prompt {index}")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+    
+    started = time.time()
+    try:
+        await asyncio.gather(*(one(i) for i in range(requests)))
+    finally:
+        await service.aclose()
+    return {"latencies": latencies, "errors": errors, "started": started, "finished": time.time()}
+
+
+def run_worker(args: tuple) -> dict:
+    # Proceso nuevo (spawn): la app lee DATABASE_URL del entorno heredado al importarse
+    return asyncio.run(worker_requests(*args))
+
+
+def run_mode(limiter: bool, requests: int, workers: int, concurrency: int, rpm: int, port: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Cada modo empieza con los buckets vacíos
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'rate_limit.db')}"
+        engine = create_engine(os.environ["DATABASE_URL"])
+        models.base.metadata.create_all(bind=engine, tables=[models.LLMRateLimit.__table__])
+        engine.dispose()
+        
+        before = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+        per_worker = [requests // workers + (1 if i < requests % workers else 0) for i in range(workers)]
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            outputs = pool.map(run_worker, [(n, concurrency, port, rpm if limiter else 0) for n in per_worker])
+        after = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+    
+    latencies = [latency for output in outputs for latency in output["latencies"]]
+    calls = after["requests"] - before["requests"]
+    # Sin contar el arranque de los procesos
+    elapsed = max(output["finished"] for output in outputs) - min(output["started"] for output in outputs)
+    return {
+        "mode": "con_limitador" if limiter else "sin_limitador",
+        "requests": requests,
+        "errors": sum(output["errors"] for output in outputs),
+        "llm_calls": calls,
+        "rate_limited_responses": after["rate_limited"] - before["rate_limited"],
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "ideal_requests_per_second": round(rpm / 60, 2),
+        "latency": summarize_latencies(latencies),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Llamadas al LLM con y sin limitador de tasa")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="Procesos que simulan workers de uvicorn")
+    parser.add_argument("--concurrency", type=int, default=20, help="Llamadas simultáneas por proceso")
+    parser.add_argument("--rpm", type=int, default=1200)
+    parser.add_argument("--burst-seconds", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    # El cliente y el servidor falso usan la misma ráfaga
+    os.environ["LLM_RATE_LIMIT_BURST_SECONDS"] = str(args.burst_seconds)
+    server = start_fake_server(args.port, args.latency, rpm=args.rpm, rate_burst_seconds=args.burst_seconds)
+    try:
+        results = [
+            run_mode(limiter, args.requests, args.workers, args.concurrency, args.rpm, args.port)
+            for limiter in (False, True)
+        ]
+    finally:
+        server.should_exit = True
+    
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("llm_rate_limit", parameters, results), args.output)
@@ -0,0 +1,244 @@
+"""
+Prueba de carga de la API completa contra el servidor OpenAI falso.
+
+Arranca el servidor falso y la aplicación (uvicorn, base de datos SQLite y
+directorio de subidas temporales) como procesos separados y lanza, escenario
+por escenario, N peticiones con C clientes concurrentes. Para cada escenario
+reporta throughput, percentiles de latencia y errores por código HTTP.
+
+Escenarios:
+    auth      Login de usuarios registrados previamente
+    upload    POST /api/documents con documentos distintos (sin deduplicación)
+    list      GET /api/documents
+    generate  POST /api/flashcards/{id} sobre los documentos subidos (sin caché)
+
+Uso:
+    python -m benchmarks.load_test --requests 200 --concurrency 20 --latency 0.5
+    python -m benchmarks.load_test --scenarios generate --tokens-per-second 50 \\
+        --failure-rate 0.1 --output results/load.json
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from benchmarks.corpus import unique_document
+from benchmarks.results import build_report, summarize_latencies, write_report
+
+BACKEND_DIRECTORY = Path(__file__).resolve().parent.parent
+SCENARIOS = ("auth", "upload", "list", "generate")
+PASSWORD = "contraseña-segura"
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(args, cwd=BACKEND_DIRECTORY, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def migrate_database(env: Dict[str, str]):
+    """Crea el esquema de la base de datos temporal con las migraciones"""
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=BACKEND_DIRECTORY, env=env, check=True, capture_output=True,
+    )
+
+
+def parse_counters(metrics_text: str, names: tuple) -> Dict[str, float]:
+    """Extrae los contadores indicados del texto de /metrics de la aplicación"""
+    counters = {}
+    for line in metrics_text.splitlines():
+        if line.startswith(names):
+            series, value = line.rsplit(" ", 1)
+            counters[series] = float(value)
+    return counters
+
+
+def wait_until_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} no respondió en {timeout} segundos")
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    make_request: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+) -> Dict:
+    """Ejecuta `requests` peticiones con `concurrency` clientes y resume los resultados"""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    next_index = 0
+    
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await make_request(index)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency": summarize_latencies(latencies),
+        "error_rate": round(errors / requests, 4),
+        "statuses": dict(statuses),
+    }
+
+
+async def run_scenarios(base_url: str, scenarios: List[str], requests: int, concurrency: int, pdf_ratio: float) -> List[Dict]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    results = []
+    document_ids: List[int] = []
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=300.0, limits=limits) as client:
+        if "auth" in scenarios:
+            users = [f"usuario{i}" for i in range(concurrency)]
+            for username in users:
+                await client.post("/api/auth/register", json={"username": username, "password": PASSWORD})
+            
+            async def login(index: int) -> httpx.Response:
+                username = users[index % len(users)]
+                return await client.post("/api/auth/login", json={"username": username, "password": PASSWORD})
+            
+            results.append({"scenario": "auth", **await run_load(client, login, requests, concurrency)})
+        
+        # generate y list necesitan documentos aunque no se mida la subida
+        pdf_every = round(1 / pdf_ratio) if pdf_ratio > 0 else 0
+        
+        async def upload(index: int) -> httpx.Response:
+            file_type = "pdf" if pdf_every and index % pdf_every == 0 else "txt"
+            document = unique_document(index, file_type)
+            response = await client.post(
+                "/api/documents",
+                files={"file": (document["filename"], document["content"], document["content_type"])},
+            )
+            if response.status_code in (200, 201):
+                document_ids.append(response.json()["document_id"])
+            return response
+        
+        if "upload" in scenarios or "generate" in scenarios or "list" in scenarios:
+            upload_result = await run_load(client, upload, requests, concurrency)
+            if "upload" in scenarios:
+                results.append({"scenario": "upload", "pdf_ratio": pdf_ratio, **upload_result})
+        
+        if "list" in scenarios:
+            async def list_documents(index: int) -> httpx.Response:
+                return await client.get("/api/documents", params={"limit": 20})
+            
+            results.append({"scenario": "list", **await run_load(client, list_documents, requests, concurrency)})
+        
+        if "generate" in scenarios:
+            async def generate(index: int) -> httpx.Response:
+                return await client.post(f"/api/flashcards/{document_ids[index % len(document_ids)]}")
+            
+            results.append({
+                "scenario": "generate",
+                **await run_load(client, generate, min(requests, len(document_ids)), concurrency),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Lista separada por comas")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pdf-ratio", type=float, default=0.25, help="Fracción de subidas en PDF")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn")
+    parser.add_argument("--latency", type=float, default=0.5, help="Latencia del LLM falso")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fracción de respuestas con JSON roto")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--fake-port", type=int, default=8099)
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{directory}/bench.db",
+            "UPLOAD_DIRECTORY": f"{directory}/uploads",
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        }
+        migrate_database(env)
+        fake_server = start_process(
+            [
+                sys.executable, "-m", "benchmarks.fake_openai_server",
+                "--port", str(args.fake_port),
+                "--latency", str(args.latency),
+                "--tokens-per-second", str(args.tokens_per_second),
+                "--failure-rate", str(args.failure_rate),
+                "--failure-status", str(args.failure_status),
+                "--malformed-rate", str(args.malformed_rate),
+            ],
+            env, Path(directory) / "fake_server.log",
+        )
+        app_server = start_process(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--port", str(args.app_port),
+                "--workers", str(args.workers),
+                "--log-level", "warning",
+            ],
+            env, Path(directory) / "app.log",
+        )
+        try:
+            wait_until_ready(f"http://127.0.0.1:{args.fake_port}/stats")
+            wait_until_ready(f"http://127.0.0.1:{args.app_port}/health")
+            results = asyncio.run(run_scenarios(
+                f"http://127.0.0.1:{args.app_port}", scenarios, args.requests, args.concurrency, args.pdf_ratio,
+            ))
+            llm_stats = httpx.get(f"http://127.0.0.1:{args.fake_port}/stats").json()
+            flashcard_parsing = parse_counters(
+                httpx.get(f"http://127.0.0.1:{args.app_port}/metrics").text,
+                ("flashcard_parse_results_total", "flashcard_recovered_cards_total"),
+            )
+        finally:
+            app_server.terminate()
+            fake_server.terminate()
+            app_server.wait()
+            fake_server.wait()
+    
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("load_test", parameters, {"scenarios": results, "fake_llm": llm_stats, "flashcard_parsing": flashcard_parsing}), args.output)
+
+
+if __name__ == "__main__":
+    main()
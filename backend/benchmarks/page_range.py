@@ -0,0 +1,106 @@
+"""
+Lectura de un rango de páginas: fragmentos guardados frente a recargar el texto completo.
+
+Guarda un documento sintético del tamaño de un libro (benchmarks.corpus) con
+sus fragmentos en un SQLite temporal y mide:
+
+    split          tiempo de dividir el documento en fragmentos al subirlo
+    full_text      leer y descomprimir Docs.raw_text entero, lo único posible
+                   cuando el texto no guarda límites de página
+    page_range     leer los fragmentos que tocan el rango con
+                   ChunkService.get_chunks (una consulta por rango del índice)
+                   y recortar su texto de Docs.raw_text
+
+Uso:
+    python -m benchmarks.page_range --pages 300 --range-pages 16 --output results/page_range.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.config import settings
+from app.database import build_engine
+from app.services.chunk_service import chunk_service
+from app.services.text_normalizer import join_pages
+from benchmarks.corpus import LINES_PER_PAGE, make_lines
+from benchmarks.results import build_report, summarize_latencies, write_report
+
+
+def make_pages(pages: int) -> List[str]:
+    rng = random.Random(42)
+    return [" ".join(make_lines(rng, LINES_PER_PAGE)) for _ in range(pages)]
+
+
+async def run(pages: int, range_pages: int, repetitions: int) -> Dict:
+    page_texts = make_pages(pages)
+    text = join_pages(page_texts)
+    
+    start = time.perf_counter()
+    chunks = chunk_service.split(text, page_texts)
+    split_seconds = time.perf_counter() - start
+    
+    with tempfile.TemporaryDirectory() as directory:
+        engine = build_engine(f"sqlite:///{os.path.join(directory, 'page_range.db')}")
+        async with engine.begin() as connection:
+            await connection.run_sync(
+                models.base.metadata.create_all,
+                tables=[models.Docs.__table__, models.DocumentChunk.__table__],
+            )
+        
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            document = models.Docs(raw_text=text, created_at="2025-01-01")
+            db.add(document)
+            await db.flush()
+            db.add_all(chunk_service.build(document.id_, chunks))
+            await db.commit()
+            document_id = document.id_
+        
+        rng = random.Random(7)
+        full_text: List[float] = []
+        page_range: List[float] = []
+        for _ in range(repetitions):
+            first = rng.randint(1, max(1, pages - range_pages + 1))
+            last = first + range_pages - 1
+            
+            # Sesión nueva en cada lectura para no medir el identity map
+            async with AsyncSession(engine) as db:
+                start = time.perf_counter()
+                await db.scalar(select(models.Docs.raw_text).where(models.Docs.id_ == document_id))
+                full_text.append(time.perf_counter() - start)
+            
+            async with AsyncSession(engine) as db:
+                start = time.perf_counter()
+                await chunk_service.get_chunks(db, document_id, first, last)
+                page_range.append(time.perf_counter() - start)
+        
+        await engine.dispose()
+    
+    return {
+        "text_chars": len(text),
+        "chunks": len(chunks),
+        "chunk_max_tokens": settings.LLM_CHUNK_MAX_TOKENS,
+        "split_s": round(split_seconds, 3),
+        "full_text": summarize_latencies(full_text),
+        "page_range": summarize_latencies(page_range),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lectura de un rango de páginas con y sin fragmentos guardados")
+    parser.add_argument("--pages", type=int, default=300, help="Páginas del documento")
+    parser.add_argument("--range-pages", type=int, default=16, help="Páginas de cada rango leído")
+    parser.add_argument("--repetitions", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    parameters = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report(build_report("page_range", parameters, asyncio.run(run(args.pages, args.range_pages, args.repetitions))), args.output)
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark de DocumentService.process_document_async sobre un corpus fijo.
+
+Procesa cada documento de benchmarks.corpus varias veces, desde disco y con el
+pool de procesos como las subidas, y reporta el tiempo mínimo y la mediana, el
+throughput en MB/s y el tiempo por página.
+
+Uso:
+    python -m benchmarks.process_document --repeat 5 --output results/process_document.json
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from app.services.document_service import DocumentService
+from benchmarks.corpus import build_corpus
+from benchmarks.results import build_report, write_report
+
+
+def summarize(timings: List[float], size_bytes: int, pages: int) -> Dict[str, float]:
+    best = min(timings)
+    return {
+        "min_ms": round(best * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "mb_per_second": round(size_bytes / best / 1e6, 2),
+        "ms_per_page": round(best * 1000 / pages, 3),
+    }
+
+
+async def time_document(service: DocumentService, path: str, document: Dict, repeat: int) -> List[float]:
+    # Una pasada de calentamiento arranca el pool de procesos
+    await service.process_document_async(path, document["filename"], document["content_type"])
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await service.process_document_async(path, document["filename"], document["content_type"])
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def run(repeat: int) -> List[Dict]:
+    service = DocumentService()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            for document in build_corpus():
+                size = len(document["content"])
+                path = os.path.join(directory, document["filename"])
+                with open(path, "wb") as f:
+                    f.write(document["content"])
+                
+                timings = await time_document(service, path, document, repeat)
+                results.append({
+                    "document": document["filename"],
+                    "bytes": size,
+                    "pages": document["pages"],
+                    "process_document_async": summarize(timings, size, document["pages"]),
+                })
+        finally:
+            service.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark de extracción de texto")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    report = build_report("process_document", {"repeat": args.repeat}, asyncio.run(run(args.repeat)))
+    write_report(report, args.output)
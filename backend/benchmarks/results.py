@@ -0,0 +1,67 @@
+"""
+Utilidades comunes de los benchmarks: percentiles y resultados en JSON.
+
+Cada resultado se guarda con el commit y la plataforma en la que se midió,
+para poder comparar dos ejecuciones con benchmarks.compare.
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """Resumen en milisegundos de una lista de latencias en segundos"""
+    if not latencies:
+        return {}
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(benchmark: str, parameters: Dict[str, Any], results: Any) -> Dict[str, Any]:
+    """Envuelve los resultados con los metadatos de la ejecución"""
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "results": results,
+    }
+
+
+def write_report(report: Dict[str, Any], output: Optional[str]):
+    """Imprime el informe y, si se indica, lo guarda en un archivo JSON"""
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if output:
+        path = Path(output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text + "\n", encoding="utf-8")
@@ -0,0 +1,118 @@
+"""
+Ahorro de tokens de la normalización de texto.
+
+Extrae el texto de cada PDF con DocumentService (como en una subida), lo
+normaliza y compara los tokens antes y después con el tokenizer del modelo
+por defecto. Sin --files usa PDFs sintéticos con cabecera y pie repetidos,
+números de página, palabras cortadas con guion y espacios duplicados, que es
+lo habitual en apuntes exportados a PDF.
+
+Uso:
+    python -m benchmarks.text_normalization
+    python -m benchmarks.text_normalization --files apuntes/*.pdf --output results/normalization.json
+"""
+
+import argparse
+import random
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.services.document_service import DocumentService, _extract_pdf_page_range
+from app.services.text_normalizer import join_pages, normalize_pages, token_savings
+from benchmarks.corpus import LINES_PER_PAGE, make_pdf, pick_word
+from benchmarks.results import build_report, write_report
+
+LINE_WIDTH = 90
+
+
+def make_lecture_notes(rng: random.Random, pages: int) -> bytes:
+    """PDF de apuntes con la maquetación típica de un documento exportado"""
+    words = [pick_word(rng) for _ in range(pages * LINES_PER_PAGE * 12)]
+    lines: List[str] = []
+    current = ""
+    for word in words:
+        if len(current) + len(word) + 1 <= LINE_WIDTH:
+            current = f"{current} {word}" if current else word
+            continue
+        # A veces la palabra se corta con guion al final de la línea
+        if len(word) > 6 and rng.random() < 0.3:
+            cut = len(word) // 2
+            lines.append(f"{current} {word[:cut]}-")
+            current = word[cut:]
+        else:
+            lines.append(current)
+            current = word
+        if rng.random() < 0.1:
+            lines[-1] = lines[-1].replace(" ", "  ", 3) + "."
+    lines.append(current)
+    
+    body_lines = LINES_PER_PAGE - 4
+    page_lines = []
+    for number in range(pages):
+        body = lines[number * body_lines:(number + 1) * body_lines]
+        page_lines.append(
+            ["Biología General  -  Unidad 2: Metabolismo celular", "Facultad de Ciencias | Curso 2024-2025", *body,
+             "Material de uso exclusivo para estudiantes", f"Página {number + 1} de {pages}"]
+        )
+    return make_pdf(page_lines)
+
+
+def measure(name: str, path: Path, page_count: int) -> Dict:
+    pages = _extract_pdf_page_range(str(path), 0, page_count)
+    original = "\n".join(pages).strip()
+    start = time.perf_counter()
+    normalized = join_pages(normalize_pages(pages))
+    elapsed = time.perf_counter() - start
+    return {
+        "document": name,
+        "pages": page_count,
+        "characters_before": len(original),
+        "characters_after": len(normalized),
+        **token_savings(original, normalized),
+        "normalize_ms": round(elapsed * 1000, 2),
+    }
+
+
+def run(files: List[str], directory: Path) -> Dict:
+    service = DocumentService()
+    results = []
+    if files:
+        for name in files:
+            results.append(measure(Path(name).name, Path(name), _count_pages(Path(name))))
+    else:
+        rng = random.Random(7)
+        for pages in (5, 30, 120):
+            path = directory / f"apuntes_{pages}p.pdf"
+            path.write_bytes(make_lecture_notes(rng, pages))
+            results.append(measure(path.name, path, pages))
+    service.shutdown()
+    
+    before = sum(r["tokens_before"] for r in results)
+    after = sum(r["tokens_after"] for r in results)
+    return {
+        "documents": results,
+        "total": {
+            "tokens_before": before,
+            "tokens_after": after,
+            "savings_ratio": round(1 - after / before, 4) if before else 0.0,
+        },
+    }
+
+
+def _count_pages(path: Path) -> int:
+    from app.services.document_service import _count_pdf_pages
+    return _count_pdf_pages(str(path))
+
+
+if __name__ == "__main__":
+    import tempfile
+    
+    parser = argparse.ArgumentParser(description="Ahorro de tokens de la normalización")
+    parser.add_argument("--files", nargs="*", default=[], help="PDFs reales a medir")
+    parser.add_argument("--output", default=None, help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(args.files, Path(directory))
+    write_report(build_report("text_normalization", {"files": args.files}, results), args.output)
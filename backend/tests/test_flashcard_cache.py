@@ -0,0 +1,207 @@
+"""
+FlashcardCache: clave por contenido, LRU en memoria con TTL y nivel persistente
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import models
+from app.database import build_engine
+from app.services import flashcard_cache as flashcard_cache_module
+from app.services.flashcard_cache import FlashcardCache
+
+RESULT = {"flashcards": [{"question": "¿Qué es una célula?", "answer": "La unidad básica de la vida"}]}
+
+
+class Clock:
+    """Sustituye al módulo time de la caché para avanzar el tiempo a mano"""
+    
+    def __init__(self):
+        self.now = 1_000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(flashcard_cache_module, "time", clock)
+    return clock
+
+
+@asynccontextmanager
+async def make_session_factory(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.FlashcardCacheEntry.__table__.create)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+
+def key(text: str = "texto", num_pairs: int = 5) -> str:
+    return FlashcardCache.make_key(text, num_pairs, "gpt-3.5-turbo", 0.7, "template")
+
+
+def test_key_depends_on_every_part():
+    keys = {
+        key(),
+        key(text="otro texto"),
+        key(num_pairs=6),
+        FlashcardCache.make_key("texto", 5, "gpt-4", 0.7, "template"),
+        FlashcardCache.make_key("texto", 5, "gpt-3.5-turbo", 0.2, "template"),
+        FlashcardCache.make_key("texto", 5, "gpt-3.5-turbo", 0.7, "otro template"),
+    }
+    assert len(keys) == 6
+    assert key() == key()
+
+
+def test_key_parts_do_not_run_into_each_other():
+    assert FlashcardCache.make_key("ab", 1, "m", 0.7, "t") != FlashcardCache.make_key("b", 1, "m", 0.7, "ta")
+
+
+def test_memory_hit_and_miss(clock):
+    async def scenario():
+        cache = FlashcardCache(max_entries=4, ttl_seconds=60)
+        assert await cache.get(key()) is None
+        await cache.set(key(), RESULT)
+        assert await cache.get(key()) == RESULT
+        
+        stats = cache.stats()
+        assert (stats["memory_hits"], stats["misses"]) == (1, 1)
+        assert stats["hit_ratio"] == 0.5
+    
+    asyncio.run(scenario())
+
+
+def test_memory_entries_expire_after_ttl(clock):
+    async def scenario():
+        cache = FlashcardCache(max_entries=4, ttl_seconds=60)
+        await cache.set(key(), RESULT)
+        clock.now += 60
+        assert await cache.get(key()) == RESULT
+        clock.now += 1
+        assert await cache.get(key()) is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["memory_entries"] == 0
+    
+    asyncio.run(scenario())
+
+
+def test_lru_evicts_least_recently_used(clock):
+    async def scenario():
+        cache = FlashcardCache(max_entries=2, ttl_seconds=60)
+        await cache.set(key("a"), RESULT)
+        await cache.set(key("b"), RESULT)
+        # Leer "a" la deja como la más reciente y se desaloja "b"
+        assert await cache.get(key("a")) == RESULT
+        await cache.set(key("c"), RESULT)
+        
+        assert await cache.get(key("b")) is None
+        assert await cache.get(key("a")) == RESULT
+        assert await cache.get(key("c")) == RESULT
+        assert cache.stats()["evictions"] == 1
+    
+    asyncio.run(scenario())
+
+
+def test_database_tier_survives_a_new_instance(tmp_path, clock):
+    async def scenario():
+        async with make_session_factory(tmp_path) as session_factory:
+            async with session_factory() as db:
+                await FlashcardCache().set(key(), RESULT, db)
+            
+            cache = FlashcardCache()
+            async with session_factory() as db:
+                assert await cache.get(key(), db) == RESULT
+            # El acierto en la base de datos vuelve a llenar el LRU en memoria
+            assert await cache.get(key()) == RESULT
+        
+        stats = cache.stats()
+        assert (stats["db_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    
+    asyncio.run(scenario())
+
+
+def test_database_tier_is_consulted_after_memory_expiry(tmp_path, clock):
+    async def scenario():
+        cache = FlashcardCache(ttl_seconds=60)
+        async with make_session_factory(tmp_path) as session_factory:
+            async with session_factory() as db:
+                await cache.set(key(), RESULT, db)
+                clock.now += 61
+                assert await cache.get(key(), db) == RESULT
+        
+        stats = cache.stats()
+        assert (stats["expirations"], stats["db_hits"]) == (1, 1)
+    
+    asyncio.run(scenario())
+
+
+def test_set_overwrites_an_existing_row(tmp_path, clock):
+    async def scenario():
+        updated = {"flashcards": []}
+        async with make_session_factory(tmp_path) as session_factory:
+            async with session_factory() as db:
+                await FlashcardCache().set(key(), RESULT, db)
+                await FlashcardCache().set(key(), updated, db)
+            
+            async with session_factory() as db:
+                assert await FlashcardCache().get(key(), db) == updated
+    
+    asyncio.run(scenario())
+
+
+def test_expired_database_rows_are_misses(tmp_path, clock):
+    async def scenario():
+        cache = FlashcardCache()
+        async with make_session_factory(tmp_path) as session_factory:
+            async with session_factory() as db:
+                await FlashcardCache(db_ttl_seconds=0).set(key(), RESULT, db)
+                assert await cache.get(key(), db) is None
+        
+        stats = cache.stats()
+        assert (stats["expirations"], stats["misses"], stats["db_hits"]) == (1, 1, 0)
+    
+    asyncio.run(scenario())
+
+
+def test_prune_deletes_only_expired_rows(tmp_path, clock):
+    async def scenario():
+        async with make_session_factory(tmp_path) as session_factory:
+            async with session_factory() as db:
+                await FlashcardCache(db_ttl_seconds=0).set(key("caducada"), RESULT, db)
+                await FlashcardCache().set(key("vigente"), RESULT, db)
+                
+                cache = FlashcardCache()
+                assert await cache.prune(db) == 1
+                assert await db.get(models.FlashcardCacheEntry, key("caducada")) is None
+                assert await cache.get(key("vigente"), db) == RESULT
+        
+        assert cache.stats()["db_pruned"] == 1
+    
+    asyncio.run(scenario())
+
+
+def test_set_prunes_at_most_once_per_interval(tmp_path, clock):
+    async def scenario():
+        cache = FlashcardCache(db_ttl_seconds=0, prune_interval_seconds=60)
+        async with make_session_factory(tmp_path) as session_factory:
+            async with session_factory() as db:
+                await cache.set(key("a"), RESULT, db)
+                assert cache.stats()["db_pruned"] == 0
+                
+                clock.now += 60
+                await cache.set(key("b"), RESULT, db)
+                assert cache.stats()["db_pruned"] == 2
+                
+                await cache.set(key("c"), RESULT, db)
+                assert cache.stats()["db_pruned"] == 2
+                assert await db.get(models.FlashcardCacheEntry, key("c")) is not None
+    
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+"""
+Parser de flashcards: respuestas completas, por partes, truncadas y mal formadas
+"""
+
+import json
+
+from app.services.flashcard_stream_parser import FlashcardStreamParser, parse_flashcards
+
+CARDS = [
+    {"question": "¿Qué es la fotosíntesis?", "answer": "La conversión de luz en energía química"},
+    {"question": "¿Dónde ocurre?", "answer": "En los cloroplastos, entre \"llaves\" {y} [corchetes]"},
+    {"question": "¿Qué libera?", "answer": "Oxígeno"},
+]
+RESPONSE = json.dumps({"flashcards": CARDS}, ensure_ascii=False)
+
+
+def feed_in_pieces(text: str, size: int) -> list:
+    parser = FlashcardStreamParser()
+    cards = []
+    for start in range(0, len(text), size):
+        cards.extend(parser.feed(text[start:start + size]))
+    return cards
+
+
+def test_parse_strict_json():
+    parsed = parse_flashcards(RESPONSE)
+    assert parsed["status"] == "ok"
+    assert parsed["flashcards"] == CARDS
+
+
+def test_parse_code_fence_and_top_level_array():
+    parsed = parse_flashcards("```json\n" + json.dumps(CARDS, ensure_ascii=False) + "\n```")
+    assert parsed["status"] == "ok"
+    assert parsed["flashcards"] == CARDS
+
+
+def test_parse_truncated_response_recovers_complete_cards():
+    truncated = RESPONSE[:RESPONSE.index('"¿Qué libera?"') + 5]
+    parsed = parse_flashcards(truncated)
+    assert parsed["status"] == "recovered"
+    assert parsed["flashcards"] == CARDS[:2]
+    assert parsed["error"]
+
+
+def test_parse_trailing_commas_and_surrounding_text():
+    content = 'Aquí tienes:\n{"flashcards": [{"question": "P1", "answer": "R1",}, {"question": "P2", "answer": "R2"},]}\nFin'
+    parsed = parse_flashcards(content)
+    assert parsed["status"] == "recovered"
+    assert parsed["flashcards"] == [{"question": "P1", "answer": "R1"}, {"question": "P2", "answer": "R2"}]
+
+
+def test_parse_skips_invalid_cards():
+    content = json.dumps({"flashcards": [
+        {"question": "P1", "answer": ""},
+        {"pregunta": "P2", "respuesta": "R2"},
+        {"question": ["no"], "answer": "R3"},
+        "texto",
+    ]})
+    assert parse_flashcards(content)["flashcards"] == [{"question": "P2", "answer": "R2"}]
+
+
+def test_parse_failures():
+    assert parse_flashcards("")["status"] == "failed"
+    assert parse_flashcards("no hay JSON")["status"] == "failed"
+    assert parse_flashcards('{"flashcards": []}')["status"] == "failed"
+    assert parse_flashcards('{"flashcards": [{"question": "P1"')["flashcards"] == []
+
+
+def test_stream_parser_emits_each_card_once_whatever_the_split():
+    for size in (1, 2, 7, 64, len(RESPONSE)):
+        assert feed_in_pieces(RESPONSE, size) == CARDS
+
+
+def test_stream_parser_emits_card_as_soon_as_it_closes():
+    parser = FlashcardStreamParser()
+    first_end = RESPONSE.index("}") + 1
+    assert parser.feed(RESPONSE[:first_end - 1]) == []
+    assert parser.feed(RESPONSE[first_end - 1:first_end]) == CARDS[:1]
+    assert parser.emitted == 1
+
+
+def test_stream_parser_ignores_malformed_objects():
+    content = '[{"question": "P1", "answer": "R1"}, {"question": "P2" "answer": "R2"}, {"question": "P3", "answer": "R3"}]'
+    assert feed_in_pieces(content, 5) == [{"question": "P1", "answer": "R1"}, {"question": "P3", "answer": "R3"}]
+
+
+def test_stream_parser_ignores_braces_outside_json():
+    content = 'Nota } ] sin abrir\n```json\n[{"question": "P1", "answer": "R1"}]\n```'
+    assert feed_in_pieces(content, 3) == [{"question": "P1", "answer": "R1"}]
@@ -0,0 +1,210 @@
+"""
+Fragmentos estables entre versiones (chunk_document) y plan de regeneración incremental
+"""
+
+import asyncio
+import hashlib
+import random
+from typing import List
+
+import pytest
+
+from app.services import flashcard_service as flashcard_module
+from app.services import text_chunker
+from app.services.flashcard_service import FlashcardService
+from app.services.text_chunker import chunk_document
+from app.services.text_normalizer import join_pages
+from app.services.tokenizer import CHARS_PER_TOKEN
+
+MAX_TOKENS = 200
+WORDS = (
+    "la célula membrana energía proteína enzima mitosis ecosistema población especie "
+    "evolución genética núcleo átomo molécula reacción fuerza masa onda luz historia"
+).split()
+
+
+@pytest.fixture(autouse=True)
+def approximate_tokens(monkeypatch):
+    # Los cortes dependen del conteo de tokens: con la aproximación por
+    # caracteres no cambian según tiktoken pueda cargar su encoding o no
+    monkeypatch.setattr(text_chunker, "count_tokens", lambda text, model=None: max(1, len(text) // CHARS_PER_TOKEN) if text else 0)
+
+
+def make_pages(seed: int, pages: int = 20, paragraphs: int = 4) -> List[str]:
+    """Páginas con párrafos de oraciones aleatorias, todos distintos"""
+    rng = random.Random(seed)
+    result = []
+    for page in range(pages):
+        result.append("\n\n".join(
+            " ".join(
+                f"{rng.choice(WORDS).capitalize()} {' '.join(rng.choice(WORDS) for _ in range(10))} {page}.{paragraph}.{sentence}."
+                for sentence in range(3)
+            )
+            for paragraph in range(paragraphs)
+        ))
+    return result
+
+
+def split(pages: List[str]) -> List[dict]:
+    return chunk_document(join_pages(pages), pages, MAX_TOKENS)
+
+
+def hashes(chunks: List[dict]) -> List[str]:
+    return [hashlib.sha256(chunk["text"].encode("utf-8")).hexdigest() for chunk in chunks]
+
+
+def edit_word(pages: List[str], page: int) -> List[str]:
+    edited = list(pages)
+    words = edited[page].split(" ")
+    words[len(words) // 2] += "s"
+    edited[page] = " ".join(words)
+    return edited
+
+
+def edit_paragraph(pages: List[str], page: int, paragraph: int) -> List[str]:
+    edited = list(pages)
+    paragraphs = edited[page].split("\n\n")
+    paragraphs[paragraph] = paragraphs[paragraph].replace(" ", " nueva ", 1)
+    edited[page] = "\n\n".join(paragraphs)
+    return edited
+
+
+def test_chunks_are_literal_slices_within_the_token_limit():
+    pages = make_pages(1)
+    text = join_pages(pages)
+    chunks = split(pages)
+    
+    assert len(chunks) > 5
+    assert [chunk["ordinal"] for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert chunk["text"] == text[chunk["char_start"]:chunk["char_end"]]
+        # El límite se aplica a la suma de los tramos; los saltos de párrafo
+        # entre ellos pueden añadir algún token al texto unido
+        assert chunk["token_count"] <= MAX_TOKENS * 1.05
+        assert 1 <= chunk["page_start"] <= chunk["page_end"] <= len(pages)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous["char_end"] <= chunk["char_start"]
+        assert previous["page_end"] <= chunk["page_start"]
+
+
+def test_text_within_the_limit_is_a_single_chunk():
+    pages = ["Una página corta.", "Otra página corta."]
+    chunks = split(pages)
+    assert len(chunks) == 1
+    assert (chunks[0]["page_start"], chunks[0]["page_end"]) == (1, 2)
+
+
+def test_same_text_gives_same_chunks():
+    assert hashes(split(make_pages(2))) == hashes(split(make_pages(2)))
+
+
+def test_edit_changes_only_the_chunks_around_it():
+    pages = make_pages(3)
+    original = hashes(split(pages))
+    edited = hashes(split(edit_word(pages, len(pages) // 2)))
+    
+    new = [chunk_hash for chunk_hash in edited if chunk_hash not in set(original)]
+    assert 1 <= len(new) <= 2
+    # Los cortes vuelven a coincidir tras la edición: el final del documento no cambia
+    assert edited[-5:] == original[-5:]
+    assert edited[:3] == original[:3]
+
+
+def test_editing_one_paragraph_changes_exactly_one_chunk():
+    pages = make_pages(3)
+    original = hashes(split(pages))
+    edited = hashes(split(edit_paragraph(pages, 10, 1)))
+    
+    assert len(original) > 5
+    assert len(edited) == len(original)
+    assert sum(before != after for before, after in zip(original, edited)) == 1
+
+
+def test_paragraph_edits_only_reach_the_next_chunk():
+    pages = make_pages(3)
+    original = hashes(split(pages))
+    changed_counts = []
+    for page in range(len(pages)):
+        for paragraph in range(4):
+            edited = hashes(split(edit_paragraph(pages, page, paragraph)))
+            changed_counts.append(len(set(edited) - set(original)))
+    
+    # Solo cuando la edición crea o quita un ancla cambia también el fragmento contiguo
+    assert max(changed_counts) <= 2
+    assert changed_counts.count(1) >= 0.8 * len(changed_counts)
+
+
+def test_inserted_page_keeps_the_following_chunks():
+    pages = make_pages(4)
+    original = hashes(split(pages))
+    edited = hashes(split(pages[:5] + make_pages(99, pages=1) + pages[5:]))
+    
+    shared = set(original) & set(edited)
+    assert len(shared) >= len(original) - 3
+    assert edited[-5:] == original[-5:]
+
+
+def test_plan_for_unchanged_document_copies_every_card():
+    chunk_hashes = ["a", "b", "c"]
+    previous_cards = [({"question": "P1", "answer": "R1"}, "a"), ({"question": "P2", "answer": "R2"}, "c")]
+    plan = FlashcardService.plan_incremental(chunk_hashes, [100, 100, 100], set(chunk_hashes), previous_cards, 6)
+    
+    assert plan["changed"] == []
+    assert plan["changed_chunks"] == 0
+    assert plan["carried"] == [
+        {"question": "P1", "answer": "R1", "chunk": 0},
+        {"question": "P2", "answer": "R2", "chunk": 2},
+    ]
+
+
+def test_plan_regenerates_the_cards_of_changed_chunks():
+    previous_cards = [({"question": f"P{n}", "answer": ""}, chunk_hash) for n, chunk_hash in enumerate("aabbbc")]
+    # "b" cambió a "x"; se inserta "y" al principio, que desplaza los índices
+    plan = FlashcardService.plan_incremental(
+        ["y", "a", "x", "c"], [10, 100, 100, 100], {"a", "b", "c"}, previous_cards, 6
+    )
+    
+    assert [card["chunk"] for card in plan["carried"]] == [1, 1, 3]
+    # Se piden las tres tarjetas que se perdieron con "b", repartidas por tamaño
+    assert plan["changed"] == [(0, 1), (2, 2)]
+    assert plan["changed_chunks"] == 2
+
+
+def test_plan_gives_new_chunks_at_least_their_share():
+    previous_cards = [({"question": "P1", "answer": ""}, "a")]
+    plan = FlashcardService.plan_incremental(["a", "n"], [100, 300], {"a"}, previous_cards, 8)
+    
+    assert plan["changed"] == [(1, 6)]
+    assert len(plan["carried"]) == 1
+
+
+def test_stream_sends_carried_cards_then_regenerates_only_changed_chunks(monkeypatch):
+    requested = {}
+    saved = {}
+    
+    async def stream_flashcards(text, num_pairs, chunks, allocation, **kwargs):
+        requested.update(chunks=chunks, allocation=allocation)
+        yield {"type": "flashcard", "flashcard": {"question": "Nueva", "answer": "", "chunk": 1}}
+        yield {"type": "done", "result": {"model": "modelo", "usage": {"total_tokens": 5}}}
+    
+    async def save(self, document_id, chunk_ids, plan, cache_key, generated, llm_result, total_chunks):
+        saved.update(generated=generated, llm_result=llm_result)
+        return {}
+    
+    monkeypatch.setattr(flashcard_module.llm_service, "stream_flashcards", stream_flashcards)
+    monkeypatch.setattr(FlashcardService, "_save_incremental", save)
+    
+    previous_cards = [({"question": "P1", "answer": ""}, "a")]
+    plan = FlashcardService.plan_incremental(["y", "a", "x"], [100, 100, 100], {"a"}, previous_cards, 3)
+    plan["previous_version_id"] = 1
+    events = asyncio.Queue()
+    asyncio.run(FlashcardService()._stream_incremental_and_save(
+        2, ["texto y", "texto a", "texto x"], [10, 11, 12], plan, "clave", events
+    ))
+    
+    sent = [events.get_nowait()["flashcard"] for _ in range(events.qsize())]
+    assert requested == {"chunks": ["texto y", "texto x"], "allocation": [1, 1]}
+    # Primero la tarjeta copiada y después la generada, con su índice en el documento
+    assert [(card["question"], card["chunk"]) for card in sent] == [("P1", 1), ("Nueva", 2)]
+    assert saved["generated"] == [sent[1]]
+    assert saved["llm_result"]["usage"] == {"total_tokens": 5}
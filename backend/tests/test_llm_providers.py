@@ -0,0 +1,185 @@
+"""
+ProviderPool: failover entre proveedores, salud y hedging por cuantil de latencia
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+import pytest
+
+from app.config import settings
+from app.services.llm_providers import LLMProvider, ProviderPool
+
+
+class FakeCompletions:
+    """Sustituye a client.chat.completions con una latencia y un error fijos"""
+    
+    def __init__(self, name: str, delay: float, error: Optional[Exception]):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+    
+    async def create(self, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return SimpleNamespace(provider=self.name, usage=None)
+
+
+def make_provider(name: str, delay: float = 0.0, error: Optional[Exception] = None, samples: List[float] = ()) -> LLMProvider:
+    provider = LLMProvider(name, api_key="sk-test")
+    provider.fake = FakeCompletions(name, delay, error)
+    provider._client = SimpleNamespace(chat=SimpleNamespace(completions=provider.fake))
+    provider._latencies.extend(samples)
+    return provider
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 1.0)
+
+
+async def create(pool: ProviderPool):
+    return await pool.create(model="gpt-3.5-turbo", messages=[])
+
+
+def test_failover_to_the_next_provider():
+    async def scenario():
+        primary = make_provider("primary", error=RuntimeError("caído"))
+        secondary = make_provider("secondary")
+        provider, response = await create(ProviderPool([primary, secondary]))
+        
+        assert provider is secondary
+        assert response.provider == "secondary"
+        assert (primary.fake.calls, secondary.fake.calls) == (1, 1)
+        assert primary.consecutive_failures == 1
+    
+    asyncio.run(scenario())
+
+
+def test_error_is_raised_when_every_provider_fails():
+    async def scenario():
+        pool = ProviderPool([
+            make_provider("primary", error=RuntimeError("primero")),
+            make_provider("secondary", error=RuntimeError("segundo")),
+        ])
+        with pytest.raises(RuntimeError, match="segundo"):
+            await create(pool)
+    
+    asyncio.run(scenario())
+
+
+def test_failing_provider_leaves_rotation_until_it_recovers(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER_FAILURE_THRESHOLD", 2)
+    
+    async def scenario():
+        primary = make_provider("primary", error=RuntimeError("caído"))
+        secondary = make_provider("secondary")
+        pool = ProviderPool([primary, secondary])
+        await create(pool)
+        await create(pool)
+        assert not primary.healthy
+        assert pool.candidates() == [secondary]
+        
+        await create(pool)
+        assert primary.fake.calls == 2
+        
+        primary.record_success()
+        assert pool.candidates() == [primary, secondary]
+    
+    asyncio.run(scenario())
+
+
+def test_every_provider_is_tried_when_none_is_healthy():
+    primary = make_provider("primary")
+    secondary = make_provider("secondary")
+    primary.healthy = secondary.healthy = False
+    assert ProviderPool([primary, secondary]).candidates() == [primary, secondary]
+
+
+def test_slow_primary_is_hedged_and_cancelled(hedging):
+    async def scenario():
+        primary = make_provider("primary", delay=5.0, samples=[0.01] * 5)
+        secondary = make_provider("secondary", delay=0.01)
+        started = time.perf_counter()
+        provider, _ = await create(ProviderPool([primary, secondary]))
+        
+        assert provider is secondary
+        assert time.perf_counter() - started < 1.0
+        await asyncio.sleep(0)
+        assert primary.fake.cancelled == 1
+        # Perder el hedge no cuenta como fallo del proveedor
+        assert primary.healthy and primary.consecutive_failures == 0
+    
+    asyncio.run(scenario())
+
+
+def test_single_provider_hedges_against_itself(hedging):
+    async def scenario():
+        provider = make_provider("only", delay=0.2, samples=[0.01] * 5)
+        winner, _ = await create(ProviderPool([provider]))
+        
+        assert winner is provider
+        assert provider.fake.calls == 2
+    
+    asyncio.run(scenario())
+
+
+def test_no_hedge_without_enough_latency_samples(hedging):
+    async def scenario():
+        primary = make_provider("primary", delay=0.2, samples=[0.01] * 4)
+        secondary = make_provider("secondary")
+        provider, _ = await create(ProviderPool([primary, secondary]))
+        
+        assert provider is primary
+        assert secondary.fake.calls == 0
+    
+    asyncio.run(scenario())
+
+
+def test_hedges_are_capped_by_max_ratio(hedging, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 0.5)
+    
+    async def scenario():
+        primary = make_provider("primary", delay=0.1, samples=[0.01] * 100)
+        secondary = make_provider("secondary", delay=0.5)
+        pool = ProviderPool([primary, secondary])
+        for _ in range(4):
+            await create(pool)
+        
+        assert pool._hedges == 2
+        assert secondary.fake.calls == 2
+    
+    asyncio.run(scenario())
+
+
+def test_stream_fails_over_before_the_first_delta():
+    async def failing(**kwargs):
+        raise RuntimeError("caído")
+        yield
+    
+    async def working(**kwargs):
+        for delta in ("Hola", " mundo"):
+            yield delta
+    
+    async def scenario():
+        primary = make_provider("primary")
+        secondary = make_provider("secondary")
+        primary.stream = failing
+        secondary.stream = working
+        deltas = [delta async for delta in ProviderPool([primary, secondary]).stream(model="gpt-3.5-turbo", messages=[])]
+        assert deltas == ["Hola", " mundo"]
+    
+    asyncio.run(scenario())
@@ -0,0 +1,147 @@
+"""
+RateLimiter: reposición de los buckets, espera calculada y bloqueo tras un 429
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import models
+from app.config import settings
+from app.database import build_engine
+from app.services import rate_limiter as rate_limiter_module
+from app.services.rate_limiter import RateLimiter, RateLimitExceeded
+
+
+class Clock:
+    """Sustituye al módulo time del limitador para avanzar el tiempo a mano"""
+    
+    def __init__(self):
+        self.now = 1_000_000.0
+    
+    def time(self) -> float:
+        return self.now
+    
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module, "time", clock)
+    # Con 60 RPM caben 10 peticiones seguidas y se repone una por segundo
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_BURST_SECONDS", 10.0)
+    return clock
+
+
+@asynccontextmanager
+async def make_limiter(tmp_path, max_wait: float = 60.0):
+    engine = build_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(models.LLMRateLimit.__table__.create)
+    try:
+        yield RateLimiter(async_sessionmaker(engine, expire_on_commit=False), max_wait=max_wait)
+    finally:
+        await engine.dispose()
+
+
+async def take(limiter: RateLimiter, times: int, rpm: int = 60, tpm: int = 0, cost: int = 0) -> list:
+    return [await limiter._try_acquire("openai", rpm, tpm, cost) for _ in range(times)]
+
+
+def test_bucket_starts_full_and_then_waits(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path) as limiter:
+            assert await take(limiter, 10) == [0.0] * 10
+            assert await limiter._try_acquire("openai", 60, 0, 0) == pytest.approx(1.0)
+    
+    asyncio.run(scenario())
+
+
+def test_bucket_refills_with_elapsed_time(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path) as limiter:
+            await take(limiter, 10)
+            clock.now += 3
+            assert await take(limiter, 3) == [0.0] * 3
+            assert await limiter._try_acquire("openai", 60, 0, 0) == pytest.approx(1.0)
+            
+            clock.now += 0.5
+            assert await limiter._try_acquire("openai", 60, 0, 0) == pytest.approx(0.5)
+    
+    asyncio.run(scenario())
+
+
+def test_refill_is_capped_at_capacity(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path) as limiter:
+            await take(limiter, 10)
+            clock.now += 3600
+            assert await take(limiter, 10) == [0.0] * 10
+            assert await limiter._try_acquire("openai", 60, 0, 0) > 0
+    
+    asyncio.run(scenario())
+
+
+def test_token_bucket_waits_for_the_missing_tokens(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path) as limiter:
+            # 6000 TPM: capacidad de 1000 tokens, se reponen 100 por segundo
+            assert await take(limiter, 1, rpm=0, tpm=6000, cost=800) == [0.0]
+            assert await limiter._try_acquire("openai", 0, 6000, 500) == pytest.approx(3.0)
+            clock.now += 3
+            assert await limiter._try_acquire("openai", 0, 6000, 500) == 0.0
+    
+    asyncio.run(scenario())
+
+
+def test_acquire_rejects_waits_longer_than_max_wait(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path, max_wait=0.5) as limiter:
+            for _ in range(10):
+                assert await limiter.acquire("openai", 60, 0, 0) == 0.0
+            with pytest.raises(RateLimitExceeded) as error:
+                await limiter.acquire("openai", 60, 0, 0)
+            assert error.value.retry_after == pytest.approx(1.0)
+    
+    asyncio.run(scenario())
+
+
+def test_acquire_without_limits_does_not_touch_the_table(tmp_path, clock):
+    async def scenario():
+        limiter = RateLimiter(session_factory=None)
+        assert await limiter.acquire("openai", 0, 0, 10_000) == 0.0
+    
+    asyncio.run(scenario())
+
+
+def test_block_pauses_the_bucket(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path) as limiter:
+            assert await take(limiter, 1) == [0.0]
+            await limiter.block("openai", 5)
+            assert await limiter._try_acquire("openai", 60, 0, 0) == pytest.approx(5.0)
+            
+            # Un bloqueo más corto no acorta el que ya hay
+            await limiter.block("openai", 1)
+            clock.now += 2
+            assert await limiter._try_acquire("openai", 60, 0, 0) == pytest.approx(3.0)
+            
+            clock.now += 3
+            assert await limiter._try_acquire("openai", 60, 0, 0) == 0.0
+    
+    asyncio.run(scenario())
+
+
+def test_block_creates_a_missing_bucket(tmp_path, clock):
+    async def scenario():
+        async with make_limiter(tmp_path) as limiter:
+            await limiter.block("azure", 4)
+            assert await limiter._try_acquire("azure", 60, 0, 0) == pytest.approx(4.0)
+            clock.now += 4
+            assert await limiter._try_acquire("azure", 60, 0, 0) == 0.0
+    
+    asyncio.run(scenario())
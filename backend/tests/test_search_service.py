@@ -0,0 +1,205 @@
+"""
+SearchService sobre SQLite FTS5: ranking por fragmentos, resaltado escapado, paginación y consultas con operadores
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import models
+from app.config import settings
+from app.database import base, build_engine
+from app.services.chunk_service import chunk_service
+from app.services.search_service import HIGHLIGHT_END, HIGHLIGHT_START, SearchService, search_service
+
+
+@asynccontextmanager
+async def make_session(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(base.metadata.create_all)
+    await search_service.create_index(engine)
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            yield session
+    finally:
+        await engine.dispose()
+
+
+async def add_document(db, document_id: int, text: str):
+    db.add(models.Docs(id_=document_id, raw_text=text))
+    await db.flush()
+    await chunk_service.add(db, document_id, chunk_service.split(text))
+
+
+def card(card_id: int, document_id: int, question: str, answer: str) -> SimpleNamespace:
+    return SimpleNamespace(id=card_id, document_id=document_id, question=question, answer=answer)
+
+
+def test_documents_are_ranked_and_highlighted(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await add_document(db, 1, "La mitosis es una división celular. La mitosis produce dos células hijas.")
+            await add_document(db, 2, "La fotosíntesis ocurre en los cloroplastos; la mitosis no.")
+            await add_document(db, 3, "Texto sin relación con el tema.")
+            
+            items = (await search_service.search(db, "mitosis", scope="documents"))["documents"]["items"]
+        assert [item["document_id"] for item in items] == [1, 2]
+        assert f"{HIGHLIGHT_START}mitosis{HIGHLIGHT_END}" in items[0]["highlight"]
+    
+    asyncio.run(scenario())
+
+
+def test_document_ranks_once_as_its_best_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CHUNK_MAX_TOKENS", 30)
+    
+    async def scenario():
+        paragraphs = [f"Párrafo {number} sobre la mitosis y las células de un tejido." for number in range(8)]
+        async with make_session(tmp_path) as db:
+            await add_document(db, 1, "\n\n".join(paragraphs))
+            chunks = await chunk_service.get_chunks(db, 1, load_text=False)
+            assert len(chunks) > 1
+            
+            items = (await search_service.search(db, "mitosis", scope="documents"))["documents"]["items"]
+        assert [item["document_id"] for item in items] == [1]
+    
+    asyncio.run(scenario())
+
+
+def test_chunk_text_is_sliced_from_the_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CHUNK_MAX_TOKENS", 30)
+    
+    async def scenario():
+        text = "\n\n".join(f"Párrafo {number} sobre la mitosis y las células de un tejido." for number in range(8))
+        async with make_session(tmp_path) as db:
+            await add_document(db, 1, text)
+            db.expunge_all()
+            
+            chunks = await chunk_service.get_chunks(db, 1)
+        assert len(chunks) > 1
+        assert [chunk.text for chunk in chunks] == [text[chunk.char_start:chunk.char_end] for chunk in chunks]
+        assert "text" not in models.DocumentChunk.__table__.columns
+    
+    asyncio.run(scenario())
+
+
+def test_accents_are_ignored(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await add_document(db, 1, "La fotosíntesis ocurre en los cloroplastos.")
+            
+            items = (await search_service.search(db, "FOTOSINTESIS", scope="documents"))["documents"]["items"]
+        assert [item["document_id"] for item in items] == [1]
+        assert f"{HIGHLIGHT_START}fotosíntesis{HIGHLIGHT_END}" in items[0]["highlight"]
+    
+    asyncio.run(scenario())
+
+
+def test_query_operators_are_taken_literally(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await add_document(db, 1, "Células y tejidos")
+            
+            for query in ('células OR "', "NEAR(células tejidos)", "células*", "-tejidos", "col:células"):
+                results = await search_service.search(db, query)
+                assert isinstance(results["documents"]["items"], list)
+            assert (await search_service.search(db, "!!!"))["documents"] == {"items": [], "has_more": False}
+    
+    asyncio.run(scenario())
+
+
+def test_pagination_reports_has_more(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            for document_id in range(1, 6):
+                await add_document(db, document_id, f"enzima número {document_id}")
+            
+            first = (await search_service.search(db, "enzima", scope="documents", limit=2))["documents"]
+            last = (await search_service.search(db, "enzima", scope="documents", limit=2, offset=4))["documents"]
+        assert (len(first["items"]), first["has_more"]) == (2, True)
+        assert (len(last["items"]), last["has_more"]) == (1, False)
+    
+    asyncio.run(scenario())
+
+
+def test_flashcards_weigh_questions_over_answers(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await search_service.index_flashcards(db, [
+                card(1, 7, "¿Qué hace la enzima?", "Acelera una reacción química"),
+                card(2, 7, "¿Qué acelera una reacción?", "Una enzima, que es una proteína catalizadora"),
+            ])
+            
+            items = (await search_service.search(db, "enzima", scope="flashcards"))["flashcards"]["items"]
+        assert [item["flashcard_id"] for item in items] == [1, 2]
+        assert items[0]["document_id"] == 7
+        assert f"{HIGHLIGHT_START}enzima{HIGHLIGHT_END}" in items[0]["question"]
+    
+    asyncio.run(scenario())
+
+
+def test_removed_flashcards_are_not_found(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await search_service.index_flashcards(db, [card(1, 7, "¿Qué es la mitosis?", "Una división celular")])
+            await search_service.remove_flashcards(db, [1])
+            
+            assert (await search_service.search(db, "mitosis"))["flashcards"]["items"] == []
+    
+    asyncio.run(scenario())
+
+
+def test_scope_limits_the_result_types(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            assert set(await search_service.search(db, "mitosis", scope="documents")) == {"documents"}
+            assert set(await search_service.search(db, "mitosis", scope="flashcards")) == {"flashcards"}
+            assert set(await search_service.search(db, "mitosis")) == {"documents", "flashcards"}
+    
+    asyncio.run(scenario())
+
+
+def test_document_highlight_escapes_html(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await add_document(db, 1, 'Nota: <script>alert("mitosis")</script> & <b>fin</b>')
+            
+            items = (await search_service.search(db, "mitosis", scope="documents"))["documents"]["items"]
+        highlight = items[0]["highlight"]
+        assert "<script>" not in highlight and "<b>" not in highlight
+        assert "&lt;script&gt;" in highlight and "&amp;" in highlight
+        assert f"{HIGHLIGHT_START}mitosis{HIGHLIGHT_END}" in highlight
+    
+    asyncio.run(scenario())
+
+
+def test_flashcard_highlight_escapes_html(tmp_path):
+    async def scenario():
+        async with make_session(tmp_path) as db:
+            await search_service.index_flashcards(db, [
+                card(1, 7, "¿Qué hace <img src=x onerror=alert(1)> la mitosis?", "Divide <i>una</i> célula"),
+            ])
+            
+            item = (await search_service.search(db, "mitosis célula", scope="flashcards"))["flashcards"]["items"][0]
+        assert "<img" not in item["question"] and "&lt;img" in item["question"]
+        assert "<i>" not in item["answer"] and "&lt;i&gt;" in item["answer"]
+        assert f"{HIGHLIGHT_START}mitosis{HIGHLIGHT_END}" in item["question"]
+        assert f"{HIGHLIGHT_START}célula{HIGHLIGHT_END}" in item["answer"]
+    
+    asyncio.run(scenario())
+
+
+def test_highlight_snippet_around_the_first_match():
+    body = " ".join(f"palabra{number}" for number in range(100)) + " células " + " ".join(f"resto{number}" for number in range(100))
+    snippet = SearchService.highlight(body, "célula", words=10)
+    
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert f"{HIGHLIGHT_START}células{HIGHLIGHT_END}" in snippet
+    assert len(snippet.split()) <= 12
+
+
+def test_highlight_without_matches_starts_at_the_beginning():
+    snippet = SearchService.highlight("uno dos <tres> cuatro", "mitosis", words=3)
+    assert snippet == "uno dos &lt;tres…"
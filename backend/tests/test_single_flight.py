@@ -0,0 +1,124 @@
+"""
+SingleFlight: una ejecución por clave, cancelación de esperas y propagación de errores
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+
+class Operation:
+    """Operación que cuenta sus ejecuciones y termina cuando el test lo indica"""
+    
+    def __init__(self, result="resultado", error: Exception = None):
+        self.calls = 0
+        self.finished = False
+        self.release = asyncio.Event()
+        self.result = result
+        self.error = error
+    
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        self.finished = True
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight("test")
+        operation = Operation()
+        waiters = [asyncio.create_task(flight.do("clave", operation)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flight.is_running("clave")
+        assert flight.in_flight()["clave"]["waiters"] == 5
+        
+        operation.release.set()
+        results = await asyncio.gather(*waiters)
+        assert operation.calls == 1
+        assert [shared for _, shared in results] == [False, True, True, True, True]
+        assert {result for result, _ in results} == {"resultado"}
+        assert not flight.is_running("clave")
+        assert flight.in_flight() == {}
+    
+    asyncio.run(scenario())
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight = SingleFlight("test")
+        first, second = Operation("a"), Operation("b")
+        tasks = [asyncio.create_task(flight.do("a", first)), asyncio.create_task(flight.do("b", second))]
+        await asyncio.sleep(0)
+        first.release.set()
+        second.release.set()
+        assert await asyncio.gather(*tasks) == [("a", False), ("b", False)]
+    
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_operation():
+    async def scenario():
+        flight = SingleFlight("test")
+        operation = Operation()
+        leader = asyncio.create_task(flight.do("clave", operation))
+        follower = asyncio.create_task(flight.do("clave", operation))
+        await asyncio.sleep(0)
+        
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert flight.is_running("clave")
+        assert flight.in_flight()["clave"]["waiters"] == 1
+        
+        operation.release.set()
+        assert await follower == ("resultado", True)
+        assert operation.calls == 1
+    
+    asyncio.run(scenario())
+
+
+def test_operation_finishes_when_every_waiter_is_cancelled():
+    async def scenario():
+        flight = SingleFlight("test")
+        operation = Operation()
+        waiter = asyncio.create_task(flight.do("clave", operation))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert flight.in_flight()["clave"]["waiters"] == 0
+        
+        operation.release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert operation.finished
+        assert not flight.is_running("clave")
+    
+    asyncio.run(scenario())
+
+
+def test_error_reaches_every_waiter_and_frees_the_key():
+    async def scenario():
+        flight = SingleFlight("test")
+        operation = Operation(error=ValueError("fallo del LLM"))
+        waiters = [asyncio.create_task(flight.do("clave", operation)) for _ in range(3)]
+        await asyncio.sleep(0)
+        operation.release.set()
+        
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert results[0] is results[1] is results[2]
+        assert not flight.is_running("clave")
+        
+        # La siguiente petición lanza una operación nueva
+        retry = Operation("reintento")
+        retry.release.set()
+        assert await flight.do("clave", retry) == ("reintento", False)
+        assert retry.calls == 1
+    
+    asyncio.run(scenario())
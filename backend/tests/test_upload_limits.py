@@ -0,0 +1,112 @@
+"""
+UploadSizeLimitMiddleware: 413 antes de leer el cuerpo o en cuanto supera el límite
+"""
+
+import asyncio
+import json
+from typing import List, Optional
+
+from app.config import settings
+from app.upload_limits import MULTIPART_OVERHEAD_BYTES, UploadSizeLimitMiddleware, upload_limits
+
+LIMITS = {"/api/documents": 100}
+
+
+class Upload:
+    """Petición ASGI con el cuerpo en fragmentos que cuenta lo que se lee de ella"""
+    
+    def __init__(self, chunks: List[bytes], content_length: Optional[int] = None, path: str = "/api/documents", method: str = "POST"):
+        headers = [(b"content-type", b"multipart/form-data; boundary=x")]
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        self.scope = {"type": "http", "method": method, "path": path, "headers": headers}
+        self.chunks = list(chunks)
+        self.reads = 0
+        self.sent: List[dict] = []
+    
+    async def receive(self) -> dict:
+        self.reads += 1
+        body = self.chunks.pop(0) if self.chunks else b""
+        return {"type": "http.request", "body": body, "more_body": bool(self.chunks)}
+    
+    async def send(self, message: dict):
+        self.sent.append(message)
+    
+    @property
+    def status(self) -> int:
+        return self.sent[0]["status"]
+
+
+class Endpoint:
+    """Aplicación ASGI que lee todo el cuerpo y responde 200"""
+    
+    def __init__(self):
+        self.calls = 0
+        self.body = b""
+    
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        more_body = True
+        while more_body:
+            message = await receive()
+            self.body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def run(upload: Upload, endpoint: Endpoint):
+    asyncio.run(UploadSizeLimitMiddleware(endpoint, LIMITS)(upload.scope, upload.receive, upload.send))
+
+
+def test_content_length_over_the_limit_is_rejected_without_reading():
+    upload = Upload([b"x" * 200], content_length=200)
+    endpoint = Endpoint()
+    run(upload, endpoint)
+    
+    assert upload.status == 413
+    assert upload.reads == 0
+    assert endpoint.calls == 0
+    assert "MB" in json.loads(upload.sent[1]["body"])["detail"]
+
+
+def test_chunked_body_is_cut_as_soon_as_it_passes_the_limit():
+    upload = Upload([b"x" * 40] * 10)
+    endpoint = Endpoint()
+    run(upload, endpoint)
+    
+    assert upload.status == 413
+    assert upload.reads == 3
+    assert len(upload.chunks) == 7
+
+
+def test_understated_content_length_is_still_cut():
+    upload = Upload([b"x" * 60] * 3, content_length=50)
+    run(upload, Endpoint())
+    
+    assert upload.status == 413
+    assert upload.reads == 2
+
+
+def test_body_within_the_limit_reaches_the_endpoint():
+    upload = Upload([b"x" * 50, b"y" * 50], content_length=100)
+    endpoint = Endpoint()
+    run(upload, endpoint)
+    
+    assert upload.status == 200
+    assert endpoint.body == b"x" * 50 + b"y" * 50
+
+
+def test_other_routes_and_methods_are_not_limited():
+    for upload in (Upload([b"x" * 500], content_length=500, path="/api/search"),
+                   Upload([b"x" * 500], content_length=500, method="PUT")):
+        endpoint = Endpoint()
+        run(upload, endpoint)
+        assert upload.status == 200
+        assert len(endpoint.body) == 500
+
+
+def test_default_limits_follow_settings():
+    limits = upload_limits()
+    assert limits["/api/documents"] == settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD_BYTES
+    assert limits["/api/documents/batch"] == settings.BATCH_MAX_REQUEST_SIZE
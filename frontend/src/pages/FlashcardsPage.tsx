@@ -82,6 +82,12 @@ function FlashcardsPage() {
         buildApiUrl(`/api/flashcards/${documentId}`)
       );
 
+      // Si el documento aún no tiene flashcards guardadas, generarlas en streaming
+      if (response.status === 404) {
+        await streamFlashcards();
+        return;
+      }
+
       if (!response.ok) {
         const errorData = await response.json();
         throw new Error(errorData.detail || 'Error generando flashcards');
@@ -104,6 +110,41 @@ function FlashcardsPage() {
     }
   };
 
+  // Recibe cada flashcard como server-sent event en cuanto el LLM la completa
+  const streamFlashcards = () =>
+    new Promise<void>((resolve, reject) => {
+      setFlashcards([]);
+      const source = new EventSource(
+        buildApiUrl(`/api/flashcards/${documentId}/stream`)
+      );
+
+      source.addEventListener('flashcard', (event) => {
+        const card: Flashcard = JSON.parse((event as MessageEvent).data);
+        setFlashcards((prev) => [...prev, card]);
+        setIsLoading(false);
+      });
+
+      source.addEventListener('done', (event) => {
+        const result: FlashcardsResponse = JSON.parse(
+          (event as MessageEvent).data
+        );
+        setFlashcards(result.flashcards);
+        setDocumentInfo(result.document_info);
+        source.close();
+        resolve();
+      });
+
+      source.addEventListener('error', (event) => {
+        source.close();
+        const data = (event as MessageEvent).data;
+        reject(
+          new Error(
+            data ? JSON.parse(data).error : 'Error generando flashcards'
+          )
+        );
+      });
+    });
+
   const nextCard = () => {
     if (currentIndex < flashcards.length - 1) {
       setCurrentIndex(currentIndex + 1);